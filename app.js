@@ -9,21 +9,65 @@ let places = [];
 let transportTable = {};
 let geoDataLoaded = false;
 
+// The last payload is kept in localStorage; returning visitors only fetch
+// what changed since its version.
+const GEO_DATA_CACHE_KEY = 'geoData';
+
+function readCachedGeoData() {
+  try {
+    const cached = JSON.parse(localStorage.getItem(GEO_DATA_CACHE_KEY));
+    return cached && Number.isInteger(cached.version) ? cached : null;
+  } catch (err) {
+    return null;
+  }
+}
+
+function writeCachedGeoData(data) {
+  try {
+    localStorage.setItem(GEO_DATA_CACHE_KEY, JSON.stringify(data));
+  } catch (err) {
+    // Storage full or disabled: the next visit downloads everything again
+  }
+}
+
+function applyGeoDataChanges(cached, changes) {
+  if (changes.full) return changes;
+
+  const byId = new Map(cached.places.map(p => [p.id, p]));
+  changes.deletedPlaces.forEach(id => byId.delete(id));
+  changes.places.forEach(p => byId.set(p.id, p));
+  const merged = [...byId.values()].sort((a, b) =>
+    a.name < b.name ? -1 : a.name > b.name ? 1 : a.id < b.id ? -1 : a.id > b.id ? 1 : 0
+  );
+
+  const removed = new Set(changes.deletedNeighbourhoods);
+  const centers = { ...cached.neighbourhoodCenters, ...changes.neighbourhoodCenters };
+  removed.forEach(name => delete centers[name]);
+  const table = {};
+  for (const [key, row] of Object.entries({ ...cached.transportTable, ...changes.transportTable })) {
+    const [origin, destination] = key.split('|');
+    if (!removed.has(origin) && !removed.has(destination)) table[key] = row;
+  }
+
+  return { version: changes.version, neighbourhoodCenters: centers, places: merged, transportTable: table };
+}
+
 async function loadGeoData() {
   try {
     if (typeof setStatus === 'function') {
       setStatus('Loading places and transport data…');
     }
     
-    const response = await fetch('/api/geo-data/');
+    const cached = readCachedGeoData();
+    const url = cached ? `/api/geo-data/changes/?since=${cached.version}` : '/api/geo-data/';
+    const response = await fetch(url);
     if (!response.ok) {
       throw new Error(`Failed to load geo data: ${response.status} ${response.statusText}`);
     }
-    const data = await response.json();
-    neighbourhoodCenters = data.neighbourhoodCenters || {};
-    places = data.places || [];
-    transportTable = data.transportTable || {};
+    const data = cached ? applyGeoDataChanges(cached, await response.json()) : await response.json();
+    setGeoData(data);
     geoDataLoaded = true;
+    subscribeToGeoDataEvents(data.version);
     if (typeof setStatus === 'function') {
       setStatus('Data loaded from server. You can now generate an itinerary.');
     }
@@ -36,6 +80,34 @@ async function loadGeoData() {
   }
 }
 
+let geoDataVersion = null;
+let geoDataEvents = null;
+
+function setGeoData(data) {
+  writeCachedGeoData(data);
+  geoDataVersion = data.version;
+  neighbourhoodCenters = data.neighbourhoodCenters || {};
+  places = data.places || [];
+  transportTable = data.transportTable || {};
+}
+
+// Live updates over server-sent events; EventSource reconnects on its own
+// and resumes from the last event id
+function subscribeToGeoDataEvents(version) {
+  if (geoDataEvents || typeof EventSource === 'undefined') return;
+  geoDataEvents = new EventSource(`/api/async/events/?since=${version}`);
+  geoDataEvents.addEventListener('changes', event => {
+    const current = { version: geoDataVersion, neighbourhoodCenters, places, transportTable };
+    setGeoData(applyGeoDataChanges(current, JSON.parse(event.data)));
+  });
+  geoDataEvents.addEventListener('resync', () => {
+    geoDataEvents.close();
+    geoDataEvents = null;
+    localStorage.removeItem(GEO_DATA_CACHE_KEY);
+    loadGeoData();
+  });
+}
+
 function getTransport(origin, destination) {
   if (origin === destination) return { mode: 'Walk', fare: 0, minutes: 0 };
   const directKey = `${origin}|${destination}`;
@@ -237,85 +309,70 @@ let mapMarkers = [];
 let mapPolyline;
 
 // ------------------------------
-// Road routing via OpenRouteService
+// Road routing
 // ------------------------------
 
-// Using the same API key as in routeexample.js
-const ORS_API_KEY =
-  '5b3ce3597851110001cf6248f3c7d707f6f94f1c9315484e33df5f03';
-const ORS_DIRECTIONS_URL =
-  'https://api.openrouteservice.org/v2/directions/driving-car/geojson';
+// Zoom the server simplifies road routes for; street level keeps every
+// visible bend while dropping redundant points.
+const ROUTE_DETAIL_ZOOM = 16;
+
+// Decode a Google encoded polyline into [lat, lng] pairs.
+function decodePolyline(encoded, precision = 5) {
+  const factor = 10 ** precision;
+  const points = [];
+  let index = 0;
+  let lat = 0;
+  let lng = 0;
+
+  while (index < encoded.length) {
+    const deltas = [];
+    for (let k = 0; k < 2; k++) {
+      let shift = 0;
+      let result = 0;
+      let byte;
+      do {
+        byte = encoded.charCodeAt(index++) - 63;
+        result |= (byte & 0x1f) << shift;
+        shift += 5;
+      } while (byte >= 0x20);
+      deltas.push(result & 1 ? ~(result >> 1) : result >> 1);
+    }
+    lat += deltas[0];
+    lng += deltas[1];
+    points.push([lat / factor, lng / factor]);
+  }
 
-async function fetchRouteSegment(from, to) {
-  try {
-    const body = {
-      coordinates: [
-        [from.lng, from.lat],
-        [to.lng, to.lat],
-      ],
-    };
+  return points;
+}
 
-    const response = await fetch(ORS_DIRECTIONS_URL, {
+// Road routes come from the server-side proxy, which caches legs and
+// fetches missing ones from the upstream routing service in parallel.
+async function buildRoadRoute(latLngs) {
+  try {
+    const response = await fetch('/api/route/', {
       method: 'POST',
-      headers: {
-        Authorization: ORS_API_KEY,
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify(body),
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        coordinates: latLngs,
+        zoom: ROUTE_DETAIL_ZOOM,
+        encoding: 'polyline',
+      }),
     });
 
     if (!response.ok) {
-      console.warn(
-        'OpenRouteService API error:',
-        response.status,
-        response.statusText
-      );
+      console.warn('Route API error:', response.status, response.statusText);
       return null;
     }
 
     const data = await response.json();
-    if (!data.features || !data.features.length) {
-      console.warn('OpenRouteService returned no route for segment');
-      return null;
-    }
-
-    // Convert [lng, lat] to [lat, lng] for Leaflet
-    return data.features[0].geometry.coordinates.map((coord) => [
-      coord[1],
-      coord[0],
-    ]);
+    const coordinates = data.polyline ? decodePolyline(data.polyline) : [];
+    return coordinates.length ? coordinates : null;
   } catch (error) {
-    console.error('Error fetching route segment from OpenRouteService:', error);
+    console.error('Error fetching road route:', error);
     return null;
   }
 }
 
-async function buildRoadRoute(latLngs) {
-  const fullRoute = [];
-  let allSegmentsSucceeded = true;
-
-  for (let i = 0; i < latLngs.length - 1; i++) {
-    const from = { lat: latLngs[i][0], lng: latLngs[i][1] };
-    const to = { lat: latLngs[i + 1][0], lng: latLngs[i + 1][1] };
-
-    const segment = await fetchRouteSegment(from, to);
-
-    if (segment && segment.length) {
-      // Avoid duplicating the joint point where segments meet
-      if (fullRoute.length) {
-        segment.shift();
-      }
-      fullRoute.push(...segment);
-    } else {
-      // If any segment fails, do not use straight line fallback
-      allSegmentsSucceeded = false;
-      break; // Can break early since we won't use the route anyway
-    }
-  }
-
-  return allSegmentsSucceeded ? fullRoute : null;
-}
-
 function initMap() {
   const nairobiCenter = [-1.286389, 36.817223];
   map = L.map('map').setView(nairobiCenter, 12);
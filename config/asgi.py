@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# Map the prebuilt read structures (manage.py build_warm_start) before the
+# first request; without them the caches are filled live as usual
+from trips.warm_start import load_on_boot  # noqa: E402
+
+load_on_boot()
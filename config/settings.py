@@ -56,12 +56,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'trips.middleware.PrecompressedStaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'trips.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -98,6 +100,33 @@ DATABASES = {
     }
 }
 
+# Optional read replicas: DJANGO_DB_REPLICAS="replica1:5432,replica2:5432".
+# Each replica copies the primary's settings with its own host and port.
+for _i, _replica in enumerate(filter(None, os.getenv("DJANGO_DB_REPLICAS", "").split(",")), start=1):
+    _host, _, _port = _replica.strip().partition(":")
+    DATABASES[f"replica_{_i}"] = {
+        **DATABASES["default"],
+        "HOST": _host,
+        "PORT": _port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["trips.db_router.PrimaryReplicaRouter"]
+DATABASE_READ_YOUR_WRITES_SECONDS = 5  # Keep a client on the primary after it writes
+DATABASE_REPLICA_CHECK_SECONDS = 30  # How often a replica's connection is re-checked
+DATABASE_REPLICA_RETRY_SECONDS = 30  # How long a failed replica is skipped
+
+# Cache shared by every worker (plan cache, route rate limits, failed route legs):
+# REDIS_URL="redis://localhost:6379/0", which needs the redis package.
+# Without it each process caches in its own memory.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -131,9 +160,103 @@ USE_TZ = True
 
 
 # Custom app settings
+# Region served when a request doesn't name one (see trips.regions)
+DEFAULT_REGION = os.getenv("DEFAULT_REGION", "nairobi")
+
 TRANSPORT_FARE_RATE = 5  # KSH per km
 TRANSPORT_TIME_MULTIPLIER = 10  # minutes per km
 
+# Travel modes of trips/travel_model.py. minutes_per_km is with clear roads;
+# congestion is the share of the hourly slowdown a mode feels; max_km
+# limits a mode to shorter trips (at least one mode needs none).
+# road_time_factor scales the road graph's driving minutes under
+# TRAVEL_MODEL = "road_graph"; modes without one keep their pace
+TRAVEL_MODES = {
+    "Walk": {"minutes_per_km": 12, "max_km": 1.5, "congestion": 0},
+    "Matatu": {
+        "minutes_per_km": TRANSPORT_TIME_MULTIPLIER, "fare_per_km": TRANSPORT_FARE_RATE, "road_time_factor": 1.0,
+    },
+    "Boda": {
+        "minutes_per_km": 3, "base_fare": 50, "fare_per_km": 25, "min_fare": 70, "max_km": 20, "congestion": 0.3,
+        "road_time_factor": 0.8,
+    },
+    "Taxi": {"minutes_per_km": 4, "base_fare": 150, "fare_per_km": 60, "min_fare": 300, "road_time_factor": 1.0},
+}
+# Slowdown of travel time by hour of the day (0-23): morning and evening rush
+TRAVEL_CONGESTION = (
+    1.0, 1.0, 1.0, 1.0, 1.0, 1.1, 1.4, 1.9, 1.9, 1.5, 1.3, 1.3,
+    1.4, 1.3, 1.3, 1.4, 1.7, 2.0, 2.0, 1.6, 1.3, 1.1, 1.0, 1.0,
+)
+# "cheapest" or "fastest": which allowed mode a trip takes
+TRAVEL_MODE_PREFERENCE = os.getenv("TRAVEL_MODE_PREFERENCE", "cheapest")
+TRAVEL_TABLE_KM_STEP = 0.05  # Width of the distance bins of the compiled tables
+TRAVEL_TABLE_MAX_KM = 200  # Longer trips are computed instead of looked up
+
+# "haversine" (straight line) or "road_graph" (offline graph, see build_road_graph)
+TRAVEL_MODEL = os.getenv("TRAVEL_MODEL", "haversine")
+ROAD_GRAPH_PATH = Path(os.getenv("ROAD_GRAPH_PATH", BASE_DIR / "data" / "road_graph.npz"))
+
+# Built by `manage.py build_travel_matrix`, one sub-directory per region and dataset version
+TRAVEL_MATRIX_DIR = Path(os.getenv("TRAVEL_MATRIX_DIR", BASE_DIR / "data" / "travel_matrix"))
+
+# Prebuilt read structures mapped at worker boot, one file per region
+# (`manage.py build_warm_start`)
+WARM_START_DIR = Path(os.getenv("WARM_START_DIR", BASE_DIR / "data" / "warm_start"))
+
+# Background jobs (`manage.py run_jobs`)
+JOBS_MAX_ATTEMPTS = 5
+JOBS_BACKOFF_SECONDS = 10  # First retry delay; doubles per attempt, with jitter
+JOBS_BACKOFF_MAX_SECONDS = 3600
+JOBS_LOCK_TIMEOUT_SECONDS = 1800  # Running jobs older than this are assumed lost; keep above the longest job
+JOBS_POLL_SECONDS = 1.0
+
+# Stage-3 ranking weights (trips/ranking.py); keep in step with the frontends
+RANKING_WEIGHTS = {"rating": 0.3, "category": 0.3, "vibe": 0.2, "popularity": 0.2, "text": 0.2}
+
+# Server-side plans (/api/plan/). Budget and time are rounded down to these
+# steps so near-identical requests share a cache entry
+PLAN_BUDGET_STEP = int(os.getenv("PLAN_BUDGET_STEP", "100"))  # KSH
+PLAN_MINUTES_STEP = int(os.getenv("PLAN_MINUTES_STEP", "15"))
+PLAN_CACHE_SIZE = 1024  # Entries in each process's LRU
+PLAN_CACHE_ALIAS = os.getenv("PLAN_CACHE_ALIAS", "default")  # Shared tier; skipped while it is local memory
+PLAN_CACHE_TIMEOUT = 6 * 60 * 60  # Seconds; entries also expire with the dataset version
+
+NEARBY_MAX_RESULTS = 100  # Largest k served by /api/nearby/
+
+# Place admin on large tables (trips/admin.py)
+ADMIN_FACET_LIMIT = 200  # Most common values listed per filter
+ADMIN_FACET_TIMEOUT = 24 * 60 * 60  # Seconds; facets are also keyed on the dataset version
+ADMIN_EXACT_COUNT_THRESHOLD = 10000  # Above this estimated row count, PostgreSQL pages show the estimate
+ADMIN_BULK_BATCH_SIZE = 1000
+
+# Road routing proxy (/api/route/)
+ROUTING_UPSTREAM_URL = os.getenv(
+    "ROUTING_UPSTREAM_URL",
+    "https://api.openrouteservice.org/v2/directions/driving-car/geojson",
+)
+# Required: /api/route/ answers 503 until it is set
+ROUTING_API_KEY = os.getenv("ROUTING_API_KEY", "")
+ROUTING_TIMEOUT = float(os.getenv("ROUTING_TIMEOUT", "10"))  # seconds per leg
+ROUTING_MAX_WORKERS = int(os.getenv("ROUTING_MAX_WORKERS", "8"))
+ROUTING_MAX_POINTS = 50
+ROUTING_SNAP_DECIMALS = 4  # ~11 m, so nearby requests share cached legs
+ROUTE_SIMPLIFY_PIXELS = 1.0  # Douglas-Peucker tolerance in screen pixels at the requested zoom
+ROUTING_RATE_LIMIT = int(os.getenv("ROUTING_RATE_LIMIT", "30"))  # Route requests per client IP per window
+ROUTING_RATE_WINDOW = 60  # seconds
+ROUTING_FAILED_LEG_SECONDS = 300  # A failed leg is drawn straight, without asking upstream, this long
+ROUTING_LEG_MAX_AGE_DAYS = 30  # Cached legs are refetched after this; `manage.py prune_route_legs` deletes them
+
+# Delta sync (/api/geo-data/changes/): deleted-place tombstones older than
+# this are removed by `manage.py prune_place_tombstones`
+PLACE_TOMBSTONE_RETENTION_DAYS = 30
+
+# Live updates (/api/async/events/). LocalBroker only sees writes made in the
+# same process; DatabaseBroker also polls the dataset version
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "trips.events.DatabaseBroker")
+EVENTS_POLL_SECONDS = 1.0
+EVENTS_HEARTBEAT_SECONDS = 15  # Comment line sent on idle streams to keep proxies from closing them
+EVENTS_RETRY_MS = 3000  # Client reconnect delay
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
@@ -144,3 +267,15 @@ STATICFILES_DIRS = [
     BASE_DIR / 'static',
     BASE_DIR / 'frontend' / 'dist',
 ]
+
+# collectstatic writes content-hashed names plus .gz/.br variants (brotli is
+# optional), served by trips.middleware.PrecompressedStaticMiddleware
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'trips.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+STATIC_CACHE_MAX_AGE = 365 * 24 * 60 * 60  # Hashed assets never change under the same name
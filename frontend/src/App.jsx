@@ -3,8 +3,8 @@ import L from 'leaflet'
 import { LocateControl } from 'leaflet.locatecontrol'
 import 'leaflet.locatecontrol/dist/L.Control.Locate.min.css'
 
-const ORS_API_KEY = '5b3ce3597851110001cf6248f3c7d707f6f94f1c9315484e33df5f03'
-const ORS_DIRECTIONS_URL = 'https://api.openrouteservice.org/v2/directions/driving-car/geojson'
+// Zoom the server simplifies road routes for; street level keeps every visible bend
+const ROUTE_DETAIL_ZOOM = 16
 
 function haversineKm(a, b) {
   const R = 6371
@@ -19,6 +19,75 @@ function haversineKm(a, b) {
   return R * c
 }
 
+function decodePolyline(encoded, precision = 5) {
+  const factor = 10 ** precision
+  const points = []
+  let index = 0
+  let lat = 0
+  let lng = 0
+  while (index < encoded.length) {
+    const deltas = []
+    for (let k = 0; k < 2; k++) {
+      let shift = 0
+      let result = 0
+      let byte
+      do {
+        byte = encoded.charCodeAt(index++) - 63
+        result |= (byte & 0x1f) << shift
+        shift += 5
+      } while (byte >= 0x20)
+      deltas.push(result & 1 ? ~(result >> 1) : result >> 1)
+    }
+    lat += deltas[0]
+    lng += deltas[1]
+    points.push([lat / factor, lng / factor])
+  }
+  return points
+}
+
+// The last geo-data payload is kept in localStorage; returning visitors only
+// fetch what changed since its version
+const GEO_DATA_CACHE_KEY = 'geoData'
+
+function readCachedGeoData() {
+  try {
+    const cached = JSON.parse(localStorage.getItem(GEO_DATA_CACHE_KEY))
+    return cached && Number.isInteger(cached.version) ? cached : null
+  } catch (err) {
+    return null
+  }
+}
+
+function writeCachedGeoData(data) {
+  try {
+    localStorage.setItem(GEO_DATA_CACHE_KEY, JSON.stringify(data))
+  } catch (err) {
+    // Storage full or disabled: the next visit downloads everything again
+  }
+}
+
+function applyGeoDataChanges(cached, changes) {
+  if (changes.full) return changes
+
+  const byId = new Map(cached.places.map((p) => [p.id, p]))
+  changes.deletedPlaces.forEach((id) => byId.delete(id))
+  changes.places.forEach((p) => byId.set(p.id, p))
+  const merged = [...byId.values()].sort((a, b) =>
+    a.name < b.name ? -1 : a.name > b.name ? 1 : a.id < b.id ? -1 : a.id > b.id ? 1 : 0
+  )
+
+  const removed = new Set(changes.deletedNeighbourhoods)
+  const centers = { ...cached.neighbourhoodCenters, ...changes.neighbourhoodCenters }
+  removed.forEach((name) => delete centers[name])
+  const table = {}
+  for (const [key, row] of Object.entries({ ...cached.transportTable, ...changes.transportTable })) {
+    const [origin, destination] = key.split('|')
+    if (!removed.has(origin) && !removed.has(destination)) table[key] = row
+  }
+
+  return { version: changes.version, neighbourhoodCenters: centers, places: merged, transportTable: table }
+}
+
 function App() {
   const [neighbourhoodCenters, setNeighbourhoodCenters] = useState({})
   const [places, setPlaces] = useState([])
@@ -33,10 +102,13 @@ function App() {
   const mapInstanceRef = useRef(null)
   const markersRef = useRef([])
   const polylineRef = useRef(null)
+  const geoDataRef = useRef(null)
+  const eventsRef = useRef(null)
 
   useEffect(() => {
     loadGeoData()
     initMap()
+    return () => eventsRef.current?.close()
   }, [])
 
   useEffect(() => {
@@ -48,15 +120,16 @@ function App() {
   async function loadGeoData() {
     try {
       setStatus({ message: 'Loading places and transport data…', isError: false })
-      const response = await fetch('/api/geo-data/')
+      const cached = readCachedGeoData()
+      const url = cached ? `/api/geo-data/changes/?since=${cached.version}` : '/api/geo-data/'
+      const response = await fetch(url)
       if (!response.ok) {
         throw new Error(`Failed to load geo data: ${response.status} ${response.statusText}`)
       }
-      const data = await response.json()
-      setNeighbourhoodCenters(data.neighbourhoodCenters || {})
-      setPlaces(data.places || [])
-      setTransportTable(data.transportTable || {})
+      const data = cached ? applyGeoDataChanges(cached, await response.json()) : await response.json()
+      applyGeoData(data)
       setGeoDataLoaded(true)
+      subscribeToGeoDataEvents(data.version)
       setStatus({ message: 'Data loaded from server. You can now generate an itinerary.', isError: false })
     } catch (err) {
       console.error('Error loading geo data:', err)
@@ -65,6 +138,31 @@ function App() {
     }
   }
 
+  function applyGeoData(data) {
+    writeCachedGeoData(data)
+    geoDataRef.current = data
+    setNeighbourhoodCenters(data.neighbourhoodCenters || {})
+    setPlaces(data.places || [])
+    setTransportTable(data.transportTable || {})
+  }
+
+  // Live updates over server-sent events; EventSource reconnects on its own
+  // and resumes from the last event id
+  function subscribeToGeoDataEvents(version) {
+    if (eventsRef.current || typeof EventSource === 'undefined') return
+    const events = new EventSource(`/api/async/events/?since=${version}`)
+    events.addEventListener('changes', (event) => {
+      applyGeoData(applyGeoDataChanges(geoDataRef.current, JSON.parse(event.data)))
+    })
+    events.addEventListener('resync', () => {
+      events.close()
+      eventsRef.current = null
+      localStorage.removeItem(GEO_DATA_CACHE_KEY)
+      loadGeoData()
+    })
+    eventsRef.current = events
+  }
+
   function initMap() {
     if (mapInstanceRef.current) return
     const nairobiCenter = [-1.286389, 36.817223]
@@ -106,44 +204,23 @@ function App() {
     })
   }
 
-  async function fetchRouteSegment(from, to) {
+  async function buildRoadRoute(latLngs) {
     try {
-      const body = {
-        coordinates: [[from.lng, from.lat], [to.lng, to.lat]],
-      }
-      const response = await fetch(ORS_DIRECTIONS_URL, {
+      const response = await fetch('/api/route/', {
         method: 'POST',
-        headers: { Authorization: ORS_API_KEY, 'Content-Type': 'application/json' },
-        body: JSON.stringify(body),
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ coordinates: latLngs, zoom: ROUTE_DETAIL_ZOOM, encoding: 'polyline' }),
       })
       if (!response.ok) return null
       const data = await response.json()
-      if (!data.features || !data.features.length) return null
-      return data.features[0].geometry.coordinates.map(coord => [coord[1], coord[0]])
+      const coordinates = data.polyline ? decodePolyline(data.polyline) : []
+      return coordinates.length ? coordinates : null
     } catch (error) {
-      console.error('Error fetching route segment:', error)
+      console.error('Error fetching road route:', error)
       return null
     }
   }
 
-  async function buildRoadRoute(latLngs) {
-    const fullRoute = []
-    let allSegmentsSucceeded = true
-    for (let i = 0; i < latLngs.length - 1; i++) {
-      const from = { lat: latLngs[i][0], lng: latLngs[i][1] }
-      const to = { lat: latLngs[i + 1][0], lng: latLngs[i + 1][1] }
-      const segment = await fetchRouteSegment(from, to)
-      if (segment && segment.length) {
-        if (fullRoute.length) segment.shift()
-        fullRoute.push(...segment)
-      } else {
-        allSegmentsSucceeded = false
-        break
-      }
-    }
-    return allSegmentsSucceeded ? fullRoute : null
-  }
-
   async function updateMap(stops, startNeighbourhood) {
     if (!mapInstanceRef.current) return
     
@@ -1,10 +1,178 @@
-from django.contrib import admin
+"""
+Admin for the Place and Job tables.
 
-from .models import Place
+The Place changelist is built for tables with millions of rows:
+
+- Filter sidebars list each field's values with counts from one GROUP BY,
+  cached under the dataset version (so a write retires it) instead of a
+  DISTINCT scan on every page view.
+- On PostgreSQL the paginator takes the planner's row estimate from
+  EXPLAIN when it is above ``ADMIN_EXACT_COUNT_THRESHOLD`` rather than
+  running an exact COUNT(*); the full-table count is not shown.
+- Search matches the slug exactly and the name by substring, which the
+  trigram index from migration 0008 serves on PostgreSQL.
+- Bulk edits and deletes run in batches of ``ADMIN_BULK_BATCH_SIZE`` inside
+  ``batched_dataset_writes``, so the aggregates are rebuilt and the version
+  bumped once per action instead of once per row.
+"""
+
+import json
+from contextlib import ExitStack
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Count, Q
+from django.utils.functional import cached_property
+
+from .dataset import batched_dataset_writes, get_dataset_version
+from .models import Job, Place
+
+
+def place_facets(field: str) -> list:
+    """[(value, count)] of a Place field, most common first, cached per dataset version."""
+    key = f"admin-facets:{field}:{get_dataset_version()}"
+    facets = cache.get(key)
+    if facets is None:
+        rows = Place.objects.order_by().values_list(field).annotate(count=Count("pk")).order_by("-count", field)
+        facets = list(rows[:settings.ADMIN_FACET_LIMIT])
+        cache.set(key, facets, settings.ADMIN_FACET_TIMEOUT)
+    return facets
+
+
+def cached_facet_filter(field: str, filter_title: str):
+    """A list filter over ``field`` whose choices come from ``place_facets``."""
+
+    class CachedFacetFilter(admin.SimpleListFilter):
+        title = filter_title
+        parameter_name = field
+
+        def lookups(self, request, model_admin):
+            return [(value, f"{value or '(blank)'} ({count})") for value, count in place_facets(field)]
+
+        def queryset(self, request, queryset):
+            if self.value() is None:
+                return queryset
+            return queryset.filter(**{field: self.value()})
+
+    return CachedFacetFilter
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the PostgreSQL planner's row estimate for large results."""
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        connection = connections[qs.db]
+        if connection.vendor != "postgresql":
+            return super().count
+
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = int(plan[0]["Plan"]["Plan Rows"])
+        if estimate < settings.ADMIN_EXACT_COUNT_THRESHOLD:
+            return super().count
+        return estimate
+
+
+class PlaceActionForm(ActionForm):
+    category = forms.CharField(required=False, max_length=50)
+    price_tier = forms.CharField(required=False, max_length=20)
+
+
+def _in_batches(queryset, apply) -> int:
+    """
+    Call ``apply(pks)`` per batch of the queryset's primary keys, inside
+    one ``batched_dataset_writes`` per touched region. Returns the row count.
+
+    Each batch commits on its own. If one fails, the batches before it stay
+    applied, so the aggregates are still rebuilt and the version bumped for
+    them before the error is raised.
+    """
+    regions = list(queryset.order_by().values_list("region", flat=True).distinct())
+    pks = list(queryset.order_by().values_list("pk", flat=True).iterator(chunk_size=settings.ADMIN_BULK_BATCH_SIZE))
+    error = None
+    with ExitStack() as stack:
+        for region in regions:
+            stack.enter_context(batched_dataset_writes(region))
+        for start in range(0, len(pks), settings.ADMIN_BULK_BATCH_SIZE):
+            try:
+                with transaction.atomic():
+                    apply(pks[start:start + settings.ADMIN_BULK_BATCH_SIZE])
+            except Exception as exc:
+                if not start:
+                    raise  # Nothing committed, nothing to rebuild
+                error = exc
+                break
+    if error is not None:
+        raise error
+    return len(pks)
 
 
 @admin.register(Place)
 class PlaceAdmin(admin.ModelAdmin):
-    list_display = ("slug", "name", "category", "neighbourhood", "price_tier")
-    list_filter = ("category", "price_tier", "neighbourhood")
+    list_display = ("slug", "name", "region", "category", "neighbourhood", "price_tier")
+    list_filter = (
+        cached_facet_filter("region", "region"),
+        cached_facet_filter("category", "category"),
+        cached_facet_filter("price_tier", "price tier"),
+        cached_facet_filter("neighbourhood", "neighbourhood"),
+    )
     search_fields = ("slug", "name")
+    search_help_text = "Exact slug, or part of the name."
+    ordering = ("region", "name")  # Served by place_region_name_idx
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    action_form = PlaceActionForm
+    actions = ("set_category", "set_price_tier", "delete_in_batches")
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Loads every selected object and its relations; delete_in_batches doesn't
+        actions.pop("delete_selected", None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        return queryset.filter(Q(slug=term) | Q(name__icontains=term)), False
+
+    def _set_field(self, request, queryset, field):
+        value = request.POST.get(field, "").strip()
+        if not value:
+            self.message_user(request, f"Enter a {field.replace('_', ' ')} to set.", messages.ERROR)
+            return
+        count = _in_batches(queryset, lambda pks: Place.objects.filter(pk__in=pks).update(**{field: value}))
+        self.message_user(request, f"Set {field.replace('_', ' ')} to {value!r} on {count} places.")
+
+    @admin.action(description="Set category of selected places", permissions=["change"])
+    def set_category(self, request, queryset):
+        self._set_field(request, queryset, "category")
+
+    @admin.action(description="Set price tier of selected places", permissions=["change"])
+    def set_price_tier(self, request, queryset):
+        self._set_field(request, queryset, "price_tier")
+
+    @admin.action(description="Delete selected places (in batches)", permissions=["delete"])
+    def delete_in_batches(self, request, queryset):
+        count = _in_batches(queryset, lambda pks: Place.objects.filter(pk__in=pks).delete())
+        self.message_user(request, f"Deleted {count} places.")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "attempts", "run_after", "locked_by", "dedupe_key")
+    list_filter = ("status", "kind")
+    search_fields = ("dedupe_key",)
+    readonly_fields = ("locked_by", "locked_at", "last_error", "created_at", "finished_at")
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class TripsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
     name = 'trips'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
@@ -0,0 +1,210 @@
+"""
+Hierarchical marker clustering, in the style of supercluster.
+
+Places are projected to Web Mercator in [0, 1] and clustered greedily from
+the deepest zoom upwards: at each zoom every unclustered point absorbs its
+neighbours within ``CLUSTER_RADIUS_PX`` pixels, and the weighted centroids
+become the input of the next zoom out. Each level keeps its own KD-tree,
+so a viewport query is a range search on one level.
+
+Each region's index is built lazily per process and rebuilt when the
+dataset version changes. An index prebuilt elsewhere (``warm_start``) can
+be offered with ``preload_cluster_index``, like a place snapshot.
+"""
+
+import math
+import operator
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .serializers import PLACE_MARKER_SPEC
+from .snapshot import PlaceRow, get_place_snapshot
+from .spatial import KDTree
+
+MIN_ZOOM = 0
+MAX_ZOOM = 16  # Above this zoom individual places are returned
+CLUSTER_RADIUS_PX = 60
+TILE_EXTENT_PX = 512
+
+
+def _project(lat: np.ndarray, lng: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    x = lng / 360.0 + 0.5
+    sin = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    y = 0.5 - 0.25 * np.log((1 + sin) / (1 - sin)) / math.pi
+    return x, y
+
+
+def _unproject(x: float, y: float) -> Tuple[float, float]:
+    lng = (x - 0.5) * 360.0
+    lat = math.degrees(2 * math.atan(math.exp((1 - 2 * y) * math.pi)) - math.pi / 2)
+    return lat, lng
+
+
+def _isolated(xs: np.ndarray, ys: np.ndarray, radius: float) -> np.ndarray:
+    """Mask of points with no other point in the surrounding 3x3 grid cells."""
+    cx = np.floor(xs / radius).astype(np.int64)
+    cy = np.floor(ys / radius).astype(np.int64)
+    stride = int(cy.max()) + 3 if len(cy) else 1
+    keys = cx * stride + cy
+    cells, counts = np.unique(keys, return_counts=True)
+
+    neighbours = np.zeros(len(xs), dtype=np.int64)
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            probe = keys + dx * stride + dy
+            pos = np.minimum(np.searchsorted(cells, probe), len(cells) - 1)
+            neighbours += np.where(cells[pos] == probe, counts[pos], 0)
+    return neighbours == 1
+
+
+class ClusterLevel:
+    """Points at one zoom level: singles (place index) or clusters (-1)."""
+
+    def __init__(
+        self, xs: np.ndarray, ys: np.ndarray, counts: np.ndarray, place_idx: np.ndarray,
+        tree: Optional[KDTree] = None,
+    ):
+        self.xs = xs
+        self.ys = ys
+        self.counts = counts
+        self.place_idx = place_idx
+        self.tree = KDTree(xs, ys) if tree is None else tree
+
+
+def marker_rows(rows: Iterable[PlaceRow]) -> List[tuple]:
+    """Snapshot rows as the tuples of ``PLACE_MARKER_SPEC.columns`` a ``ClusterIndex`` holds."""
+    return list(map(operator.attrgetter(*PLACE_MARKER_SPEC.columns), rows))
+
+
+def level_zoom(zoom: int) -> int:
+    """Zoom of the level served for a requested ``zoom``: clamped to the levels built."""
+    return max(MIN_ZOOM, min(int(zoom), MAX_ZOOM + 1))
+
+
+class ClusterIndex:
+    def __init__(self, version: int, rows: Sequence[tuple], levels: Optional[Dict[int, ClusterLevel]] = None):
+        """
+        Cluster ``rows`` (tuples of ``PLACE_MARKER_SPEC.columns``), or adopt
+        the ``levels`` of an index built earlier over the same rows.
+        """
+        self.version = version
+        self.rows = list(rows)
+        if levels is not None:
+            self.levels = levels
+            return
+        n = len(self.rows)
+
+        lat_col = PLACE_MARKER_SPEC.columns.index("lat")
+        lng_col = PLACE_MARKER_SPEC.columns.index("lng")
+        lats = np.array([r[lat_col] for r in self.rows], dtype=np.float64)
+        lngs = np.array([r[lng_col] for r in self.rows], dtype=np.float64)
+        xs, ys = _project(lats, lngs)
+
+        self.levels: Dict[int, ClusterLevel] = {}
+        level = ClusterLevel(xs, ys, np.ones(n, dtype=np.int64), np.arange(n, dtype=np.int64))
+        self.levels[MAX_ZOOM + 1] = level
+        for zoom in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+            level = self._cluster(level, zoom)
+            self.levels[zoom] = level
+
+    @staticmethod
+    def _cluster(level: ClusterLevel, zoom: int) -> ClusterLevel:
+        radius = CLUSTER_RADIUS_PX / (TILE_EXTENT_PX * 2 ** zoom)
+        n = len(level.xs)
+        # Points with nothing else in their 3x3 block of radius-sized cells
+        # can neither absorb nor be absorbed, so skip their neighbour search
+        visited = _isolated(level.xs, level.ys, radius)
+        out_x: List[float] = level.xs[visited].tolist()
+        out_y: List[float] = level.ys[visited].tolist()
+        out_count: List[int] = level.counts[visited].tolist()
+        out_idx: List[int] = level.place_idx[visited].tolist()
+
+        for i in range(n):
+            if visited[i]:
+                continue
+            visited[i] = True
+            neighbours = level.tree.within(level.xs[i], level.ys[i], radius)
+            neighbours = neighbours[~visited[neighbours]]
+
+            if not len(neighbours):
+                out_x.append(level.xs[i])
+                out_y.append(level.ys[i])
+                out_count.append(int(level.counts[i]))
+                out_idx.append(int(level.place_idx[i]))
+                continue
+
+            visited[neighbours] = True
+            members = np.concatenate(([i], neighbours))
+            weights = level.counts[members]
+            total = int(weights.sum())
+            out_x.append(float((level.xs[members] * weights).sum() / total))
+            out_y.append(float((level.ys[members] * weights).sum() / total))
+            out_count.append(total)
+            out_idx.append(-1)
+
+        return ClusterLevel(
+            np.asarray(out_x, dtype=np.float64),
+            np.asarray(out_y, dtype=np.float64),
+            np.asarray(out_count, dtype=np.int64),
+            np.asarray(out_idx, dtype=np.int64),
+        )
+
+    def get_clusters(self, west: float, south: float, east: float, north: float, zoom: int) -> List[dict]:
+        """
+        Clusters and single places inside the bounding box at ``zoom``.
+        Boxes crossing the antimeridian are split in two.
+        """
+        if west > east:
+            return self.get_clusters(west, south, 180.0, north, zoom) + self.get_clusters(-180.0, south, east, north, zoom)
+
+        level = self.levels[level_zoom(zoom)]
+        (min_x, max_x), (max_y, min_y) = _project(np.array([south, north]), np.array([west, east]))
+        hits = level.tree.range(min_x, min_y, max_x, max_y)
+
+        marker = PLACE_MARKER_SPEC.compile()
+        features = []
+        for i in hits.tolist():
+            idx = int(level.place_idx[i])
+            if idx >= 0:
+                features.append({"type": "place", **marker(self.rows[idx])})
+            else:
+                lat, lng = _unproject(level.xs[i], level.ys[i])
+                features.append(
+                    {
+                        "type": "cluster",
+                        "count": int(level.counts[i]),
+                        "coords": {"lat": lat, "lng": lng},
+                    }
+                )
+        return features
+
+
+_indexes: Dict[str, ClusterIndex] = {}
+_index_lock = threading.Lock()
+_preloaded: Dict[str, ClusterIndex] = {}
+
+
+def preload_cluster_index(region: str, index: ClusterIndex) -> None:
+    _preloaded[region] = index
+
+
+def _take_preloaded(region: str, version: int) -> Optional[ClusterIndex]:
+    index = _preloaded.pop(region, None)
+    return index if index is not None and index.version == version else None
+
+
+def get_cluster_index(region: str) -> ClusterIndex:
+    """Return this process's cluster index of ``region``, rebuilding it for a new dataset version."""
+    snapshot = get_place_snapshot(region)
+    index = _indexes.get(region)
+    if index is None or index.version != snapshot.version:
+        with _index_lock:
+            index = _indexes.get(region)
+            if index is None or index.version != snapshot.version:
+                index = _take_preloaded(region, snapshot.version) or ClusterIndex(
+                    snapshot.version, marker_rows(snapshot.rows)
+                )
+                _indexes[region] = index
+    return index
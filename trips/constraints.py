@@ -0,0 +1,152 @@
+"""
+Range index over the numeric place constraints (stage 2 of the planner).
+
+For each attribute — cost (``entry_fee + avg_food``), ``duration_min`` and
+``rating`` — the row ordinals of a snapshot are kept sorted by value, so the
+rows within a range are one slice found by binary search. A conjunctive
+query takes the narrowest of its ranges and checks the remaining ones only
+on that slice, so it costs ``O(log n)`` plus the size of its most
+selective range instead of a pass over every place. ``price_tier`` is an
+exact match, answered from per-tier ordinal lists.
+
+Results are sorted arrays of row ordinals into the snapshot, the same
+ordinals ``RankingIndex`` takes as ``candidates``, and a query can be
+narrowed to the ``candidates`` of another filter.
+"""
+
+import threading
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .snapshot import PlaceRow, get_place_snapshot
+
+Bounds = Tuple[Optional[float], Optional[float]]
+
+ATTRIBUTES = ("cost", "duration", "rating")
+
+# Share of the budget a single stop may cost, as in the frontends' stage2BudgetFilter
+BUDGET_SHARE = 0.6
+
+
+class ConstraintIndex:
+    def __init__(self, version: int, rows: Sequence[PlaceRow]):
+        self.version = version
+        self.size = len(rows)
+        self.columns: Dict[str, np.ndarray] = {
+            "cost": np.array([row.entry_fee + row.avg_food for row in rows], dtype=np.float64),
+            "duration": np.array([row.duration_min for row in rows], dtype=np.float64),
+            "rating": np.array([row.rating for row in rows], dtype=np.float64),
+        }
+        self._order: Dict[str, np.ndarray] = {}
+        self._sorted: Dict[str, np.ndarray] = {}
+        for name, values in self.columns.items():
+            order = np.argsort(values, kind="stable")
+            self._order[name] = order
+            self._sorted[name] = values[order]
+
+        self.price_tiers: Dict[str, np.ndarray] = {}
+        tiers = np.array([row.price_tier for row in rows], dtype=object)
+        for tier in set(tiers):
+            self.price_tiers[tier] = np.flatnonzero(tiers == tier)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _slice(self, name: str, bounds: Bounds) -> np.ndarray:
+        """Unsorted ordinals with ``low <= value <= high`` for one attribute."""
+        low, high = bounds
+        values = self._sorted[name]
+        start = 0 if low is None else int(np.searchsorted(values, low, side="left"))
+        stop = len(values) if high is None else int(np.searchsorted(values, high, side="right"))
+        return self._order[name][start:max(start, stop)]
+
+    def _count(self, name: str, bounds: Bounds) -> int:
+        low, high = bounds
+        values = self._sorted[name]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        stop = len(values) if high is None else np.searchsorted(values, high, side="right")
+        return max(0, int(stop - start))
+
+    def query(
+        self,
+        *,
+        cost: Bounds = (None, None),
+        duration: Bounds = (None, None),
+        rating: Bounds = (None, None),
+        price_tiers: Optional[Iterable[str]] = None,
+        candidates: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """
+        Sorted ordinals of the places within every given range (inclusive;
+        None leaves that side open), with a price tier in ``price_tiers``
+        if given, and among ``candidates`` if given.
+        """
+        ranges = {
+            name: bounds
+            for name, bounds in zip(ATTRIBUTES, (cost, duration, rating))
+            if bounds != (None, None)
+        }
+
+        # Start from the smallest set we can get without scanning
+        options = [(self._count(name, bounds), "range", name) for name, bounds in ranges.items()]
+        if price_tiers is not None:
+            tiers = [self.price_tiers[t] for t in set(price_tiers) if t in self.price_tiers]
+            options.append((sum(map(len, tiers)), "tiers", None))
+        if candidates is not None:
+            candidates = np.asarray(candidates, dtype=np.int64)
+            options.append((len(candidates), "candidates", None))
+        if not options:
+            return np.arange(self.size, dtype=np.int64)
+
+        _, source, name = min(options, key=lambda option: option[0])
+        if source == "range":
+            rows = self._slice(name, ranges.pop(name))
+        elif source == "tiers":
+            rows = np.concatenate(tiers) if tiers else np.zeros(0, dtype=np.int64)
+            price_tiers = None
+        else:
+            rows = candidates
+            candidates = None
+
+        mask = np.ones(len(rows), dtype=bool)
+        for name, (low, high) in ranges.items():
+            values = self.columns[name][rows]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        rows = np.sort(rows[mask])
+
+        if price_tiers is not None:
+            rows = rows[self._members(tiers)[rows]]
+        if candidates is not None:
+            rows = rows[self._members([candidates])[rows]]
+        return rows
+
+    def _members(self, ordinal_sets) -> np.ndarray:
+        # A mask over all places is a memset; np.intersect1d would sort both sides
+        members = np.zeros(self.size, dtype=bool)
+        for ordinals in ordinal_sets:
+            members[ordinals] = True
+        return members
+
+    def within_budget(self, budget: float, candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """Ordinals of the places a stage-2 budget filter keeps."""
+        return self.query(cost=(None, budget * BUDGET_SHARE), candidates=candidates)
+
+
+_indexes: Dict[str, ConstraintIndex] = {}
+_index_lock = threading.Lock()
+
+
+def get_constraint_index(region: str) -> ConstraintIndex:
+    """Return this process's constraint index of ``region``, rebuilding it for a new dataset version."""
+    snapshot = get_place_snapshot(region)
+    index = _indexes.get(region)
+    if index is None or index.version != snapshot.version:
+        with _index_lock:
+            index = _indexes.get(region)
+            if index is None or index.version != snapshot.version:
+                index = _indexes[region] = ConstraintIndex(snapshot.version, snapshot.rows)
+    return index
@@ -0,0 +1,136 @@
+"""
+Primary/replica database routing.
+
+Reads go to a replica only while handling a safe (GET/HEAD/OPTIONS) request
+that ``ReplicaRoutingMiddleware`` has cleared for it. Everything else uses
+the primary: writes, reads inside a transaction, admin POSTs, management
+commands and loaders. After a write the client gets a short-lived cookie
+that keeps its following requests on the primary, so a user always reads
+their own writes.
+
+Replicas are picked round-robin. A replica that fails to connect is skipped
+for ``DATABASE_REPLICA_RETRY_SECONDS``, and reads fall back to the primary
+when none are healthy. A replica that fails in the middle of a safe
+request gets the same treatment: the middleware marks it down and runs the
+view again on the primary.
+"""
+
+import contextvars
+import itertools
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import OperationalError
+
+PIN_COOKIE = "db_pin_primary"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+_replica_reads_allowed = contextvars.ContextVar("replica_reads_allowed", default=False)
+_wrote = contextvars.ContextVar("wrote_to_primary", default=False)
+_replicas_read = contextvars.ContextVar("replicas_read", default=())
+
+
+def replica_aliases() -> List[str]:
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+class ReplicaHealth:
+    """Tracks which replicas are usable, checking each at most once per interval."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._down_until: Dict[str, float] = {}
+        self._checked_at: Dict[str, float] = {}
+
+    def is_healthy(self, alias: str) -> bool:
+        now = time.monotonic()
+        if self._down_until.get(alias, 0) > now:
+            return False
+        if now - self._checked_at.get(alias, 0) < settings.DATABASE_REPLICA_CHECK_SECONDS:
+            return True
+
+        self._checked_at[alias] = now
+        try:
+            connections[alias].ensure_connection()
+        except OperationalError:
+            self.mark_down(alias)
+            return False
+        return True
+
+    def mark_down(self, alias: str) -> None:
+        with self._lock:
+            self._down_until[alias] = time.monotonic() + settings.DATABASE_REPLICA_RETRY_SECONDS
+
+
+health = ReplicaHealth()
+_round_robin = itertools.count()
+
+
+def choose_replica() -> Optional[str]:
+    """Next healthy replica in round-robin order, or None."""
+    aliases = replica_aliases()
+    if not aliases:
+        return None
+    start = next(_round_robin)
+    for offset in range(len(aliases)):
+        alias = aliases[(start + offset) % len(aliases)]
+        if health.is_healthy(alias):
+            return alias
+    return None
+
+
+def begin_request(allow_replica: bool) -> tuple:
+    """Start routing state for one request; pass the result to ``end_request``."""
+    return _replica_reads_allowed.set(allow_replica), _wrote.set(False), _replicas_read.set(())
+
+
+def end_request(tokens: tuple) -> None:
+    allowed_token, wrote_token, replicas_token = tokens
+    _replica_reads_allowed.reset(allowed_token)
+    _wrote.reset(wrote_token)
+    _replicas_read.reset(replicas_token)
+
+
+def wrote_to_primary() -> bool:
+    return _wrote.get()
+
+
+def replicas_read() -> tuple:
+    """Replicas this request has been routed to."""
+    return _replicas_read.get()
+
+
+def fail_over_to_primary() -> None:
+    """Mark the replicas this request read from down and send its further reads to the primary."""
+    for alias in _replicas_read.get():
+        health.mark_down(alias)
+    _replica_reads_allowed.set(False)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads_allowed.get() or _wrote.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        alias = choose_replica()
+        if alias is None:
+            return DEFAULT_DB_ALIAS
+        if alias not in _replicas_read.get():
+            _replicas_read.set(_replicas_read.get() + (alias,))
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Anything read after a write in this context must see that write
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,222 @@
+"""
+Near-duplicate detection for place imports.
+
+Rows are bucketed by geohash cell, and each row is only compared with the
+rows already seen in its own cell and the eight around it. The cell size is
+chosen so that every pair within ``radius_m`` lands in neighbouring cells.
+Within the cells rows are further blocked on their names: two rows are only
+compared when a word of both starts or ends with the same
+``NAME_AFFIX_LENGTH`` letters (so a single typo keeps one of the two). An
+affix more than ``MAX_BLOCK_SIZE`` rows of a cell share ("hot" of "hotel")
+does not count there, and a name left without affixes is blocked on the
+whole name. Many places geocoded to one point (a city center) therefore do
+not all compare with each other, and detection stays close to O(n). Two
+rows are duplicates when they are within the radius and their normalized
+names match; duplicates are grouped into clusters with union-find.
+
+Rows that share an exact coordinate under different names are reported
+separately as stacked points: they are usually geocoded to a city center
+rather than duplicated, so they are never merged.
+"""
+
+import difflib
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from .geometry import EARTH_RADIUS_M
+
+DEFAULT_RADIUS_M = 100.0
+DEFAULT_NAME_SIMILARITY = 0.85  # difflib ratio between normalized names
+STACK_MIN_SIZE = 3  # Distinct names on one coordinate before it is reported
+NAME_AFFIX_LENGTH = 3
+MAX_BLOCK_SIZE = 64  # Rows of a cell an affix may be shared by and still block
+
+_NAME_STOPWORDS = {"the", "ltd", "limited"}
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """(lat, lng) size of a geohash cell in degrees."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def geohash_cell(lat: float, lng: float, precision: int) -> Tuple[int, int]:
+    """
+    (row, column) of the geohash cell containing (lat, lng). Same cells as
+    the base-32 strings, without the bit interleaving, so neighbours are
+    just the adjacent rows and columns.
+    """
+    dlat, dlng = geohash_cell_size(precision)
+    return int((lat + 90.0) // dlat), int((lng + 180.0) // dlng)
+
+
+def precision_for_radius(radius_m: float, max_abs_lat: float = 0.0) -> int:
+    """
+    Longest geohash whose cells are still at least ``radius_m`` across at
+    ``max_abs_lat``, so any two points within the radius are in the same or
+    adjacent cells.
+    """
+    metres_per_degree = math.pi * EARTH_RADIUS_M / 180.0
+    shrink = math.cos(math.radians(min(max_abs_lat, 89.0)))
+    for precision in range(12, 0, -1):
+        dlat, dlng = geohash_cell_size(precision)
+        if min(dlat, dlng * shrink) * metres_per_degree >= radius_m:
+            return precision
+    return 1
+
+
+def normalize_name(name: str) -> str:
+    """Lower-case, accent- and punctuation-free name for comparisons."""
+    name = unicodedata.normalize("NFKD", name or "")
+    name = "".join(ch for ch in name if not unicodedata.combining(ch)).lower()
+    name = name.replace("&", " and ")
+    words = re.findall(r"[a-z0-9]+", name)
+    return " ".join(word for word in words if word not in _NAME_STOPWORDS)
+
+
+def names_match(a: str, b: str, threshold: float = DEFAULT_NAME_SIMILARITY) -> bool:
+    if a == b:
+        return True
+    if not a or not b:
+        return False
+    # The quick ratios are upper bounds of ratio() and much cheaper
+    matcher = difflib.SequenceMatcher(None, a, b)
+    return matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold
+
+
+def name_affixes(name: str) -> set:
+    """Leading and trailing letters of each word of a normalized name."""
+    keys = set()
+    for word in name.split():
+        keys.update(("<" + word[:NAME_AFFIX_LENGTH], ">" + word[-NAME_AFFIX_LENGTH:]))
+    return keys
+
+
+def name_blocks(names: Sequence[str], cells: Sequence[Tuple[int, int]]) -> List[Tuple[str, ...]]:
+    """Blocking keys of each normalized name in its cell (see the module docstring)."""
+    affixes = [name_affixes(name) for name in names]
+    counts = Counter((cell, key) for cell, keys in zip(cells, affixes) for key in keys)
+    return [
+        tuple(key for key in keys if counts[cell, key] <= MAX_BLOCK_SIZE) or ("=" + name,)
+        for name, cell, keys in zip(names, cells, affixes)
+    ]
+
+
+def distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    h = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
+
+
+class Candidate(NamedTuple):
+    name: str
+    lat: float
+    lng: float
+
+
+class DuplicateReport(NamedTuple):
+    clusters: List[List[int]]  # Indices into the candidates, in input order
+    stacks: List[List[int]]  # Distinct names sharing one exact coordinate
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            # Keep the earliest row as the root
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+def find_duplicates(
+    candidates: Sequence[Candidate],
+    radius_m: float = DEFAULT_RADIUS_M,
+    name_similarity: float = DEFAULT_NAME_SIMILARITY,
+) -> DuplicateReport:
+    """Group near-duplicate ``candidates`` and find stacked coordinates."""
+    if not candidates:
+        return DuplicateReport([], [])
+
+    max_abs_lat = max(abs(c.lat) for c in candidates)
+    precision = precision_for_radius(radius_m, max_abs_lat)
+    names = [normalize_name(c.name) for c in candidates]
+    home = [geohash_cell(c.lat, c.lng, precision) for c in candidates]
+    blocks = name_blocks(names, home)
+    columns = int(round(360.0 / geohash_cell_size(precision)[1]))
+    # Rows seen so far per (cell, name block)
+    cells: Dict[Tuple[int, int, str], List[int]] = defaultdict(list)
+    uf = _UnionFind(len(candidates))
+
+    for i, c in enumerate(candidates):
+        row, column = home[i]
+        neighbours = {(row + di, (column + dj) % columns) for di in (-1, 0, 1) for dj in (-1, 0, 1)}
+        compared = set()
+        for cell_row, cell_column in neighbours:
+            for key in blocks[i]:
+                for j in cells.get((cell_row, cell_column, key), ()):
+                    if j in compared:
+                        continue
+                    compared.add(j)
+                    other = candidates[j]
+                    if (
+                        uf.find(i) != uf.find(j)
+                        and distance_m(c.lat, c.lng, other.lat, other.lng) <= radius_m
+                        and names_match(names[i], names[j], name_similarity)
+                    ):
+                        uf.union(i, j)
+        for key in blocks[i]:
+            cells[row, column, key].append(i)
+
+    groups: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(candidates)):
+        groups[uf.find(i)].append(i)
+    clusters = [members for members in groups.values() if len(members) > 1]
+
+    by_point: Dict[Tuple[float, float], Dict[int, None]] = defaultdict(dict)
+    for i, c in enumerate(candidates):
+        by_point[(round(c.lat, 6), round(c.lng, 6))][uf.find(i)] = None
+    stacks = [list(roots) for roots in by_point.values() if len(roots) >= STACK_MIN_SIZE]
+
+    return DuplicateReport(sorted(clusters), sorted(stacks))
+
+
+def merge_records(records: Iterable[dict]) -> dict:
+    """
+    Collapse one cluster of place dicts into the first, adding the tags and
+    vibes of the others.
+    """
+    records = list(records)
+    merged = dict(records[0])
+    for field in ("tags", "vibes"):
+        values: Dict[str, None] = {}
+        for record in records:
+            values.update(dict.fromkeys(record.get(field) or []))
+        merged[field] = list(values)
+    return merged
+
+
+def cluster_label(
+    members: Sequence[int], candidates: Sequence[Candidate], slugs: Optional[Sequence[str]] = None
+) -> str:
+    """One-line description of a cluster for command output."""
+    parts = []
+    for i in members:
+        c = candidates[i]
+        label = slugs[i] if slugs else c.name
+        parts.append(f"{label} ({c.lat:.5f}, {c.lng:.5f})")
+    return ", ".join(parts)
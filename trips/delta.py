@@ -0,0 +1,137 @@
+"""
+Delta sync for the geo-data payload.
+
+Every single-place write stamps the row with the dataset version it
+produced (``Place.updated_seq``), deletes leave a ``PlaceTombstone``, and
+neighbourhoods whose center moved are stamped the same way. A client that
+last synced at version ``since`` then only needs the places, tombstones and
+neighbourhoods stamped after it.
+
+A client gets a full download instead when ``since`` is below the sync
+floor: bulk loads don't stamp rows and move the floor to their version, and
+pruning tombstones moves it past the pruned deletes.
+"""
+
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .dataset import VERSION_ROW_ID, bump_dataset_version, get_dataset_version, get_sync_floor
+from .models import DatasetVersion, NeighbourhoodStats, Place, PlaceTombstone
+from .neighbourhoods import PlaceKey, apply_place_change
+
+
+class Changes(NamedTuple):
+    version: int
+    places: list  # Place rows as tuples of ``columns``
+    deleted_places: List[str]
+    neighbourhood_centers: dict  # {name: {"lat", "lng"}} of moved neighbourhoods in the region
+    deleted_neighbourhoods: List[str]
+
+
+def _moved_neighbourhoods(old: Optional[PlaceKey], new: Optional[PlaceKey]) -> Set[Tuple[str, str]]:
+    """
+    (region, neighbourhood) pairs whose center moves when a place goes
+    from ``old`` to ``new``.
+    """
+    if old is not None and new is not None and (old[:2], old[3:]) == (new[:2], new[3:]):
+        return set()
+    return {key[:2] for key in (old, new) if key is not None}
+
+
+def _stamp_neighbourhoods(keys: Iterable[Tuple[str, str]], seq: int) -> None:
+    condition = Q()
+    for region, name in keys:
+        condition |= Q(region=region, name=name)
+    if condition:
+        NeighbourhoodStats.objects.filter(condition).update(updated_seq=seq)
+
+
+def _tombstone(slug: str, region: str, seq: int) -> None:
+    PlaceTombstone.objects.update_or_create(
+        slug=slug, region=region, defaults={"deleted_seq": seq, "deleted_at": timezone.now()}
+    )
+
+
+def record_place_saved(slug: str, old: Optional[PlaceKey], new: PlaceKey) -> int:
+    """
+    Apply a saved place to the aggregates, bump the dataset version and
+    stamp the changed rows with it. Returns the new version.
+    """
+    # One transaction, so a reader that sees the new version also sees its stamps
+    with transaction.atomic():
+        apply_place_change(old, new)
+        seq = bump_dataset_version()
+        Place.objects.filter(pk=slug).update(updated_seq=seq)
+        PlaceTombstone.objects.filter(slug=slug, region=new[0]).delete()
+        if old is not None and old[0] != new[0]:
+            # Moved to another region: it's a delete for clients of the old one
+            _tombstone(slug, old[0], seq)
+        _stamp_neighbourhoods(_moved_neighbourhoods(old, new), seq)
+    return seq
+
+
+def record_place_deleted(slug: str, key: PlaceKey) -> int:
+    """Counterpart of ``record_place_saved`` for a deleted place."""
+    with transaction.atomic():
+        apply_place_change(key, None)
+        seq = bump_dataset_version()
+        _tombstone(slug, key[0], seq)
+        _stamp_neighbourhoods(_moved_neighbourhoods(key, None), seq)
+    return seq
+
+
+def get_changes(since: int, columns: Iterable[str], region: str) -> Optional[Changes]:
+    """
+    Return everything in ``region`` that changed after version ``since``,
+    with places as tuples of ``columns``, or None if the client must
+    download the full region instead.
+
+    The version is read first, so a write landing mid-query is either
+    included or picked up again on the next sync; upserts are idempotent.
+    """
+    version = get_dataset_version()
+    if since > version or since < get_sync_floor():
+        return None
+    if since == version:
+        return Changes(version, [], [], {}, [])
+
+    places = list(
+        Place.objects.filter(region=region, updated_seq__gt=since).order_by("name", "slug").values_list(*columns)
+    )
+    deleted_places = list(
+        PlaceTombstone.objects.filter(region=region, deleted_seq__gt=since)
+        .order_by("slug")
+        .values_list("slug", flat=True)
+    )
+
+    centers = {}
+    deleted_neighbourhoods = []
+    for name, lat_sum, lng_sum, count in NeighbourhoodStats.objects.filter(
+        region=region, updated_seq__gt=since
+    ).values_list("name", "lat_sum", "lng_sum", "place_count"):
+        if count:
+            centers[name] = {"lat": lat_sum / count, "lng": lng_sum / count}
+        else:
+            deleted_neighbourhoods.append(name)
+
+    return Changes(version, places, deleted_places, centers, deleted_neighbourhoods)
+
+
+@transaction.atomic
+def prune_tombstones(before: datetime) -> int:
+    """
+    Delete tombstones older than ``before`` and raise the sync floor past
+    them, so clients that could have missed those deletes resync in full.
+    Returns the number of tombstones removed.
+    """
+    old = PlaceTombstone.objects.filter(deleted_at__lt=before)
+    last_seq = old.aggregate(Max("deleted_seq"))["deleted_seq__max"]
+    if last_seq is None:
+        return 0
+    removed, _ = old.delete()
+    DatasetVersion.objects.filter(pk=VERSION_ROW_ID, sync_floor__lt=last_seq).update(sync_floor=last_seq)
+    return removed
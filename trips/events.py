@@ -0,0 +1,123 @@
+"""
+Pub/sub of dataset changes for the server-sent events stream.
+
+A broker tells this process's open streams the latest dataset version; each
+stream then sends its client the delta since the version it last sent, so
+a burst of writes collapses into one event and a client that reconnects
+with ``Last-Event-ID`` resumes exactly where it stopped.
+
+``LocalBroker`` only sees bumps made in this process (the ``dataset_changed``
+signal) and suits a single server process or tests. ``DatabaseBroker`` also
+polls ``DatasetVersion`` once per process, so it picks up writes from other
+workers and loader commands. ``EVENTS_BROKER`` selects the class.
+"""
+
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils.module_loading import import_string
+
+from .dataset import aget_dataset_version
+
+
+class Subscription:
+    """Latest version seen by one stream, set from any thread."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.latest = 0
+        self._event = asyncio.Event()
+
+    def offer(self, version: int) -> None:
+        # Runs on ``loop``
+        if version > self.latest:
+            self.latest = version
+            self._event.set()
+
+    async def wait(self, timeout: float) -> Optional[int]:
+        """Return the latest version once it moves, or None after ``timeout`` seconds."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._event.clear()
+        return self.latest
+
+
+class LocalBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def publish(self, version: int) -> None:
+        """Offer ``version`` to every subscription; safe to call from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, version)
+            except RuntimeError:  # Loop already closed
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self):
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        self._subscribed()
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions.discard(subscription)
+
+    def has_subscribers(self) -> bool:
+        with self._lock:
+            return bool(self._subscriptions)
+
+    def _subscribed(self) -> None:
+        pass
+
+
+class DatabaseBroker(LocalBroker):
+    """
+    ``LocalBroker`` plus one polling task per event loop that reads the
+    dataset version every ``EVENTS_POLL_SECONDS`` while streams are open.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._pollers = {}
+
+    def _subscribed(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Pollers stop when their loop has no streams left
+        self._pollers = {key: task for key, task in self._pollers.items() if not task.done()}
+        if loop not in self._pollers:
+            self._pollers[loop] = loop.create_task(self._poll())
+
+    async def _poll(self) -> None:
+        while self.has_subscribers():
+            try:
+                self.publish(await aget_dataset_version())
+            except DatabaseError:
+                pass  # Keep the streams open; the next poll retries
+            await asyncio.sleep(settings.EVENTS_POLL_SECONDS)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return this process's broker, creating it from ``EVENTS_BROKER`` on first use."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(settings.EVENTS_BROKER)()
+    return _broker
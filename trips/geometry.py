@@ -0,0 +1,115 @@
+"""
+Route geometry helpers: Douglas-Peucker simplification at a zoom-dependent
+tolerance and Google encoded-polyline encoding/decoding.
+"""
+
+import math
+from typing import List, Sequence
+
+EARTH_RADIUS_M = 6371000.0
+# Web Mercator ground resolution at zoom 0 on the equator (metres per pixel)
+METERS_PER_PIXEL_Z0 = 156543.03392
+
+
+def tolerance_for_zoom(zoom: float, lat: float, pixels: float = 1.0) -> float:
+    """
+    Simplification tolerance in metres for a map zoom level at latitude
+    ``lat``: anything smaller than ``pixels`` screen pixels is invisible.
+    """
+    return pixels * METERS_PER_PIXEL_Z0 * math.cos(math.radians(lat)) / (2 ** zoom)
+
+
+def simplify(points: Sequence[Sequence[float]], tolerance_m: float) -> List[List[float]]:
+    """
+    Douglas-Peucker simplification of [lat, lng] points.
+
+    Points are projected to a local equirectangular plane in metres, which
+    is accurate at route scale. Uses an explicit stack, so long routes do
+    not hit the recursion limit. Endpoints are always kept.
+    """
+    n = len(points)
+    if n <= 2 or tolerance_m <= 0:
+        return [list(p) for p in points]
+
+    lat0 = math.radians(sum(p[0] for p in points) / n)
+    kx = math.radians(1) * EARTH_RADIUS_M * math.cos(lat0)
+    ky = math.radians(1) * EARTH_RADIUS_M
+    xs = [p[1] * kx for p in points]
+    ys = [p[0] * ky for p in points]
+
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    tolerance_sq = tolerance_m * tolerance_m
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        ax, ay = xs[first], ys[first]
+        dx, dy = xs[last] - ax, ys[last] - ay
+        seg_len_sq = dx * dx + dy * dy
+
+        max_dist_sq = -1.0
+        index = first
+        for i in range(first + 1, last):
+            px, py = xs[i] - ax, ys[i] - ay
+            if seg_len_sq == 0:
+                dist_sq = px * px + py * py
+            else:
+                t = max(0.0, min(1.0, (px * dx + py * dy) / seg_len_sq))
+                ex, ey = px - t * dx, py - t * dy
+                dist_sq = ex * ex + ey * ey
+            if dist_sq > max_dist_sq:
+                max_dist_sq = dist_sq
+                index = i
+
+        if max_dist_sq > tolerance_sq:
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+
+    return [list(p) for p, kept in zip(points, keep) if kept]
+
+
+def _encode_value(value: int, out: List[str]) -> None:
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode_polyline(points: Sequence[Sequence[float]], precision: int = 5) -> str:
+    """Encode [lat, lng] points with Google's polyline algorithm."""
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_i = int(round(lat * factor))
+        lng_i = int(round(lng * factor))
+        _encode_value(lat_i - prev_lat, out)
+        _encode_value(lng_i - prev_lng, out)
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(out)
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> List[List[float]]:
+    """Decode a Google encoded polyline back to [lat, lng] points."""
+    factor = 10 ** precision
+    points: List[List[float]] = []
+    index = lat = lng = 0
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append([lat / factor, lng / factor])
+    return points
@@ -0,0 +1,183 @@
+"""
+Database-backed background job queue.
+
+``enqueue`` adds a row to the ``Job`` table and ``manage.py run_jobs`` runs
+them, so slow work (reverse geocoding, rebuilding derived files) stays out
+of request latency. Handlers are plain functions registered with
+``@register("kind")`` and called with the job's payload as keyword
+arguments.
+
+Workers claim jobs with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it (PostgreSQL), so concurrent workers never wait on each
+other's rows. Elsewhere (SQLite) a job is claimed with a conditional UPDATE
+under a process lock, which the database serializes anyway.
+
+A failed job is retried after an exponential, jittered backoff until it
+has used ``max_attempts``; it then stays in the table as "failed" for
+inspection. Successful jobs are deleted. A job whose worker died is queued
+again once its lock is older than ``JOBS_LOCK_TIMEOUT_SECONDS``, which must
+therefore exceed the longest job.
+"""
+
+import logging
+import random
+import threading
+import traceback
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_handlers: Dict[str, Callable[..., None]] = {}
+_claim_lock = threading.Lock()
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler for a failure that retrying won't fix."""
+
+
+def register(kind: str):
+    """Decorator registering a handler for jobs of ``kind``."""
+
+    def decorator(func):
+        _handlers[kind] = func
+        return func
+
+    return decorator
+
+
+def enqueue(
+    kind: str,
+    payload: Optional[dict] = None,
+    *,
+    dedupe_key: Optional[str] = None,
+    delay: float = 0,
+    max_attempts: Optional[int] = None,
+) -> Job:
+    """
+    Queue a job and return it. With ``dedupe_key``, a job with the same key
+    that is still queued is returned instead; one that is already running
+    doesn't count, so work enqueued after it started runs again.
+    """
+    fields = {
+        "kind": kind,
+        "payload": payload or {},
+        "dedupe_key": dedupe_key,
+        "run_after": timezone.now() + timedelta(seconds=delay),
+        "max_attempts": max_attempts or settings.JOBS_MAX_ATTEMPTS,
+    }
+    if dedupe_key is None:
+        return Job.objects.create(**fields)
+
+    existing = Job.objects.filter(status=Job.QUEUED, dedupe_key=dedupe_key).first()
+    if existing is not None:
+        return existing
+    try:
+        with transaction.atomic():
+            return Job.objects.create(**fields)
+    except IntegrityError:
+        # Lost a race with another enqueue of the same key
+        return Job.objects.get(status=Job.QUEUED, dedupe_key=dedupe_key)
+
+
+def _claimable(kinds: Optional[Iterable[str]]):
+    qs = Job.objects.filter(status=Job.QUEUED, run_after__lte=timezone.now()).order_by("run_after", "pk")
+    if kinds:
+        qs = qs.filter(kind__in=list(kinds))
+    return qs
+
+
+def claim_job(worker: str, kinds: Optional[Iterable[str]] = None) -> Optional[Job]:
+    """Mark the next due job as running for ``worker`` and return it, or None."""
+    now = timezone.now()
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _claimable(kinds).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.RUNNING
+            job.locked_by = worker
+            job.locked_at = now
+            job.attempts += 1
+            job.save(update_fields=["status", "locked_by", "locked_at", "attempts"])
+            return job
+
+    with _claim_lock:
+        for pk in _claimable(kinds).values_list("pk", flat=True)[:10]:
+            claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+                status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F("attempts") + 1
+            )
+            if claimed:
+                return Job.objects.get(pk=pk)
+    return None
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number ``attempts``: exponential, capped, with jitter."""
+    delay = min(settings.JOBS_BACKOFF_MAX_SECONDS, settings.JOBS_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _failed(job: Job, exc: BaseException) -> None:
+    error = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+    if isinstance(exc, PermanentJobError) or job.attempts >= job.max_attempts:
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED, last_error=error, finished_at=timezone.now())
+        job.status = Job.FAILED
+    else:
+        run_after = timezone.now() + timedelta(seconds=backoff_seconds(job.attempts))
+        try:
+            with transaction.atomic():
+                Job.objects.filter(pk=job.pk).update(
+                    status=Job.QUEUED, run_after=run_after, last_error=error, locked_by="", locked_at=None
+                )
+        except IntegrityError:
+            # A queued job with the same key was added meanwhile and will do the work
+            Job.objects.filter(pk=job.pk).delete()
+        job.status = Job.QUEUED
+    job.last_error = error
+
+
+def run_job(job: Job) -> bool:
+    """Run a claimed job and record the outcome. Returns True on success."""
+    handler = _handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise PermanentJobError(f"No handler registered for {job.kind!r}")
+        handler(**job.payload)
+    except Exception as exc:
+        logger.warning("Job %s failed (attempt %d/%d): %s", job, job.attempts, job.max_attempts, exc)
+        _failed(job, exc)
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Queue again the running jobs locked for longer than
+    ``JOBS_LOCK_TIMEOUT_SECONDS`` (their worker died), or fail them if they
+    have no attempts left. Returns how many were handled.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT_SECONDS)
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, last_error="Worker stopped while running the job", finished_at=timezone.now()
+    )
+    requeued = 0
+    for job in stale.only("pk", "dedupe_key"):
+        try:
+            with transaction.atomic():
+                requeued += Job.objects.filter(pk=job.pk, status=Job.RUNNING).update(
+                    status=Job.QUEUED, locked_by="", locked_at=None
+                )
+        except IntegrityError:
+            # A queued job with the same key already covers it
+            Job.objects.filter(pk=job.pk).delete()
+    return failed + requeued
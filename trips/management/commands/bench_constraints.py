@@ -0,0 +1,80 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.constraints import ConstraintIndex
+from trips.snapshot import PlaceRow
+
+PRICE_TIERS = ["Free", "Budget", "Mid", "Premium"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark stage-2 constraint filtering: a scan over every place vs the ConstraintIndex "
+        "range query, and check that both keep the same places."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000, help="Synthetic places (default: 100000).")
+        parser.add_argument("--repeat", type=int, default=5, help="Best-of repetitions (default: 5).")
+
+    def handle(self, *args, **options):
+        n, repeat = options["rows"], options["repeat"]
+        if n < 1 or repeat < 1:
+            raise CommandError("--rows and --repeat must be at least 1.")
+
+        rng = random.Random(1)
+        rows = tuple(
+            PlaceRow(
+                f"place-{i}", f"Place {i}", "Park", f"Area {i % 40}", -1.28, 36.82,
+                rng.choice([0, 0, 100, 200, 500, 1500]), rng.randrange(0, 3000, 50), rng.randrange(30, 300, 15),
+                round(rng.uniform(3.0, 5.0), 1), rng.choice(PRICE_TIERS), (), (), 0.5,
+            )
+            for i in range(n)
+        )
+        queries = [
+            ("budget 1000", dict(cost=(None, 600))),
+            ("budget 5000, <= 2 h", dict(cost=(None, 3000), duration=(None, 120))),
+            ("rating >= 4.8, Mid/Premium", dict(rating=(4.8, None), price_tiers=["Mid", "Premium"])),
+            ("cost 500-800, 60-90 min, >= 4.5", dict(cost=(500, 800), duration=(60, 90), rating=(4.5, None))),
+        ]
+
+        def scan(cost=(None, None), duration=(None, None), rating=(None, None), price_tiers=None):
+            def inside(value, bounds):
+                low, high = bounds
+                return (low is None or value >= low) and (high is None or value <= high)
+
+            return [
+                i for i, row in enumerate(rows)
+                if inside(row.entry_fee + row.avg_food, cost) and inside(row.duration_min, duration)
+                and inside(row.rating, rating) and (price_tiers is None or row.price_tier in price_tiers)
+            ]
+
+        def best(fn):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = fn()
+                timings.append(time.perf_counter() - started)
+            return min(timings) * 1000, result
+
+        started = time.perf_counter()
+        index = ConstraintIndex(0, rows)
+        self.stdout.write(f"{n} places, best of {repeat}; index built in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        mismatches = 0
+        for label, query in queries:
+            scan_ms, expected = best(lambda: scan(**query))
+            index_ms, found = best(lambda: index.query(**query))
+            ok = np.array_equal(found, expected)
+            mismatches += not ok
+            self.stdout.write(
+                f"  {label:32s}: {len(found):7d} kept  scan {scan_ms:8.2f} ms  index {index_ms:7.3f} ms"
+                f"  ({scan_ms / index_ms:.0f}x){'' if ok else '  MISMATCH'}"
+            )
+
+        if mismatches:
+            raise CommandError(f"{mismatches} queries differ from the scan.")
+        self.stdout.write(self.style.SUCCESS("  identical results"))
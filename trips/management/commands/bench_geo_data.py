@@ -0,0 +1,112 @@
+import asyncio
+import statistics
+import time
+import urllib.parse
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def _fetch(url: str, read_chunk: int, read_delay: float) -> float:
+    """
+    GET ``url`` over a raw connection, draining the body ``read_chunk``
+    bytes at a time with ``read_delay`` seconds between reads to mimic a
+    slow mobile link. Returns the request latency in seconds.
+    """
+    parts = urllib.parse.urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += f"?{parts.query}"
+
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(parts.hostname, port, ssl=parts.scheme == "https")
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n\r\n".encode()
+    )
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if b" 200 " not in status_line:
+        writer.close()
+        raise RuntimeError(f"{url} returned {status_line.decode().strip()}")
+
+    while await reader.read(read_chunk):
+        if read_delay:
+            await asyncio.sleep(read_delay)
+    writer.close()
+    return time.perf_counter() - started
+
+
+async def _run(url: str, concurrency: int, total: int, read_chunk: int, read_delay: float):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            try:
+                latencies.append(await _fetch(url, read_chunk, read_delay))
+            except (OSError, RuntimeError):
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return latencies, errors, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare geo-data latency and throughput between a WSGI and an ASGI server "
+        "at the same concurrency, with optionally slow-reading clients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--wsgi-url",
+            default="http://127.0.0.1:8000/api/geo-data/",
+            help="Sync endpoint, e.g. served by gunicorn config.wsgi.",
+        )
+        parser.add_argument(
+            "--asgi-url",
+            default="http://127.0.0.1:8001/api/async/geo-data/",
+            help="Async endpoint, e.g. served by uvicorn config.asgi:application.",
+        )
+        parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients (default: 50).")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per server (default: 500).")
+        parser.add_argument(
+            "--read-chunk",
+            type=int,
+            default=16384,
+            help="Bytes read per client read (default: 16384).",
+        )
+        parser.add_argument(
+            "--read-delay",
+            type=float,
+            default=0.0,
+            help="Seconds a client waits between reads; >0 simulates slow links (default: 0).",
+        )
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["requests"] < 1:
+            raise CommandError("--concurrency and --requests must be at least 1.")
+
+        self.stdout.write(
+            f"{options['requests']} requests per server, concurrency {options['concurrency']}, "
+            f"read delay {options['read_delay']}s per {options['read_chunk']} bytes"
+        )
+        for label, url in (("WSGI", options["wsgi_url"]), ("ASGI", options["asgi_url"])):
+            latencies, errors, elapsed = asyncio.run(
+                _run(url, options["concurrency"], options["requests"], options["read_chunk"], options["read_delay"])
+            )
+            if not latencies:
+                self.stdout.write(self.style.ERROR(f"{label}: all {errors} requests failed ({url})"))
+                continue
+
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            self.stdout.write(
+                f"{label}: {len(latencies) / elapsed:.1f} req/s, "
+                f"p50 {statistics.median(latencies) * 1000:.0f} ms, p95 {p95 * 1000:.0f} ms, "
+                f"errors {errors} ({url})"
+            )
@@ -0,0 +1,94 @@
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.models import Place
+from trips.serializers import PLACE_API_SPEC, dumps, orjson
+
+
+def _model_dict(p: Place) -> dict:
+    # The per-instance serialization geo_data used before PlaceSpec
+    return {
+        "id": p.slug,
+        "name": p.name,
+        "category": p.category,
+        "neighbourhood": p.neighbourhood or "General",
+        "coords": {"lat": p.lat, "lng": p.lng},
+        "entryFee": p.entry_fee,
+        "avgFood": p.avg_food,
+        "durationMin": p.duration_min,
+        "rating": float(p.rating),
+        "priceTier": p.price_tier,
+        "tags": p.tags or [],
+        "vibes": p.vibes or [],
+        "popularity": float(p.popularity),
+    }
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark Place serialization: model instances + stdlib JSON vs PlaceSpec rows + fast JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000, help="Synthetic rows (default: 10000).")
+        parser.add_argument("--repeat", type=int, default=5, help="Best-of repetitions (default: 5).")
+
+    def handle(self, *args, **options):
+        n = options["rows"]
+        repeat = options["repeat"]
+        if n < 1 or repeat < 1:
+            raise CommandError("--rows and --repeat must be at least 1.")
+
+        rng = random.Random(1)
+        values = [
+            (
+                f"place-{i}",
+                f"Place {i}",
+                rng.choice(["Park", "Market", "Restaurant", "Café", "Attraction", "Mall"]),
+                f"Area {i % 40}",
+                -1.28 + rng.uniform(-0.2, 0.2),
+                36.82 + rng.uniform(-0.2, 0.2),
+                rng.choice([0, 100, 200, 500]),
+                rng.choice([0, 200, 400, 700]),
+                rng.choice([45, 60, 90, 120]),
+                Decimal(str(round(rng.uniform(3.0, 5.0), 1))),
+                rng.choice(["Free", "Budget", "Mid", "Premium"]),
+                rng.sample(["outdoor", "indoor", "nature", "shopping", "food", "family"], k=3),
+                rng.sample(["authentic", "local", "chill", "scenic"], k=2),
+                Decimal(str(round(rng.uniform(0.5, 1.0), 2))),
+            )
+            for i in range(n)
+        ]
+        columns = PLACE_API_SPEC.columns
+        # Model instances built the way the ORM does when iterating a queryset
+        instances = [Place.from_db("default", columns, row) for row in values]
+
+        def best(fn):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - started)
+            return min(timings) * 1000 * 10000 / n  # ms per 10k rows
+
+        serialize = PLACE_API_SPEC.compile()
+        baseline_build = best(lambda: [_model_dict(p) for p in instances])
+        spec_build = best(lambda: [serialize(r) for r in values])
+
+        payload = [serialize(r) for r in values]
+        stdlib_encode = best(lambda: json.dumps(payload).encode("utf-8"))
+        fast_encode = best(lambda: dumps(payload))
+
+        backend = "orjson" if orjson is not None else "stdlib (orjson not installed)"
+        self.stdout.write(f"{n} rows, best of {repeat}, ms per 10k rows:")
+        self.stdout.write(f"  build  model instances : {baseline_build:8.2f}")
+        self.stdout.write(f"  build  PlaceSpec rows  : {spec_build:8.2f}  ({baseline_build / spec_build:.1f}x)")
+        self.stdout.write(f"  encode stdlib json     : {stdlib_encode:8.2f}")
+        self.stdout.write(f"  encode {backend:<15} : {fast_encode:8.2f}  ({stdlib_encode / fast_encode:.1f}x)")
+        total_before = baseline_build + stdlib_encode
+        total_after = spec_build + fast_encode
+        self.stdout.write(
+            self.style.SUCCESS(f"  total {total_before:.2f} -> {total_after:.2f} ({total_before / total_after:.1f}x)")
+        )
@@ -0,0 +1,77 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.ranking import DEFAULT_WEIGHTS, RankingIndex, reference_score
+from trips.snapshot import PlaceRow
+
+CATEGORIES = ["Park", "Market", "Restaurant", "Café", "Attraction", "Mall"]
+TAGS = ["outdoor", "indoor", "nature", "shopping", "food", "family", "views", "history", "art"]
+VIBES = ["authentic", "local", "chill", "adventurous", "energetic", "scenic", "quiet"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark stage-3 ranking: the per-place formula with a full sort vs the vectorized "
+        "RankingIndex with argpartition top-k, and check that both give the same result."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000, help="Synthetic places (default: 100000).")
+        parser.add_argument("--k", type=int, default=20, help="Places to keep (default: 20).")
+        parser.add_argument("--repeat", type=int, default=5, help="Best-of repetitions (default: 5).")
+
+    def handle(self, *args, **options):
+        n, k, repeat = options["rows"], options["k"], options["repeat"]
+        if n < 1 or k < 1 or repeat < 1:
+            raise CommandError("--rows, --k and --repeat must be at least 1.")
+
+        rng = random.Random(1)
+        rows = tuple(
+            PlaceRow(
+                f"place-{i}", f"Place {i} {rng.choice(TAGS).title()}", rng.choice(CATEGORIES), f"Area {i % 40}",
+                -1.28 + rng.uniform(-0.2, 0.2), 36.82 + rng.uniform(-0.2, 0.2),
+                0, 0, 60, round(rng.uniform(3.0, 5.0), 1), "Mid",
+                tuple(rng.sample(TAGS, k=3)), tuple(rng.sample(VIBES, k=2)), round(rng.uniform(0.5, 1.0), 2),
+            )
+            for i in range(n)
+        )
+        query = (["Park", "Café"], ["Chill", "scenic"], "quiet nature views")
+
+        def best(fn):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = fn()
+                timings.append(time.perf_counter() - started)
+            return min(timings) * 1000, result
+
+        started = time.perf_counter()
+        index = RankingIndex(0, rows)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        def reference():
+            scored = [(reference_score(row, *query, DEFAULT_WEIGHTS), i) for i, row in enumerate(rows)]
+            scored.sort(key=lambda item: -item[0])  # Stable, like Array.prototype.sort
+            return scored[:k]
+
+        reference_ms, expected = best(reference)
+        started = time.perf_counter()
+        index.top_k(k, *query)
+        cold_ms = (time.perf_counter() - started) * 1000
+        numeric_ms, _ = best(lambda: index.top_k(k, query[0], query[1]))
+        vector_ms, (order, scores) = best(lambda: index.top_k(k, *query))
+
+        same = [i for _, i in expected] == order.tolist() and np.array_equal([s for s, _ in expected], scores)
+        self.stdout.write(f"{n} places, top {k}, best of {repeat}:")
+        self.stdout.write(f"  build index             : {build_ms:9.2f} ms (once per dataset version)")
+        self.stdout.write(f"  per-place + full sort   : {reference_ms:9.2f} ms")
+        self.stdout.write(f"  vectorized, no text     : {numeric_ms:9.2f} ms")
+        self.stdout.write(f"  vectorized, new tokens  : {cold_ms:9.2f} ms")
+        self.stdout.write(f"  vectorized, with text   : {vector_ms:9.2f} ms  ({reference_ms / vector_ms:.0f}x)")
+        if same:
+            self.stdout.write(self.style.SUCCESS("  identical order and scores"))
+        else:
+            raise CommandError("Vectorized ranking differs from the reference formula.")
@@ -0,0 +1,64 @@
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.road_graph import RoadGraph, read_edges_csv, read_edges_geojson
+
+
+class Command(BaseCommand):
+    help = "Build the offline road graph from an OSM-derived edge CSV or GeoJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "file_path",
+            type=str,
+            help="Road network file (.csv edge list or .geojson/.json LineStrings).",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["auto", "csv", "geojson"],
+            default="auto",
+            help="Input format; auto picks by file extension (default: auto).",
+        )
+        parser.add_argument(
+            "--landmarks",
+            type=int,
+            default=8,
+            help="Number of ALT landmarks to precompute (default: 8).",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            default=None,
+            help="Output .npz path (default: settings.ROAD_GRAPH_PATH).",
+        )
+
+    def handle(self, *args, **options):
+        file_path = options["file_path"]
+        if not os.path.exists(file_path):
+            raise CommandError(f"File does not exist: {file_path}")
+
+        fmt = options["format"]
+        if fmt == "auto":
+            fmt = "csv" if file_path.lower().endswith(".csv") else "geojson"
+        reader = read_edges_csv if fmt == "csv" else read_edges_geojson
+
+        started = time.perf_counter()
+        try:
+            graph = RoadGraph.from_edges(reader(file_path), landmark_count=options["landmarks"])
+        except (KeyError, ValueError) as exc:
+            raise CommandError(f"Invalid road network file: {exc}")
+
+        output = Path(options["output"] or settings.ROAD_GRAPH_PATH)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        graph.save(output)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Road graph with {len(graph.lat)} nodes and {len(graph.arrays['targets'])} edges "
+                f"written to {output} in {time.perf_counter() - started:.1f}s."
+            )
+        )
@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.models import Place
+from trips.travel_matrix import build_travel_matrix
+
+
+class Command(BaseCommand):
+    help = "Build the place-to-place fare/minutes matrix used for O(1) travel lookups."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output-dir",
+            type=str,
+            default=None,
+            help="Directory for matrix builds (default: settings.TRAVEL_MATRIX_DIR/<region>).",
+        )
+        parser.add_argument(
+            "--region",
+            type=str,
+            default=settings.DEFAULT_REGION,
+            help="Region whose places are included (default: settings.DEFAULT_REGION).",
+        )
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=512,
+            help="Rows computed per block while writing the matrix (default: 512).",
+        )
+
+    def handle(self, *args, **options):
+        region = options["region"]
+        output_dir = Path(options["output_dir"] or Path(settings.TRAVEL_MATRIX_DIR) / region)
+        block_size = int(options["block_size"])
+        if block_size < 1:
+            raise CommandError("--block-size must be at least 1.")
+
+        rows = list(Place.objects.filter(region=region).order_by("slug").values_list("slug", "lat", "lng"))
+        if not rows:
+            raise CommandError(f"No places in region '{region}' to build a travel matrix from.")
+
+        n = len(rows)
+        # int32 fares and minutes plus uint8 mode ids per pair
+        size_mb = n * n * (2 * 4 + 1) / (1024 * 1024)
+        self.stdout.write(f"Building {n}x{n} travel matrix (~{size_mb:.1f} MB on disk)...")
+
+        version_dir = build_travel_matrix(rows, output_dir, block_size=block_size)
+
+        self.stdout.write(self.style.SUCCESS(f"Travel matrix ready: {version_dir}"))
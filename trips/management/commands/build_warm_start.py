@@ -0,0 +1,51 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.regions import REGION_RE, list_regions
+from trips.warm_start import build_artifact, load_artifact
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot each region's derived read structures (places, neighbourhood centers, "
+        "transport table, cluster and ranking indexes) into a binary artifact that workers map at boot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--region",
+            action="append",
+            dest="regions",
+            help="Region to build (repeatable; default: every region with places).",
+        )
+        parser.add_argument(
+            "--output-dir",
+            type=str,
+            default=None,
+            help="Directory for the artifacts (default: settings.WARM_START_DIR).",
+        )
+
+    def handle(self, *args, **options):
+        output_dir = Path(options["output_dir"] or settings.WARM_START_DIR)
+        regions = options["regions"] or [row["region"] for row in list_regions()]
+        if not regions:
+            raise CommandError("No regions with places to build artifacts for.")
+
+        for region in regions:
+            if not REGION_RE.fullmatch(region):
+                raise CommandError(f"Invalid region: {region!r}")
+            path, header = build_artifact(region, output_dir)
+            # Read it back the way a worker will, so a bad file fails here
+            try:
+                load_artifact(path)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            size_kb = path.stat().st_size / 1024
+            self.stdout.write(
+                f"{region}: version {header['version']}, {header['places']} places, "
+                f"{len(header['neighbourhoods'])} neighbourhoods ({size_kb:.1f} KB) -> {path}"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Built {len(regions)} warm-start artifacts."))
@@ -0,0 +1,85 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.models import Place
+from trips.place_files import FORMATS, PLACE_FILE_FIELDS, detect_format, is_gzipped, open_binary, write_places
+from trips.regions import REGION_RE
+
+
+class Command(BaseCommand):
+    help = (
+        "Export Places as JSON, NDJSON or CSV in the format load_simple_places reads. Rows are "
+        "streamed from the database in chunks, so memory use doesn't grow with the table. The "
+        "region isn't part of the format: export one region per file to re-import it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", type=str, help="Output file, or '-' for stdout.")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format (default: from the output suffix, else json).",
+        )
+        parser.add_argument(
+            "--gzip",
+            action="store_true",
+            help="Gzip the output, adding .gz to the file name if missing (implied by a .gz suffix).",
+        )
+        parser.add_argument(
+            "--region",
+            action="append",
+            dest="regions",
+            help="Only export this region (repeatable).",
+        )
+        parser.add_argument(
+            "--category",
+            action="append",
+            dest="categories",
+            help="Only export this category (repeatable).",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows fetched per database round trip (default: 2000).",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        to_stdout = output == "-"
+        file_format = options["format"] or (None if to_stdout else detect_format(output)) or "json"
+        compress = options["gzip"] or (not to_stdout and is_gzipped(output))
+        if compress and not to_stdout and not is_gzipped(output):
+            output += ".gz"  # Readers, load_simple_places included, only decompress .gz files
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+
+        qs = Place.objects.all()
+        if options["regions"]:
+            invalid = [r for r in options["regions"] if not REGION_RE.fullmatch(r)]
+            if invalid:
+                raise CommandError(f"Invalid region: {invalid[0]!r}")
+            qs = qs.filter(region__in=options["regions"])
+        if options["categories"]:
+            qs = qs.filter(category__in=options["categories"])
+        # Server-side cursor on PostgreSQL; chunked fetches elsewhere
+        rows = qs.order_by("slug").values_list(*PLACE_FILE_FIELDS).iterator(chunk_size=options["chunk_size"])
+
+        if to_stdout:
+            if compress:
+                with gzip.GzipFile(fileobj=sys.stdout.buffer, mode="wb") as stream:
+                    write_places(stream, file_format, rows)
+            else:
+                write_places(sys.stdout.buffer, file_format, rows)
+            sys.stdout.buffer.flush()
+            return
+
+        try:
+            with open_binary(output, "wb", compress) as stream:
+                count = write_places(stream, file_format, rows)
+        except OSError as exc:
+            raise CommandError(f"Cannot write {output}: {exc}")
+        gz = " (gzip)" if compress else ""
+        self.stdout.write(self.style.SUCCESS(f"Exported {count} Places as {file_format}{gz} to {output}."))
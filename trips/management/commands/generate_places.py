@@ -0,0 +1,75 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from trips.place_files import FORMATS, detect_format, is_gzipped, open_binary, write_places
+from trips.regions import REGION_RE, replace_region_rows
+from trips.synthetic import generate_places, make_neighbourhoods
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large synthetic region for scale testing: clustered neighbourhoods, skewed "
+        "categories, tags and vibes, deterministic for a given --seed. Replaces the region's "
+        "places in the database (COPY on PostgreSQL) or writes them to --output instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--region", type=str, default="synthetic", help="Region to fill (default: 'synthetic').")
+        parser.add_argument("--count", type=int, default=1_000_000, help="Places to generate (default: 1000000).")
+        parser.add_argument("--neighbourhoods", type=int, default=300, help="Neighbourhoods (default: 300).")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1).")
+        parser.add_argument(
+            "--center",
+            type=float,
+            nargs=2,
+            metavar=("LAT", "LNG"),
+            default=(-1.286389, 36.817223),
+            help="Region center (default: Nairobi).",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            help="Write a places file (.ndjson, .json or .csv, optionally .gz) instead of loading the database.",
+        )
+        parser.add_argument("--format", choices=FORMATS, help="Output file format (default: from the suffix).")
+
+    def handle(self, *args, **options):
+        region = options["region"]
+        count = options["count"]
+        if not REGION_RE.fullmatch(region):
+            raise CommandError("--region may only contain letters, digits, '-' and '_'.")
+        if count < 1 or options["neighbourhoods"] < 1:
+            raise CommandError("--count and --neighbourhoods must be at least 1.")
+
+        lat, lng = options["center"]
+        label = region.replace("-", " ").replace("_", " ").title()
+        neighbourhoods = make_neighbourhoods(label, options["neighbourhoods"], lat, lng, options["seed"])
+        started = time.perf_counter()
+        generated = 0
+
+        def chunks():
+            nonlocal generated
+            for chunk in generate_places(region, neighbourhoods, count, options["seed"]):
+                yield chunk
+                generated += len(chunk)
+                self.stdout.write(f"  {generated}/{count} places ({time.perf_counter() - started:.1f}s)")
+
+        output = options["output"]
+        if output:
+            file_format = options["format"] or detect_format(output) or "ndjson"
+            with open_binary(output, "wb", is_gzipped(output)) as stream:
+                write_places(stream, file_format, (row for chunk in chunks() for row in chunk))
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f"Wrote {count} places to {output} in {elapsed:.1f}s."))
+            return
+
+        try:
+            removed, created = replace_region_rows(region, chunks())
+        except (ValueError, IntegrityError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Replaced {removed} places in '{region}' with {created} in {elapsed:.1f}s.")
+        )
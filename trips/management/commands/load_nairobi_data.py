@@ -1,48 +1,15 @@
 from decimal import Decimal
 
-from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
 
-from trips.models import Neighbourhood, Place, TransportEdge
+from trips.models import Place
+from trips.regions import replace_region
 
+NAIROBI_REGION = "nairobi"
 
-@transaction.atomic
-def load_nairobi_real_data(*, stdout):
-    # Clear existing data
-    stdout.write("Clearing existing data...")
-    TransportEdge.objects.all().delete()
-    Place.objects.all().delete()
-    Neighbourhood.objects.all().delete()
 
-    # --- Real Nairobi Neighbourhoods ---
-    stdout.write("Creating Nairobi neighbourhoods...")
-    
-    neighbourhoods_data = [
-        {"name": "CBD", "lat": -1.286389, "lng": 36.817223},
-        {"name": "Westlands", "lat": -1.2686, "lng": 36.8046},
-        {"name": "Gigiri", "lat": -1.2367, "lng": 36.8158},
-        {"name": "Langata", "lat": -1.3636, "lng": 36.784},
-        {"name": "Runda", "lat": -1.2139, "lng": 36.8214},
-        {"name": "State House", "lat": -1.2679, "lng": 36.8082},
-        {"name": "Parklands", "lat": -1.2596, "lng": 36.8226},
-        {"name": "Kenyatta", "lat": -1.3301, "lng": 36.8552},
-        {"name": "Kilimani", "lat": -1.2956, "lng": 36.8024},
-        {"name": "Karen", "lat": -1.3358, "lng": 36.7249},
-        {"name": "Eastleigh", "lat": -1.2711, "lng": 36.8489},
-        {"name": "Lavington", "lat": -1.2958, "lng": 36.7613},
-    ]
-
-    neighbourhoods = {}
-    for data in neighbourhoods_data:
-        n = Neighbourhood.objects.create(
-            name=data["name"],
-            lat=data["lat"],
-            lng=data["lng"],
-        )
-        neighbourhoods[data["name"]] = n
-        stdout.write(f"  Created: {n.name}")
-
-    # --- Real Nairobi Places ---
+def load_nairobi_real_data(*, stdout, region=NAIROBI_REGION):
+    """Replace the places of ``region`` with the real Nairobi dataset."""
     stdout.write("Creating real Nairobi places...")
 
     places_data = [
@@ -202,17 +169,12 @@ def load_nairobi_real_data(*, stdout):
          "vibes": ["chill", "energetic"], "popularity": 0.85},
     ]
 
-    for data in places_data:
-        neighbourhood = neighbourhoods.get(data["neighbourhood"])
-        if not neighbourhood:
-            stdout.write(f"  Skipping {data['name']} - neighbourhood not found")
-            continue
-        
-        p = Place.objects.create(
+    places = [
+        Place(
             slug=data["slug"],
             name=data["name"],
             category=data["category"],
-            neighbourhood=neighbourhood,
+            neighbourhood=data["neighbourhood"],
             lat=data["lat"],
             lng=data["lng"],
             entry_fee=data["entry_fee"],
@@ -224,91 +186,28 @@ def load_nairobi_real_data(*, stdout):
             vibes=data["vibes"],
             popularity=Decimal(str(data["popularity"])),
         )
-        stdout.write(f"  Created: {p.name}")
-
-    # --- Transport Edges ---
-    stdout.write("Creating transport edges...")
-
-    transport_data = [
-        # CBD connections
-        ("CBD", "Westlands", 50, 20),
-        ("Westlands", "CBD", 50, 20),
-        ("CBD", "Gigiri", 80, 35),
-        ("Gigiri", "CBD", 80, 35),
-        ("CBD", "Langata", 60, 30),
-        ("Langata", "CBD", 60, 30),
-        ("CBD", "Kilimani", 40, 15),
-        ("Kilimani", "CBD", 40, 15),
-        ("CBD", "Parklands", 50, 20),
-        ("Parklands", "CBD", 50, 20),
-        ("CBD", "Eastleigh", 50, 20),
-        ("Eastleigh", "CBD", 50, 20),
-        ("CBD", "Karen", 100, 45),
-        ("Karen", "CBD", 100, 45),
-        
-        # Westlands connections
-        ("Westlands", "Gigiri", 40, 15),
-        ("Gigiri", "Westlands", 40, 15),
-        ("Westlands", "Langata", 70, 25),
-        ("Langata", "Westlands", 70, 25),
-        ("Westlands", "Parklands", 30, 10),
-        ("Parklands", "Westlands", 30, 10),
-        ("Westlands", "Kilimani", 30, 12),
-        ("Kilimani", "Westlands", 30, 12),
-        ("Westlands", "Karen", 80, 35),
-        ("Karen", "Westlands", 80, 35),
-        
-        # Gigiri connections
-        ("Gigiri", "Langata", 90, 40),
-        ("Langata", "Gigiri", 90, 40),
-        ("Gigiri", "Runda", 30, 10),
-        ("Runda", "Gigiri", 30, 10),
-        ("Gigiri", "Karen", 70, 30),
-        ("Karen", "Gigiri", 70, 30),
-        
-        # Langata connections
-        ("Langata", "Karen", 40, 15),
-        ("Karen", "Langata", 40, 15),
-        ("Langata", "Kilimani", 50, 20),
-        ("Kilimani", "Langata", 50, 20),
-        
-        # Kilimani connections
-        ("Kilimani", "Parklands", 40, 15),
-        ("Parklands", "Kilimani", 40, 15),
-        
-        # Lavington connections
-        ("Lavington", "Westlands", 35, 12),
-        ("Westlands", "Lavington", 35, 12),
-        ("Lavington", "Kilimani", 30, 10),
-        ("Kilimani", "Lavington", 30, 10),
-        ("Lavington", "Karen", 50, 20),
-        ("Karen", "Lavington", 50, 20),
+        for data in places_data
     ]
 
-    for origin_name, dest_name, fare, minutes in transport_data:
-        origin = neighbourhoods.get(origin_name)
-        destination = neighbourhoods.get(dest_name)
-        if not origin or not destination:
-            continue
-        
-        # Check if edge already exists
-        if not TransportEdge.objects.filter(origin=origin, destination=destination).exists():
-            TransportEdge.objects.create(
-                origin=origin,
-                destination=destination,
-                mode="Matatu",
-                fare=fare,
-                minutes=minutes,
-            )
-            stdout.write(f"  Created: {origin_name} → {dest_name}")
-
-    stdout.write("Real Nairobi data loaded successfully!")
+    # Neighbourhood centers and the transport table are derived from the places
+    try:
+        removed, created = replace_region(region, places)
+    except ValueError as exc:
+        raise CommandError(str(exc))
+    stdout.write(f"Replaced {removed} places in region '{region}' with {created}.")
 
 
 class Command(BaseCommand):
-    help = "Load real Nairobi neighbourhood, place, and transport data."
+    help = "Load real Nairobi place data, replacing only the Nairobi region."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--region",
+            type=str,
+            default=NAIROBI_REGION,
+            help=f"Region to load the data into (default: {NAIROBI_REGION}).",
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
-        load_nairobi_real_data(stdout=self.stdout)
+        load_nairobi_real_data(stdout=self.stdout, region=options["region"])
         self.stdout.write(self.style.SUCCESS("Real Nairobi data loaded successfully!"))
@@ -5,11 +5,11 @@ import urllib.request
 from decimal import Decimal
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
 from django.utils.text import slugify
 
-from trips.management.commands.load_nairobi_data import load_nairobi_real_data
-from trips.models import Neighbourhood, Place, TransportEdge
+from trips.management.commands.load_nairobi_data import NAIROBI_REGION, load_nairobi_real_data
+from trips.models import Place
+from trips.regions import REGION_RE, region_key, replace_region
 
 
 def _normalize_region_name(region: str) -> str:
@@ -59,23 +59,18 @@ def _geocode_region(region: str) -> tuple[float, float, str]:
     return lat, lng, display_name
 
 
-@transaction.atomic
-def _load_generated_region_data(*, stdout, region_label: str, center_lat: float, center_lng: float, seed: int, neighbourhood_count: int, place_count: int, edge_count: int):
-    stdout.write("Clearing existing data...")
-    TransportEdge.objects.all().delete()
-    Place.objects.all().delete()
-    Neighbourhood.objects.all().delete()
-
+def _load_generated_region_data(*, stdout, region: str, region_label: str, center_lat: float, center_lng: float, seed: int, neighbourhood_count: int, place_count: int):
     random.seed(seed)
 
     stdout.write(f"Creating neighbourhoods for {region_label}...")
 
-    neighbourhoods: list[Neighbourhood] = []
+    # (name, lat, lng) anchors; centers in the API are derived from the places
+    neighbourhoods: list[tuple[str, float, float]] = []
     for i in range(1, neighbourhood_count + 1):
         name = f"{region_label} Area {i}"
         lat = center_lat + random.uniform(-0.12, 0.12)
         lng = center_lng + random.uniform(-0.12, 0.12)
-        neighbourhoods.append(Neighbourhood.objects.create(name=name, lat=lat, lng=lng))
+        neighbourhoods.append((name, lat, lng))
 
     stdout.write(f"Creating places for {region_label}...")
 
@@ -103,13 +98,14 @@ def _load_generated_region_data(*, stdout, region_label: str, center_lat: float,
         "quiet",
     ]
 
+    places = []
     for i in range(1, place_count + 1):
         name = f"{region_label} Place {i}"
         slug = slugify(f"{region_label}-{i}-{name}")
-        neighbourhood = random.choice(neighbourhoods)
+        neighbourhood_name, neighbourhood_lat, neighbourhood_lng = random.choice(neighbourhoods)
 
-        lat = neighbourhood.lat + random.uniform(-0.01, 0.01)
-        lng = neighbourhood.lng + random.uniform(-0.01, 0.01)
+        lat = neighbourhood_lat + random.uniform(-0.01, 0.01)
+        lng = neighbourhood_lng + random.uniform(-0.01, 0.01)
 
         entry_fee = random.choice([0, 50, 100, 200, 300, 500, 1000])
         avg_food = random.choice([0, 150, 200, 350, 400, 700, 1200])
@@ -118,53 +114,37 @@ def _load_generated_region_data(*, stdout, region_label: str, center_lat: float,
         rating = Decimal(str(round(random.uniform(3.2, 4.9), 1)))
         popularity = Decimal(str(round(random.uniform(0.5, 1.0), 2)))
 
-        Place.objects.create(
-            slug=slug,
-            name=name,
-            category=random.choice(categories),
-            neighbourhood=neighbourhood,
-            lat=lat,
-            lng=lng,
-            entry_fee=entry_fee,
-            avg_food=avg_food,
-            duration_min=duration_min,
-            rating=rating,
-            price_tier=random.choice(price_tiers),
-            tags=random.sample(possible_tags, k=random.randint(2, 4)),
-            vibes=random.sample(possible_vibes, k=random.randint(1, 3)),
-            popularity=popularity,
+        places.append(
+            Place(
+                slug=slug,
+                name=name,
+                category=random.choice(categories),
+                neighbourhood=neighbourhood_name,
+                lat=lat,
+                lng=lng,
+                entry_fee=entry_fee,
+                avg_food=avg_food,
+                duration_min=duration_min,
+                rating=rating,
+                price_tier=random.choice(price_tiers),
+                tags=random.sample(possible_tags, k=random.randint(2, 4)),
+                vibes=random.sample(possible_vibes, k=random.randint(1, 3)),
+                popularity=popularity,
+            )
         )
 
-    stdout.write(f"Creating transport edges for {region_label}...")
-
-    created_edges = 0
-    attempts = 0
-    max_attempts = edge_count * 20
-
-    while created_edges < edge_count and attempts < max_attempts:
-        attempts += 1
-        origin, destination = random.sample(neighbourhoods, k=2)
-
-        if TransportEdge.objects.filter(origin=origin, destination=destination).exists():
-            continue
-
-        fare = random.choice([20, 30, 40, 60, 80, 100, 120])
-        minutes = random.choice([8, 10, 12, 15, 20, 25, 30, 40, 60])
-
-        TransportEdge.objects.create(
-            origin=origin,
-            destination=destination,
-            mode="Matatu",
-            fare=fare,
-            minutes=minutes,
-        )
-        created_edges += 1
-
-    stdout.write(f"Loaded generated data for {region_label}.")
+    try:
+        removed, created = replace_region(region, places)
+    except ValueError as exc:
+        raise CommandError(str(exc))
+    stdout.write(f"Replaced {removed} places in region '{region}' with {created} for {region_label}.")
 
 
 class Command(BaseCommand):
-    help = "Load trip data for any region (Kenya counties/constituencies or any place worldwide)."
+    help = (
+        "Load trip data for any region (Kenya counties/constituencies or any place worldwide). "
+        "Only that region's places are replaced."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -172,6 +152,12 @@ class Command(BaseCommand):
             type=str,
             help="Region name to load (e.g. 'nairobi', 'nyeri', 'Nyeri County, Kenya', 'Berlin, Germany').",
         )
+        parser.add_argument(
+            "--region-key",
+            type=str,
+            default=None,
+            help="Region identifier used by the API (default: derived from the region name, e.g. 'nyeri').",
+        )
         parser.add_argument(
             "--mode",
             choices=["auto", "nairobi_real", "generated"],
@@ -196,12 +182,6 @@ class Command(BaseCommand):
             default=40,
             help="Place count for generated datasets (default: 40).",
         )
-        parser.add_argument(
-            "--edges",
-            type=int,
-            default=60,
-            help="Transport edge count for generated datasets (default: 60).",
-        )
         parser.add_argument(
             "--no-geocode",
             action="store_true",
@@ -229,8 +209,12 @@ class Command(BaseCommand):
         if mode == "auto":
             mode = "nairobi_real" if normalized in {"nairobi", "nairobi county"} else "generated"
 
+        key = options["region_key"]
+        if key is not None and not REGION_RE.fullmatch(key):
+            raise CommandError("--region-key may only contain letters, digits, '-' and '_'.")
+
         if mode == "nairobi_real":
-            load_nairobi_real_data(stdout=self.stdout)
+            load_nairobi_real_data(stdout=self.stdout, region=key or NAIROBI_REGION)
             self.stdout.write(self.style.SUCCESS("Real Nairobi data loaded successfully!"))
             return
 
@@ -245,13 +229,13 @@ class Command(BaseCommand):
 
         _load_generated_region_data(
             stdout=self.stdout,
+            region=key or region_key(normalized),
             region_label=display_name,
             center_lat=lat,
             center_lng=lng,
             seed=int(options["seed"]),
             neighbourhood_count=int(options["neighbourhoods"]),
             place_count=int(options["places"]),
-            edge_count=int(options["edges"]),
         )
 
         self.stdout.write(self.style.SUCCESS(f"Region data loaded successfully for: {display_name}"))
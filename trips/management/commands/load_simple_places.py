@@ -1,66 +1,216 @@
+import csv
 import json
 import os
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
+from trips.dataset import batched_dataset_writes
+from trips.dedupe import (
+    DEFAULT_NAME_SIMILARITY,
+    DEFAULT_RADIUS_M,
+    Candidate,
+    cluster_label,
+    find_duplicates,
+    merge_records,
+)
 from trips.models import Place
+from trips.place_files import FORMATS, read_places
+from trips.regions import REGION_RE, replace_region
 
 
 class Command(BaseCommand):
-    help = "Load Places data from a JSON file. Appends to existing Places."
+    help = (
+        "Load Places data from a JSON, NDJSON or CSV file (optionally gzipped, as written by "
+        "export_places) into one region. Appends to its Places unless --replace is given."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "file_path",
             type=str,
-            help="Path to JSON file containing Places data.",
+            help="Path to the Places file; the format follows its suffix (.json, .ndjson, .csv, plus .gz).",
         )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format, when the suffix doesn't tell.",
+        )
+        parser.add_argument(
+            "--region",
+            type=str,
+            default=settings.DEFAULT_REGION,
+            help="Region the places belong to (default: settings.DEFAULT_REGION).",
+        )
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Replace every place of the region with the file's places instead of appending.",
+        )
+        parser.add_argument(
+            "--dedupe",
+            choices=["off", "flag", "merge"],
+            default="flag",
+            help=(
+                "Near-duplicate handling: 'flag' loads everything and reports duplicates, "
+                "'merge' keeps one row per duplicate cluster (an existing Place wins), "
+                "'off' skips detection (default: flag)."
+            ),
+        )
+        parser.add_argument(
+            "--radius",
+            type=float,
+            default=DEFAULT_RADIUS_M,
+            help=f"Max distance in metres between duplicates (default: {DEFAULT_RADIUS_M:g}).",
+        )
+        parser.add_argument(
+            "--name-similarity",
+            type=float,
+            default=DEFAULT_NAME_SIMILARITY,
+            help=f"Min similarity (0-1) of normalized names (default: {DEFAULT_NAME_SIMILARITY:g}).",
+        )
+        parser.add_argument(
+            "--report",
+            type=str,
+            help="Write the duplicate clusters and stacked coordinates to this JSON file.",
+        )
+
+    def _dedupe(self, data, options):
+        """
+        Detect near-duplicates among the file rows and nearby existing
+        Places of the region. Returns the rows to insert.
+        """
+        try:
+            rows = [(item, Candidate(item["name"], float(item["lat"]), float(item["lng"]))) for item in data]
+        except KeyError as exc:
+            raise CommandError(f"Missing required field in Place data: {exc}")
+        if not rows:
+            return data
+
+        # Only existing places around the file's bounding box can match
+        margin = options["radius"] / 111000.0 + 0.01
+        lats = [c.lat for _, c in rows]
+        lngs = [c.lng for _, c in rows]
+        existing = [] if options["replace"] else list(
+            Place.objects.filter(
+                region=options["region"],
+                lat__range=(min(lats) - margin, max(lats) + margin),
+                lng__range=(min(lngs) - margin, max(lngs) + margin),
+            ).values_list("slug", "name", "lat", "lng")
+        )
+
+        # Existing places come first, so they are the root of their cluster
+        candidates = [Candidate(name, lat, lng) for _, name, lat, lng in existing] + [c for _, c in rows]
+        slugs = [slug for slug, _, _, _ in existing] + [item.get("slug", "?") for item, _ in rows]
+        report = find_duplicates(candidates, options["radius"], options["name_similarity"])
+        n_existing = len(existing)
+
+        for members in report.clusters:
+            self.stdout.write(self.style.WARNING(f"Duplicates: {cluster_label(members, candidates, slugs)}"))
+        for members in report.stacks:
+            self.stdout.write(f"Stacked coordinate: {cluster_label(members, candidates, slugs)}")
+        self.stdout.write(
+            f"Found {len(report.clusters)} duplicate clusters "
+            f"({sum(len(m) for m in report.clusters)} rows) and {len(report.stacks)} stacked coordinates."
+        )
+
+        if options["report"]:
+            def describe(i):
+                c = candidates[i]
+                return {"slug": slugs[i], "name": c.name, "lat": c.lat, "lng": c.lng, "existing": i < n_existing}
+
+            with open(options["report"], "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "mode": options["dedupe"],
+                        "radius_m": options["radius"],
+                        "clusters": [{"keep": slugs[m[0]], "members": [describe(i) for i in m]} for m in report.clusters],
+                        "stacks": [[describe(i) for i in m] for m in report.stacks],
+                    },
+                    f,
+                    indent=2,
+                    ensure_ascii=False,
+                )
+
+        if options["dedupe"] != "merge":
+            return data
+
+        keep = {}  # Cluster root -> merged row, or None when an existing Place wins
+        dropped = set()
+        for members in report.clusters:
+            dropped.update(members)
+            if members[0] >= n_existing:
+                keep[members[0]] = merge_records(data[i - n_existing] for i in members)
+        result = []
+        for index, item in enumerate(data, start=n_existing):
+            if index not in dropped:
+                result.append(item)
+            elif index in keep:
+                result.append(keep[index])
+        self.stdout.write(f"Merged duplicates: loading {len(result)} of {len(data)} rows.")
+        return result
+
+    def _build_place(self, item, region):
+        try:
+            return Place(
+                slug=item["slug"],
+                region=region,
+                name=item["name"],
+                category=item["category"],
+                neighbourhood=item.get("neighbourhood", ""),
+                lat=item["lat"],
+                lng=item["lng"],
+                entry_fee=item.get("entry_fee", 0),
+                avg_food=item.get("avg_food", 0),
+                duration_min=item.get("duration_min", 0),
+                rating=item["rating"],
+                price_tier=item["price_tier"],
+                tags=item.get("tags", []),
+                vibes=item.get("vibes", []),
+                popularity=item.get("popularity", 0.5),
+            )
+        except KeyError as exc:
+            raise CommandError(f"Missing required field in Place data: {exc}")
 
     @transaction.atomic
     def handle(self, *args, **options):
         file_path = options["file_path"]
+        region = options["region"]
+
+        if not REGION_RE.fullmatch(region):
+            raise CommandError("--region may only contain letters, digits, '-' and '_'.")
 
         if not os.path.exists(file_path):
             raise CommandError(f"File does not exist: {file_path}")
 
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except json.JSONDecodeError as exc:
-            raise CommandError(f"Invalid JSON in file: {exc}")
+            data = read_places(file_path, options["format"])
+        except (ValueError, csv.Error, OSError) as exc:
+            raise CommandError(f"Invalid Places file: {exc}")
 
-        if not isinstance(data, list):
-            raise CommandError("JSON must be a list of Place objects.")
+        if options["dedupe"] != "off":
+            data = self._dedupe(data, options)
 
-        # No clearing, append to existing data
-        # self.stdout.write("Clearing existing Places...")
-        # Place.objects.all().delete()
+        places = [self._build_place(item, region) for item in data]
+
+        if options["replace"]:
+            self.stdout.write(f"Replacing the places of region '{region}' with {len(places)} Places...")
+            try:
+                removed, created = replace_region(region, places)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            self.stdout.write(self.style.SUCCESS(f"Replaced {removed} Places with {created}."))
+            return
 
         # Load new data
-        self.stdout.write(f"Loading {len(data)} Places...")
+        self.stdout.write(f"Loading {len(places)} Places into region '{region}'...")
 
-        for item in data:
-            try:
-                Place.objects.create(
-                    slug=item["slug"],
-                    name=item["name"],
-                    category=item["category"],
-                    neighbourhood=item.get("neighbourhood", ""),
-                    lat=item["lat"],
-                    lng=item["lng"],
-                    entry_fee=item.get("entry_fee", 0),
-                    avg_food=item.get("avg_food", 0),
-                    duration_min=item.get("duration_min", 0),
-                    rating=item["rating"],
-                    price_tier=item["price_tier"],
-                    tags=item.get("tags", []),
-                    vibes=item.get("vibes", []),
-                    popularity=item.get("popularity", 0.5),
-                )
-            except KeyError as exc:
-                raise CommandError(f"Missing required field in Place data: {exc}")
-            except Exception as exc:
-                raise CommandError(f"Error creating Place '{item.get('name', 'unknown')}': {exc}")
+        with batched_dataset_writes(region):
+            for place in places:
+                try:
+                    place.save(force_insert=True)
+                except Exception as exc:
+                    raise CommandError(f"Error creating Place '{place.name}': {exc}")
 
-        self.stdout.write(self.style.SUCCESS(f"Successfully loaded {len(data)} Places."))
+        self.stdout.write(self.style.SUCCESS(f"Successfully loaded {len(places)} Places."))
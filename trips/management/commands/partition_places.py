@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from trips.models import Place
+from trips.regions import current_index_definitions, is_partitioned, partition_statements
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the Place table into a PostgreSQL table LIST-partitioned by region, with one "
+        "partition per existing region and a default partition for new ones. Optional: "
+        "loaders work on a plain table too. The primary key becomes (slug, region)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the SQL instead of running it.",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning needs PostgreSQL.")
+        if is_partitioned():
+            raise CommandError("The Place table is already partitioned.")
+
+        regions = list(Place.objects.order_by("region").values_list("region", flat=True).distinct())
+        try:
+            statements = partition_statements(regions, current_index_definitions())
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if options["dry_run"]:
+            for statement in statements:
+                self.stdout.write(f"{statement};")
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+        self.stdout.write(self.style.SUCCESS(f"Partitioned the Place table into {len(regions)} regions."))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from trips.delta import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete deleted-place tombstones older than the retention period. Clients that "
+        "last synced before the newest pruned delete get a full geo-data download."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.PLACE_TOMBSTONE_RETENTION_DAYS,
+            help=f"Keep tombstones this many days (default: {settings.PLACE_TOMBSTONE_RETENTION_DAYS}).",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            raise CommandError("--days must not be negative.")
+
+        removed = prune_tombstones(timezone.now() - timedelta(days=options["days"]))
+        self.stdout.write(self.style.SUCCESS(f"Pruned {removed} tombstones."))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from trips.road_routes import prune_route_legs
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete cached route legs older than the maximum age. The route proxy already "
+        "refetches them; this keeps the table from growing with legs nobody asks for again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.ROUTING_LEG_MAX_AGE_DAYS,
+            help=f"Keep legs this many days (default: {settings.ROUTING_LEG_MAX_AGE_DAYS}).",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            raise CommandError("--days must not be negative.")
+
+        removed = prune_route_legs(timezone.now() - timedelta(days=options["days"]))
+        self.stdout.write(self.style.SUCCESS(f"Pruned {removed} route legs."))
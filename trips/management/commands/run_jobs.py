@@ -0,0 +1,81 @@
+import os
+import socket
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from trips.jobs import claim_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Run background jobs (geocoding, derived-data rebuilds) from the jobs table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Jobs run in parallel by this worker, one thread each (default: 1).",
+        )
+        parser.add_argument(
+            "--kind",
+            action="append",
+            dest="kinds",
+            help="Only run jobs of this kind (repeatable; default: all kinds).",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when no job is due instead of waiting for more.",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options["concurrency"]
+        if concurrency < 1:
+            raise CommandError("--concurrency must be at least 1.")
+
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Recovered {requeued} jobs left running by a stopped worker.")
+
+        stop = threading.Event()
+        counts = {"done": 0, "failed": 0}
+        counts_lock = threading.Lock()
+
+        def work(slot):
+            name = f"{worker}:{slot}"
+            try:
+                while not stop.is_set():
+                    job = claim_job(name, options["kinds"])
+                    if job is None:
+                        if options["once"]:
+                            return
+                        stop.wait(settings.JOBS_POLL_SECONDS)
+                        continue
+                    ok = run_job(job)
+                    with counts_lock:
+                        counts["done" if ok else "failed"] += 1
+                    if ok:
+                        self.stdout.write(f"Done: {job}")
+                    else:
+                        self.stdout.write(self.style.WARNING(f"Failed: {job} ({job.status}): {job.last_error}"))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work, args=(slot,), daemon=True) for slot in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping after the running jobs finish...")
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(f"Ran {counts['done']} jobs, {counts['failed']} failed."))
@@ -1,33 +1,33 @@
 import random
 from decimal import Decimal
 
-from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
 from django.utils.text import slugify
 
-from trips.models import Neighbourhood, Place, TransportEdge
+from trips.models import Place
+from trips.regions import replace_region
 
 
 class Command(BaseCommand):
-    help = "Populate the database with sample data for Neighbourhood, Place, and TransportEdge."
+    help = "Populate one region with sample places (replaces only that region's places)."
 
     def add_arguments(self, parser):
         parser.add_argument(
             "--count",
             type=int,
             default=100,
-            help="Number of rows to create per model (default: 100).",
+            help="Number of neighbourhoods and places to create (default: 100).",
+        )
+        parser.add_argument(
+            "--region",
+            type=str,
+            default="sample",
+            help="Region to fill (default: 'sample').",
         )
 
-    @transaction.atomic
     def handle(self, *args, **options):
         count: int = options["count"]
-
-        # Start fresh so we don't hit unique constraints when re-running.
-        self.stdout.write("Clearing existing data...")
-        TransportEdge.objects.all().delete()
-        Place.objects.all().delete()
-        Neighbourhood.objects.all().delete()
+        region: str = options["region"]
 
         random.seed(1)
 
@@ -44,8 +44,7 @@ class Command(BaseCommand):
             # Jitter lat/lng slightly around a base point
             lat = base_lat + random.uniform(-0.2, 0.2)
             lng = base_lng + random.uniform(-0.2, 0.2)
-            n = Neighbourhood.objects.create(name=name, lat=lat, lng=lng)
-            neighbourhoods.append(n)
+            neighbourhoods.append((name, lat, lng))
 
         # --- Places ---
         self.stdout.write(f"Creating {count} places...")
@@ -77,12 +76,12 @@ class Command(BaseCommand):
 
         for i in range(1, count + 1):
             name = f"Sample Place {i}"
-            slug = slugify(name)
-            neighbourhood = random.choice(neighbourhoods)
+            slug = slugify(f"{region}-{name}")
+            neighbourhood, neighbourhood_lat, neighbourhood_lng = random.choice(neighbourhoods)
 
             # Small jitter around the neighbourhood center
-            lat = neighbourhood.lat + random.uniform(-0.01, 0.01)
-            lng = neighbourhood.lng + random.uniform(-0.01, 0.01)
+            lat = neighbourhood_lat + random.uniform(-0.01, 0.01)
+            lng = neighbourhood_lng + random.uniform(-0.01, 0.01)
 
             entry_fee = random.choice([0, 100, 200, 500, 1000, 1500])
             avg_food = random.choice([0, 200, 400, 700, 1200])
@@ -96,50 +95,30 @@ class Command(BaseCommand):
 
             popularity = Decimal(str(round(random.uniform(0.5, 1.0), 2)))
 
-            p = Place.objects.create(
-                slug=slug,
-                name=name,
-                category=random.choice(categories),
-                neighbourhood=neighbourhood,
-                lat=lat,
-                lng=lng,
-                entry_fee=entry_fee,
-                avg_food=avg_food,
-                duration_min=duration_min,
-                rating=rating,
-                price_tier=price_tier,
-                tags=tags,
-                vibes=vibes,
-                popularity=popularity,
+            places.append(
+                Place(
+                    slug=slug,
+                    name=name,
+                    category=random.choice(categories),
+                    neighbourhood=neighbourhood,
+                    lat=lat,
+                    lng=lng,
+                    entry_fee=entry_fee,
+                    avg_food=avg_food,
+                    duration_min=duration_min,
+                    rating=rating,
+                    price_tier=price_tier,
+                    tags=tags,
+                    vibes=vibes,
+                    popularity=popularity,
+                )
             )
-            places.append(p)
-
-        # --- Transport edges ---
-        self.stdout.write(f"Creating {count} transport edges...")
-
-        created_edges = 0
-        attempts = 0
-        max_attempts = count * 10  # stop if we somehow can't find unique pairs
-
-        while created_edges < count and attempts < max_attempts:
-            attempts += 1
-            origin, destination = random.sample(neighbourhoods, k=2)
 
-            # Avoid duplicates due to unique_together
-            if TransportEdge.objects.filter(origin=origin, destination=destination).exists():
-                continue
-
-            fare = random.choice([20, 30, 40, 60, 80, 100])
-            minutes = random.choice([10, 15, 20, 25, 30, 40, 60])
-
-            TransportEdge.objects.create(
-                origin=origin,
-                destination=destination,
-                mode="Matatu",
-                fare=fare,
-                minutes=minutes,
-            )
-            created_edges += 1
-
-        self.stdout.write(self.style.SUCCESS("Sample data created successfully."))
+        try:
+            removed, created = replace_region(region, places)
+        except ValueError as exc:
+            raise CommandError(str(exc))
 
+        self.stdout.write(
+            self.style.SUCCESS(f"Sample data created: replaced {removed} places in '{region}' with {created}.")
+        )
@@ -0,0 +1,200 @@
+import mimetypes
+import os
+import stat
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.utils import OperationalError
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .db_router import (
+    PIN_COOKIE,
+    SAFE_METHODS,
+    begin_request,
+    end_request,
+    fail_over_to_primary,
+    replicas_read,
+    wrote_to_primary,
+)
+from .storage import ENCODINGS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Allow replica reads for safe requests, unless the client wrote recently.
+    A request that wrote sets a cookie pinning the client to the primary for
+    ``DATABASE_READ_YOUR_WRITES_SECONDS``. A sync view whose replica fails
+    with an OperationalError is run once more on the primary.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self._begin(request)
+        try:
+            return self._finish(self.get_response(request))
+        finally:
+            end_request(tokens)
+
+    async def __acall__(self, request):
+        tokens = self._begin(request)
+        try:
+            return self._finish(await self.get_response(request))
+        finally:
+            end_request(tokens)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, OperationalError) or not replicas_read() or wrote_to_primary():
+            return None
+        match = request.resolver_match
+        if match is None or iscoroutinefunction(match.func):
+            return None
+        fail_over_to_primary()
+        return match.func(request, *match.args, **match.kwargs)
+
+    @staticmethod
+    def _begin(request):
+        return begin_request(request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES)
+
+    @staticmethod
+    def _finish(response):
+        if wrote_to_primary():
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=settings.DATABASE_READ_YOUR_WRITES_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+def _encoding_weights(header):
+    """{coding: q} from an Accept-Encoding header."""
+    weights = {}
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding.strip():
+            weights[coding.strip().lower()] = q
+    return weights
+
+
+class PrecompressedStaticMiddleware:
+    """
+    Serve files under ``STATIC_URL`` from ``STATIC_ROOT``, picking the
+    smallest precompressed variant (``.br``, ``.gz``, see ``trips.storage``)
+    the client accepts.
+
+    Fingerprinted names from the staticfiles manifest are immutable and are
+    cached for ``STATIC_CACHE_MAX_AGE``; anything else must be revalidated.
+    Requests for files that aren't in ``STATIC_ROOT`` fall through to the
+    rest of the stack, so ``runserver`` still serves from the finders.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        prefix = settings.STATIC_URL or ""
+        self.prefix = prefix if prefix.startswith("/") else f"/{prefix}"
+        self.root = settings.STATIC_ROOT
+        self._immutable_names = None
+        self._variants = {}  # Variant lists of immutable files, which never change on disk
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self._serve(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self._serve(request)
+        return response if response is not None else await self.get_response(request)
+
+    def _immutable(self, name):
+        if self._immutable_names is None:
+            # Loaded from the manifest once; collectstatic is followed by a restart
+            hashed_files = getattr(staticfiles_storage, "hashed_files", {})
+            self._immutable_names = {h for n, h in hashed_files.items() if h != n}
+        return name in self._immutable_names
+
+    def _find_variants(self, path):
+        """[(encoding, path, size, mtime)] of the files that exist, identity last."""
+        variants = []
+        for encoding, suffix in ENCODINGS + ((None, ""),):
+            try:
+                st = os.stat(path + suffix)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode):
+                variants.append((encoding, path + suffix, st.st_size, st.st_mtime))
+        return variants
+
+    def _serve(self, request):
+        if not self.root or request.method not in ("GET", "HEAD") or not request.path.startswith(self.prefix):
+            return None
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+
+        immutable = self._immutable(name)
+        variants = self._variants.get(name) if immutable else None
+        if variants is None:
+            variants = self._find_variants(path)
+            if immutable:
+                self._variants[name] = variants
+        if not variants or variants[-1][0] is not None:
+            return None
+
+        weights = _encoding_weights(request.headers.get("Accept-Encoding", ""))
+        encoding, file_path, _, mtime = next(
+            v for v in variants if v[0] is None or weights.get(v[0], weights.get("*", 0)) > 0
+        )
+
+        if immutable:
+            cache_control = f"public, max-age={settings.STATIC_CACHE_MAX_AGE}, immutable"
+        else:
+            cache_control = "no-cache"
+        if not was_modified_since(request.headers.get("If-Modified-Since"), int(mtime)):
+            response = HttpResponseNotModified()
+        else:
+            content_type, _ = mimetypes.guess_type(path)
+            response = FileResponse(
+                open(file_path, "rb"),
+                content_type=content_type or "application/octet-stream",
+                filename=os.path.basename(path),
+            )
+            if encoding is not None:
+                response["Content-Encoding"] = encoding
+            response["Last-Modified"] = http_date(mtime)
+        response["Cache-Control"] = cache_control
+        if len(variants) > 1:
+            patch_vary_headers(response, ("Accept-Encoding",))
+        return response
@@ -0,0 +1,54 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:06
+
+from django.db import migrations, models
+
+
+def populate_stats(apps, schema_editor):
+    Place = apps.get_model('trips', 'Place')
+    NeighbourhoodStats = apps.get_model('trips', 'NeighbourhoodStats')
+
+    stats = {}
+    for name, category, lat, lng in Place.objects.values_list('neighbourhood', 'category', 'lat', 'lng').iterator():
+        name = name or 'General'
+        s = stats.get(name)
+        if s is None:
+            s = stats[name] = NeighbourhoodStats(
+                name=name, min_lat=lat, max_lat=lat, min_lng=lng, max_lng=lng, category_counts={},
+            )
+        s.place_count += 1
+        s.lat_sum += lat
+        s.lng_sum += lng
+        s.min_lat, s.max_lat = min(s.min_lat, lat), max(s.max_lat, lat)
+        s.min_lng, s.max_lng = min(s.min_lng, lng), max(s.max_lng, lng)
+        s.category_counts[category] = s.category_counts.get(category, 0) + 1
+
+    NeighbourhoodStats.objects.bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0003_dataset_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NeighbourhoodStats',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('place_count', models.PositiveIntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0.0)),
+                ('lng_sum', models.FloatField(default=0.0)),
+                ('min_lat', models.FloatField(blank=True, null=True)),
+                ('max_lat', models.FloatField(blank=True, null=True)),
+                ('min_lng', models.FloatField(blank=True, null=True)),
+                ('max_lng', models.FloatField(blank=True, null=True)),
+                ('category_counts', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'verbose_name_plural': 'neighbourhood stats',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
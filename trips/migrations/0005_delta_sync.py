@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0004_neighbourhood_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceTombstone',
+            fields=[
+                ('slug', models.SlugField(primary_key=True, serialize=False)),
+                ('deleted_seq', models.PositiveBigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='datasetversion',
+            name='sync_floor',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='neighbourhoodstats',
+            name='updated_seq',
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='place',
+            name='updated_seq',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
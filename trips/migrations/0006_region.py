@@ -0,0 +1,84 @@
+# Generated by Django 6.0.2 on 2026-10-19 17:02
+
+from django.db import migrations, models
+
+
+def populate_stats(apps, schema_editor):
+    Place = apps.get_model('trips', 'Place')
+    NeighbourhoodStats = apps.get_model('trips', 'NeighbourhoodStats')
+
+    stats = {}
+    rows = Place.objects.values_list('region', 'neighbourhood', 'category', 'lat', 'lng').iterator()
+    for region, name, category, lat, lng in rows:
+        name = name or 'General'
+        s = stats.get((region, name))
+        if s is None:
+            s = stats[region, name] = NeighbourhoodStats(
+                region=region, name=name, min_lat=lat, max_lat=lat, min_lng=lng, max_lng=lng, category_counts={},
+            )
+        s.place_count += 1
+        s.lat_sum += lat
+        s.lng_sum += lng
+        s.min_lat, s.max_lat = min(s.min_lat, lat), max(s.max_lat, lat)
+        s.min_lng, s.max_lng = min(s.min_lng, lng), max(s.max_lng, lng)
+        s.category_counts[category] = s.category_counts.get(category, 0) + 1
+
+    NeighbourhoodStats.objects.bulk_create(stats.values())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0005_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='place',
+            name='region',
+            field=models.SlugField(default='nairobi', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['region', 'name'], name='place_region_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['region', 'updated_seq'], name='place_region_seq_idx'),
+        ),
+        migrations.AddField(
+            model_name='placetombstone',
+            name='region',
+            field=models.SlugField(default='nairobi', max_length=100),
+        ),
+        # The primary key changes from the name to (region, name), so the
+        # aggregates are recreated and rebuilt rather than altered in place
+        migrations.DeleteModel(
+            name='NeighbourhoodStats',
+        ),
+        migrations.CreateModel(
+            name='NeighbourhoodStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('region', models.SlugField(default='nairobi', max_length=100)),
+                ('name', models.CharField(max_length=100)),
+                ('place_count', models.PositiveIntegerField(default=0)),
+                ('lat_sum', models.FloatField(default=0.0)),
+                ('lng_sum', models.FloatField(default=0.0)),
+                ('min_lat', models.FloatField(blank=True, null=True)),
+                ('max_lat', models.FloatField(blank=True, null=True)),
+                ('min_lng', models.FloatField(blank=True, null=True)),
+                ('max_lng', models.FloatField(blank=True, null=True)),
+                ('category_counts', models.JSONField(blank=True, default=dict)),
+                ('updated_seq', models.PositiveBigIntegerField(db_index=True, default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'neighbourhood stats',
+                'ordering': ['region', 'name'],
+                'constraints': [
+                    models.UniqueConstraint(fields=('region', 'name'), name='neighbourhood_stats_region_name'),
+                ],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:02
+
+from django.db import migrations
+
+# Lets the admin's name search (UPPER(name) LIKE UPPER('%term%')) use an
+# index. PostgreSQL only; needs the pg_trgm contrib extension.
+CREATE_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS place_name_trgm_idx ON {table} USING gin (UPPER(name) gin_trgm_ops)",
+]
+DROP_INDEX = ["DROP INDEX IF EXISTS place_name_trgm_idx"]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        table = schema_editor.quote_name(apps.get_model("trips", "Place")._meta.db_table)
+        for statement in statements:
+            schema_editor.execute(statement.format(table=table))
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0007_job_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(CREATE_INDEX), _run(DROP_INDEX)),
+    ]
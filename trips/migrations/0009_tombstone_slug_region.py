@@ -0,0 +1,48 @@
+# Generated by Django 6.0.2 on 2026-10-19 19:40
+
+from django.db import migrations, models
+
+
+def copy_tombstones(apps, schema_editor):
+    # Plain SQL, so deleted_at isn't reset by auto_now_add on the way across
+    quote = schema_editor.quote_name
+    old = quote(apps.get_model('trips', 'PlaceTombstone')._meta.db_table)
+    new = quote(apps.get_model('trips', 'NewPlaceTombstone')._meta.db_table)
+    schema_editor.execute(
+        f'INSERT INTO {new} (slug, region, deleted_seq, deleted_at) '
+        f'SELECT slug, region, deleted_seq, deleted_at FROM {old}'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0008_place_name_trigram'),
+    ]
+
+    # The primary key changes from the slug to a surrogate id with a
+    # (slug, region) constraint, so the table is rebuilt and its rows copied
+    # across rather than altered in place
+    operations = [
+        migrations.CreateModel(
+            name='NewPlaceTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slug', models.SlugField()),
+                ('region', models.SlugField(default='nairobi', max_length=100)),
+                ('deleted_seq', models.PositiveBigIntegerField(db_index=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('slug', 'region'), name='tombstone_slug_region')],
+            },
+        ),
+        migrations.RunPython(copy_tombstones, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='PlaceTombstone',
+        ),
+        migrations.RenameModel(
+            old_name='NewPlaceTombstone',
+            new_name='PlaceTombstone',
+        ),
+    ]
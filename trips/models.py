@@ -1,9 +1,13 @@
-from django.db import models
+from django.db import models, router, transaction
+
+DEFAULT_REGION = "nairobi"
 
 
 class Place(models.Model):
     # Match the string IDs used in the frontend (e.g. "karura")
     slug = models.SlugField(primary_key=True)
+    # Dataset partition, e.g. "nairobi" or "nyeri"; loaders replace one region at a time
+    region = models.SlugField(max_length=100, default=DEFAULT_REGION)
     name = models.CharField(max_length=200)
     category = models.CharField(max_length=50)
 
@@ -25,8 +29,146 @@ class Place(models.Model):
 
     popularity = models.DecimalField(max_digits=3, decimal_places=2, default=0.5)
 
+    # Dataset version of the last write to this row, for delta sync
+    updated_seq = models.PositiveBigIntegerField(default=0, db_index=True, editable=False)
+
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["region", "name"], name="place_region_name_idx"),
+            models.Index(fields=["region", "updated_seq"], name="place_region_seq_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.name
+
+    # The post_save/post_delete handlers update the aggregates and the dataset
+    # version; run them in the write's transaction so a failure there rolls
+    # the write back too
+    def save(self, *args, **kwargs):
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            return super().delete(using=using, keep_parents=keep_parents)
+
+
+class RouteLeg(models.Model):
+    """Cached road geometry between two snapped endpoints."""
+
+    key = models.CharField(max_length=100, primary_key=True)  # "lat,lng|lat,lng"
+    geometry = models.JSONField()  # [[lat, lng], ...]
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.key
+
+
+class DatasetVersion(models.Model):
+    """
+    Single-row counter bumped on every Place write. Derived read structures
+    (indexes, caches, snapshots) are tagged with the version they were built
+    from and rebuilt when it moves.
+    """
+
+    version = models.PositiveBigIntegerField(default=0)
+    # Clients synced to a version below this must refetch the full dataset
+    sync_floor = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"v{self.version}"
+
+
+class PlaceTombstone(models.Model):
+    """
+    Marks a deleted place so delta-sync clients can drop it. Keyed on
+    (slug, region): a place moved out of a region is a delete there even
+    while the slug lives on, or is deleted, somewhere else.
+    """
+
+    slug = models.SlugField()
+    region = models.SlugField(max_length=100, default=DEFAULT_REGION)
+    deleted_seq = models.PositiveBigIntegerField(db_index=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["slug", "region"], name="tombstone_slug_region"),
+        ]
+
+    def __str__(self) -> str:
+        return self.slug
+
+
+class NeighbourhoodStats(models.Model):
+    """
+    Per-neighbourhood aggregates over Place, kept current by Place signals
+    and rebuilt in one pass after bulk loads.
+    """
+
+    region = models.SlugField(max_length=100, default=DEFAULT_REGION)
+    name = models.CharField(max_length=100)
+    place_count = models.PositiveIntegerField(default=0)
+    lat_sum = models.FloatField(default=0.0)
+    lng_sum = models.FloatField(default=0.0)
+    min_lat = models.FloatField(null=True, blank=True)
+    max_lat = models.FloatField(null=True, blank=True)
+    min_lng = models.FloatField(null=True, blank=True)
+    max_lng = models.FloatField(null=True, blank=True)
+    category_counts = models.JSONField(default=dict, blank=True)  # category -> count
+    # Dataset version of the last change; emptied neighbourhoods keep their
+    # row with place_count=0 so delta sync can report them as removed
+    updated_seq = models.PositiveBigIntegerField(default=0, db_index=True)
+
+    class Meta:
+        ordering = ["region", "name"]
+        verbose_name_plural = "neighbourhood stats"
+        constraints = [
+            models.UniqueConstraint(fields=["region", "name"], name="neighbourhood_stats_region_name"),
+        ]
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class Job(models.Model):
+    """
+    Background work for ``manage.py run_jobs`` (see ``trips.jobs``). A queued
+    job with a ``dedupe_key`` absorbs later enqueues of the same key.
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (FAILED, "Failed")]
+
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)  # Keyword arguments of the handler
+    dedupe_key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["run_after", "id"]
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="job_status_run_after_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["dedupe_key"], condition=models.Q(status="queued"), name="job_queued_dedupe_key"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} #{self.pk}"
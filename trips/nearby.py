@@ -0,0 +1,69 @@
+"""
+"Places near me": k-nearest places by great-circle distance.
+
+Each region gets one KD-tree over the longitudes and latitudes of all its
+places plus one per category, so a category filter picks a smaller tree
+instead of discarding results after the search. The trees are built lazily
+per process and rebuilt when the dataset version changes.
+"""
+
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .snapshot import PlaceRow, get_place_snapshot
+from .spatial import KDTree, around
+
+
+class NearbyIndex:
+    def __init__(self, version: int, rows: Sequence[PlaceRow]):
+        self.version = version
+        self.rows = rows
+        lngs = np.array([row.lng for row in rows], dtype=np.float64)
+        lats = np.array([row.lat for row in rows], dtype=np.float64)
+        categories = np.array([row.category for row in rows], dtype=object)
+
+        # (tree, snapshot ordinal of each tree point)
+        self.trees: Dict[Optional[str], Tuple[KDTree, np.ndarray]] = {
+            None: (KDTree(lngs, lats), np.arange(len(rows), dtype=np.int64)),
+        }
+        for category in set(categories):
+            ordinals = np.flatnonzero(categories == category)
+            self.trees[category] = (KDTree(lngs[ordinals], lats[ordinals]), ordinals)
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int,
+        categories: Optional[Iterable[str]] = None,
+        max_km: float = math.inf,
+    ) -> List[Tuple[int, float]]:
+        """(snapshot ordinal, km) of the ``k`` places closest to (lat, lng), nearest first."""
+        keys = [None] if categories is None else [c for c in dict.fromkeys(categories) if c in self.trees]
+        found: List[Tuple[float, int]] = []
+        for key in keys:
+            tree, ordinals = self.trees[key]
+            indices, distances = around(tree, lng, lat, k, max_km)
+            found.extend(zip(distances.tolist(), ordinals[indices].tolist()))
+        # Several categories: merge each tree's k best
+        found.sort()
+        return [(ordinal, km) for km, ordinal in found[:k]]
+
+
+_indexes: Dict[str, NearbyIndex] = {}
+_index_lock = threading.Lock()
+
+
+def get_nearby_index(region: str) -> NearbyIndex:
+    """Return this process's nearby index of ``region``, rebuilding it for a new dataset version."""
+    snapshot = get_place_snapshot(region)
+    index = _indexes.get(region)
+    if index is None or index.version != snapshot.version:
+        with _index_lock:
+            index = _indexes.get(region)
+            if index is None or index.version != snapshot.version:
+                index = _indexes[region] = NearbyIndex(snapshot.version, snapshot.rows)
+    return index
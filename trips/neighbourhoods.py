@@ -0,0 +1,188 @@
+"""
+Incrementally maintained neighbourhood aggregates.
+
+``NeighbourhoodStats`` holds the place count, coordinate sums, bounds and
+category counts of each neighbourhood of each region, so centers are read in
+O(#neighbourhoods) instead of summed over every place. Single-place writes
+adjust the affected rows under a row lock; bulk loads rebuild the whole
+table from one GROUP BY query.
+"""
+
+from typing import Iterable, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+
+from .models import NeighbourhoodStats, Place
+from .utils import haversine_distance
+
+DEFAULT_NEIGHBOURHOOD = "General"  # Used for places with a blank neighbourhood
+
+# (region, neighbourhood, category, lat, lng) of one place
+PlaceKey = Tuple[str, str, str, float, float]
+
+
+def neighbourhood_name(value: str) -> str:
+    return value or DEFAULT_NEIGHBOURHOOD
+
+
+def place_key(place: Place) -> PlaceKey:
+    return place.region, neighbourhood_name(place.neighbourhood), place.category, place.lat, place.lng
+
+
+def _recompute_bounds(stats: NeighbourhoodStats) -> None:
+    qs = Place.objects.filter(region=stats.region, neighbourhood=stats.name)
+    if stats.name == DEFAULT_NEIGHBOURHOOD:
+        qs = Place.objects.filter(region=stats.region, neighbourhood__in=["", DEFAULT_NEIGHBOURHOOD])
+    bounds = qs.aggregate(Min("lat"), Max("lat"), Min("lng"), Max("lng"))
+    stats.min_lat = bounds["lat__min"]
+    stats.max_lat = bounds["lat__max"]
+    stats.min_lng = bounds["lng__min"]
+    stats.max_lng = bounds["lng__max"]
+
+
+def _remove(key: PlaceKey) -> None:
+    region, name, category, lat, lng = key
+    stats = NeighbourhoodStats.objects.select_for_update().filter(region=region, name=name).first()
+    if stats is None:
+        return
+
+    stats.place_count = max(0, stats.place_count - 1)
+    if not stats.place_count:
+        # Keep the emptied row so delta sync can report the removal
+        stats.lat_sum = stats.lng_sum = 0.0
+        stats.min_lat = stats.max_lat = stats.min_lng = stats.max_lng = None
+        stats.category_counts = {}
+        stats.save()
+        return
+
+    stats.lat_sum -= lat
+    stats.lng_sum -= lng
+    remaining = stats.category_counts.get(category, 0) - 1
+    if remaining > 0:
+        stats.category_counts[category] = remaining
+    else:
+        stats.category_counts.pop(category, None)
+
+    # Bounds can't be shrunk incrementally; rescan only if this place was on one
+    if lat in (stats.min_lat, stats.max_lat) or lng in (stats.min_lng, stats.max_lng):
+        _recompute_bounds(stats)
+    stats.save()
+
+
+def _add(key: PlaceKey) -> None:
+    region, name, category, lat, lng = key
+    stats, _ = NeighbourhoodStats.objects.select_for_update().get_or_create(region=region, name=name)
+
+    stats.place_count += 1
+    stats.lat_sum += lat
+    stats.lng_sum += lng
+    stats.min_lat = lat if stats.min_lat is None else min(stats.min_lat, lat)
+    stats.max_lat = lat if stats.max_lat is None else max(stats.max_lat, lat)
+    stats.min_lng = lng if stats.min_lng is None else min(stats.min_lng, lng)
+    stats.max_lng = lng if stats.max_lng is None else max(stats.max_lng, lng)
+    stats.category_counts[category] = stats.category_counts.get(category, 0) + 1
+    stats.save()
+
+
+def apply_place_change(old: Optional[PlaceKey], new: Optional[PlaceKey]) -> None:
+    """
+    Move one place's contribution from ``old`` to ``new`` (either may be
+    None for a create or delete).
+    """
+    if old == new:
+        return
+    with transaction.atomic():
+        # Lock rows in (region, name) order so concurrent moves can't deadlock
+        for action, key in sorted(
+            ((_remove, old), (_add, new)),
+            key=lambda item: item[1][:2] if item[1] else ("", ""),
+        ):
+            if key is not None:
+                action(key)
+
+
+@transaction.atomic
+def rebuild_neighbourhood_stats(regions: Optional[Iterable[str]] = None) -> int:
+    """
+    Recompute the aggregates of ``regions`` (default: all) from one GROUP BY
+    (region, neighbourhood, category) query. Returns the number of
+    neighbourhoods.
+    """
+    places = Place.objects.all()
+    existing = NeighbourhoodStats.objects.all()
+    if regions is not None:
+        regions = list(regions)
+        places = places.filter(region__in=regions)
+        existing = existing.filter(region__in=regions)
+
+    grouped = (
+        places.order_by()
+        .values("region", "neighbourhood", "category")
+        .annotate(
+            n=Count("pk"),
+            lat_sum=Sum("lat"),
+            lng_sum=Sum("lng"),
+            min_lat=Min("lat"),
+            max_lat=Max("lat"),
+            min_lng=Min("lng"),
+            max_lng=Max("lng"),
+        )
+    )
+
+    stats = {}
+    for row in grouped:
+        name = neighbourhood_name(row["neighbourhood"])
+        s = stats.get((row["region"], name))
+        if s is None:
+            s = stats[row["region"], name] = NeighbourhoodStats(
+                region=row["region"],
+                name=name,
+                min_lat=row["min_lat"],
+                max_lat=row["max_lat"],
+                min_lng=row["min_lng"],
+                max_lng=row["max_lng"],
+                category_counts={},
+            )
+        s.place_count += row["n"]
+        s.lat_sum += row["lat_sum"]
+        s.lng_sum += row["lng_sum"]
+        s.min_lat = min(s.min_lat, row["min_lat"])
+        s.max_lat = max(s.max_lat, row["max_lat"])
+        s.min_lng = min(s.min_lng, row["min_lng"])
+        s.max_lng = max(s.max_lng, row["max_lng"])
+        s.category_counts[row["category"]] = s.category_counts.get(row["category"], 0) + row["n"]
+
+    existing.delete()
+    NeighbourhoodStats.objects.bulk_create(stats.values())
+    return len(stats)
+
+
+def _centers_queryset(region: str):
+    return NeighbourhoodStats.objects.filter(region=region, place_count__gt=0).values_list(
+        "name", "lat_sum", "lng_sum", "place_count"
+    )
+
+
+def get_neighbourhood_centers(region: str) -> dict:
+    """Return {name: {"lat", "lng"}} for every neighbourhood of ``region`` with places."""
+    return {
+        name: {"lat": lat_sum / count, "lng": lng_sum / count}
+        for name, lat_sum, lng_sum, count in _centers_queryset(region)
+    }
+
+
+async def aget_neighbourhood_centers(region: str) -> dict:
+    """Async variant of ``get_neighbourhood_centers``."""
+    return {
+        name: {"lat": lat_sum / count, "lng": lng_sum / count}
+        async for name, lat_sum, lng_sum, count in _centers_queryset(region)
+    }
+
+
+def nearest_neighbourhood(region: str, lat: float, lng: float) -> str:
+    """Name of the neighbourhood of ``region`` whose center is closest to (lat, lng)."""
+    centers = get_neighbourhood_centers(region)
+    if not centers:
+        return DEFAULT_NEIGHBOURHOOD
+    return min(centers, key=lambda name: haversine_distance(lat, lng, centers[name]["lat"], centers[name]["lng"]))
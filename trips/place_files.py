@@ -0,0 +1,138 @@
+"""
+Place data files, as written by ``export_places`` and read by
+``load_simple_places``.
+
+Each place is an object with the ``PLACE_FILE_FIELDS`` keys. A file is a
+JSON list of them, NDJSON (one object per line) or CSV (one column per key,
+tags and vibes as JSON arrays), chosen from its suffix, and gzip-compressed
+when its name ends in ``.gz``. Writers take rows one at a time, so an
+export streams instead of building the whole file in memory.
+"""
+
+import csv
+import gzip
+import io
+import json
+from decimal import Decimal
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, Optional
+
+from .serializers import dumps
+
+FORMATS = ("json", "ndjson", "csv")
+
+PLACE_FILE_FIELDS = (
+    "slug",
+    "name",
+    "category",
+    "neighbourhood",
+    "lat",
+    "lng",
+    "entry_fee",
+    "avg_food",
+    "duration_min",
+    "rating",
+    "price_tier",
+    "tags",
+    "vibes",
+    "popularity",
+)
+
+_SUFFIX_FORMATS = {".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson", ".csv": "csv"}
+_FLOAT_FIELDS = ("lat", "lng")
+_INT_FIELDS = ("entry_fee", "avg_food", "duration_min")
+_LIST_FIELDS = ("tags", "vibes")
+
+
+def detect_format(path: str) -> Optional[str]:
+    """File format implied by ``path``'s suffix (ignoring ``.gz``), or None."""
+    suffixes = Path(path).suffixes
+    if suffixes and suffixes[-1] == ".gz":
+        suffixes = suffixes[:-1]
+    return _SUFFIX_FORMATS.get(suffixes[-1].lower()) if suffixes else None
+
+
+def is_gzipped(path: str) -> bool:
+    return path.endswith(".gz")
+
+
+def open_binary(path: str, mode: str, compress: bool) -> IO[bytes]:
+    return gzip.open(path, mode) if compress else open(path, mode)
+
+
+def _jsonable(value):
+    # Decimal columns (rating, popularity) have at most 3 significant digits,
+    # so a float holds them exactly
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def write_places(stream: IO[bytes], file_format: str, rows: Iterable[tuple]) -> int:
+    """Write ``rows`` (tuples of ``PLACE_FILE_FIELDS``) to ``stream``; returns the count."""
+    count = 0
+    if file_format == "csv":
+        text = io.TextIOWrapper(stream, encoding="utf-8", newline="", write_through=True)
+        writer = csv.writer(text)
+        writer.writerow(PLACE_FILE_FIELDS)
+        for row in rows:
+            writer.writerow(
+                json.dumps(list(value), ensure_ascii=False) if field in _LIST_FIELDS else value
+                for field, value in zip(PLACE_FILE_FIELDS, row)
+            )
+            count += 1
+        text.detach()
+        return count
+
+    if file_format == "json":
+        stream.write(b"[")
+    for row in rows:
+        item = dumps({field: _jsonable(value) for field, value in zip(PLACE_FILE_FIELDS, row)})
+        if file_format == "json":
+            stream.write(b"\n" if not count else b",\n")
+            stream.write(item)
+        else:
+            stream.write(item + b"\n")
+        count += 1
+    if file_format == "json":
+        stream.write(b"\n]\n")
+    return count
+
+
+def _csv_item(record: dict) -> dict:
+    item = dict(record)
+    for field in _FLOAT_FIELDS:
+        if field in item:
+            item[field] = float(item[field])
+    for field in _INT_FIELDS:
+        if item.get(field) not in (None, ""):
+            item[field] = int(item[field])
+    for field in _LIST_FIELDS:
+        if item.get(field) not in (None, ""):
+            item[field] = json.loads(item[field])
+    return item
+
+
+def _read_lines(stream: IO[bytes]) -> Iterator[dict]:
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_places(path: str, file_format: Optional[str] = None) -> List[dict]:
+    """
+    Read the place objects of a file. Raises ValueError for an unknown
+    format or a malformed file.
+    """
+    file_format = file_format or detect_format(path) or "json"
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format {file_format!r}; expected one of {', '.join(FORMATS)}")
+
+    with open_binary(path, "rb", is_gzipped(path)) as stream:
+        if file_format == "json":
+            data = json.load(stream)
+            if not isinstance(data, list):
+                raise ValueError("JSON must be a list of Place objects.")
+            return data
+        if file_format == "ndjson":
+            return list(_read_lines(stream))
+        text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        return [_csv_item(record) for record in csv.DictReader(text)]
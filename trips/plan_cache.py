@@ -0,0 +1,164 @@
+"""
+Cache of ``/api/plan/`` results.
+
+Requests are first normalized into a ``PlanQuery``: categories and vibes
+become sorted sets (vibes lowercased), the free text becomes its sorted
+scoring tokens, and the budget and time are rounded down to
+``PLAN_BUDGET_STEP`` and ``PLAN_MINUTES_STEP``. None of that changes the
+scores, and rounding down keeps every cached plan within the budget and time
+actually asked for, so "2000 KSH, 4 hours, chill" and "2049 KSH, 4 h 10 min,
+Chill" share one entry. The hour of the day is kept as given: travel times
+depend on it.
+
+Entries are keyed on the normalized query plus the dataset version and
+travel matrix build, so a data change retires them without any
+invalidation. Encoded responses are kept in a per-process LRU of
+``PLAN_CACHE_SIZE`` entries in front of the ``PLAN_CACHE_ALIAS`` Django
+cache (``PLAN_CACHE_TIMEOUT`` seconds), which workers share when it is
+backed by Redis (``REDIS_URL``) or memcached. A local-memory backend, the
+default without ``REDIS_URL``, is private to the process like the LRU, so
+the shared tier is skipped and every worker builds its own plans.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from .ranking import query_tokens
+
+
+class PlanQuery(NamedTuple):
+    region: str
+    start: str
+    budget: int
+    minutes: int
+    categories: Tuple[str, ...]
+    vibes: Tuple[str, ...]
+    tokens: Tuple[str, ...]
+    hour: Optional[int] = None
+
+    @property
+    def free_text(self) -> str:
+        return " ".join(self.tokens)
+
+
+def _bucket(value: int, step: int) -> int:
+    """Round down to a multiple of ``step``; values under one step stay exact."""
+    return value if value < step else value - value % step
+
+
+def normalize(
+    region: str,
+    start: str,
+    budget: int,
+    minutes: int,
+    categories: Iterable[str] = (),
+    vibes: Iterable[str] = (),
+    free_text: str = "",
+    hour: Optional[int] = None,
+) -> PlanQuery:
+    return PlanQuery(
+        region=region,
+        start=start,
+        budget=_bucket(budget, settings.PLAN_BUDGET_STEP),
+        minutes=_bucket(minutes, settings.PLAN_MINUTES_STEP),
+        categories=tuple(sorted(set(categories))),
+        vibes=tuple(sorted({vibe.lower() for vibe in vibes})),
+        # Sorted but not deduplicated: a repeated token weighs double in the text score
+        tokens=tuple(sorted(query_tokens(free_text))),
+        hour=hour,
+    )
+
+
+class PlanCache:
+    def __init__(self, max_entries: int, alias: str, timeout: Optional[float]):
+        self.max_entries = max_entries
+        self.alias = alias
+        self.timeout = timeout
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = self.shared_hits = self.misses = 0
+
+    @staticmethod
+    def shared_key(key: tuple) -> str:
+        # Django cache backends limit key length and characters
+        return "plan:" + hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def shared_cache(self):
+        """The ``alias`` cache, or None if it is local memory and so no more shared than the LRU."""
+        shared = caches[self.alias]
+        return None if isinstance(shared, LocMemCache) else shared
+
+    def get_or_build(self, query: PlanQuery, version: Hashable, build: Callable[[], bytes]) -> Tuple[bytes, str]:
+        """
+        The encoded plan of ``query`` at ``version`` (of the data it is
+        built from: the dataset and the region's travel matrix), from the cache
+        or from ``build()``, and where it came from: "local", "shared" or
+        "miss".
+        """
+        key = (version, *query)
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+                self.local_hits += 1
+                return content, "local"
+
+        shared = self.shared_cache()
+        shared_key = self.shared_key(key)
+        content = None if shared is None else shared.get(shared_key)
+        if content is not None:
+            source = "shared"
+        else:
+            content = build()
+            if shared is not None:
+                shared.set(shared_key, content, self.timeout)
+            source = "miss"
+
+        with self._lock:
+            if source == "shared":
+                self.shared_hits += 1
+            else:
+                self.misses += 1
+            self._entries[key] = content
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return content, source
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.local_hits + self.shared_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "sharedTier": self.shared_cache() is not None,
+                "localHits": self.local_hits,
+                "sharedHits": self.shared_hits,
+                "misses": self.misses,
+                "hitRate": (self.local_hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.local_hits = self.shared_hits = self.misses = 0
+
+
+_cache: Optional[PlanCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_plan_cache() -> PlanCache:
+    """Return this process's plan cache, creating it from the ``PLAN_CACHE_*`` settings on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PlanCache(settings.PLAN_CACHE_SIZE, settings.PLAN_CACHE_ALIAS, settings.PLAN_CACHE_TIMEOUT)
+    return _cache
@@ -0,0 +1,173 @@
+"""
+Server-side itinerary planner, the four stages of the frontends' planner:
+
+1. spatial search: places within ``SEARCH_RADIUS_KM`` of the start
+   neighbourhood's center;
+2. budget filter: places costing at most 60% of the budget
+   (``ConstraintIndex.within_budget``);
+3. scoring and ranking (``RankingIndex``);
+4. greedy solver: walk the ranking and keep every place whose transport,
+   entry and food still fit the remaining budget and time. Transport comes
+   from the neighbourhood transport table of the requested hour of the day.
+
+Each stage follows the JS line by line, including its transport fallbacks
+and rounding, so a plan from ``/api/plan/`` matches the one the browser
+builds from the same geo data. The exception is a region with a travel
+matrix (``manage.py build_travel_matrix``): legs from one place to the next
+are then priced place to place from the matrix instead of between
+neighbourhood centers, which the browser's table makes free for two places
+in the same neighbourhood.
+"""
+
+import math
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from .constraints import get_constraint_index
+from .neighbourhoods import get_neighbourhood_centers, neighbourhood_name
+from .ranking import get_ranking_index
+from .serializers import PLACE_API_SPEC
+from .snapshot import PLACE_COLUMNS, get_place_snapshot
+from .transport import get_transport_table
+from .travel_matrix import get_travel_matrix
+
+SEARCH_RADIUS_KM = 20
+EARTH_RADIUS_KM = 6371
+FALLBACK_SPEED_KMH = 45  # JS getTransport, when the table has no usable minutes
+
+
+def _js_round(value: float) -> int:
+    """``Math.round``: halves go up, unlike Python's ``round``."""
+    return math.floor(value + 0.5)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """The JS ``haversineKm``; works on scalars and NumPy arrays alike."""
+    d_lat = (lat2 - lat1) * np.pi / 180
+    d_lng = (lng2 - lng1) * np.pi / 180
+    sin_d_lat = np.sin(d_lat / 2)
+    sin_d_lng = np.sin(d_lng / 2)
+    h = sin_d_lat * sin_d_lat + sin_d_lng * sin_d_lng * np.cos(lat1 * np.pi / 180) * np.cos(lat2 * np.pi / 180)
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+
+
+_coordinates: Dict[str, Tuple[int, np.ndarray, np.ndarray]] = {}
+_coordinates_lock = threading.Lock()
+
+
+def _place_coordinates(snapshot) -> Tuple[np.ndarray, np.ndarray]:
+    cached = _coordinates.get(snapshot.region)
+    if cached is None or cached[0] != snapshot.version:
+        lats = np.array([row.lat for row in snapshot.rows], dtype=np.float64)
+        lngs = np.array([row.lng for row in snapshot.rows], dtype=np.float64)
+        cached = (snapshot.version, lats, lngs)
+        with _coordinates_lock:
+            _coordinates[snapshot.region] = cached
+    return cached[1], cached[2]
+
+
+def get_transport(origin: str, destination: str, centers: dict, table: dict) -> dict:
+    """The JS ``getTransport``: table entry, else a straight-line estimate."""
+    if origin == destination:
+        return {"mode": "Walk", "fare": 0, "minutes": 0}
+    origin_center = centers.get(origin)
+    dest_center = centers.get(destination)
+
+    from_table = table.get(f"{origin}|{destination}")
+    if from_table:
+        minutes = from_table.get("minutes")
+        if isinstance(minutes, (int, float)) and math.isfinite(minutes) and minutes > 0:
+            return from_table
+        if not origin_center or not dest_center:
+            return {**from_table, "minutes": 45}
+        km = float(haversine_km(origin_center["lat"], origin_center["lng"], dest_center["lat"], dest_center["lng"]))
+        return {**from_table, "minutes": _js_round(max(1, km / FALLBACK_SPEED_KMH * 60))}
+
+    if not origin_center or not dest_center:
+        return {"mode": "Matatu", "fare": 80, "minutes": 45}
+    km = float(haversine_km(origin_center["lat"], origin_center["lng"], dest_center["lat"], dest_center["lng"]))
+    return {
+        "mode": "Matatu",
+        "fare": _js_round(max(30, km * 8)),
+        "minutes": _js_round(max(1, km / FALLBACK_SPEED_KMH * 60)),
+    }
+
+
+def build_plan(
+    region: str,
+    start: str,
+    budget: int,
+    minutes: int,
+    categories: Iterable[str] = (),
+    vibes: Iterable[str] = (),
+    free_text: str = "",
+    hour: Optional[int] = None,
+) -> dict:
+    """
+    Plan a trip from neighbourhood ``start`` of ``region`` leaving at
+    ``hour`` (0-23, or None for no particular time), in the shape of the JS
+    planner's result.
+    """
+    snapshot = get_place_snapshot(region)
+    centers = get_neighbourhood_centers(region)
+    result = {"version": snapshot.version, "stops": [], "remainingBudget": budget, "remainingMinutes": minutes}
+
+    # Stage 1
+    center = centers.get(start)
+    if center is None:
+        return result
+    lats, lngs = _place_coordinates(snapshot)
+    nearby = np.flatnonzero(haversine_km(center["lat"], center["lng"], lats, lngs) <= SEARCH_RADIUS_KM)
+
+    # Stage 2
+    constraints = get_constraint_index(region)
+    affordable = constraints.within_budget(budget, candidates=nearby)
+    if not len(affordable):
+        return result
+
+    # Stage 3
+    ranked, scores = get_ranking_index(region).top_k(None, categories, vibes, free_text, candidates=affordable)
+
+    # Stage 4. A stop costs at least its place and lasts at least its visit,
+    # so the walk can stop once nothing left could fit
+    table = get_transport_table(region, centers, hour)
+    matrix = get_travel_matrix(region)
+    min_cost = constraints.columns["cost"][affordable].min()
+    min_duration = constraints.columns["duration"][affordable].min()
+    remaining_budget, remaining_minutes = budget, minutes
+    current = start
+    current_place = None  # Slug of the last stop, once there is one
+    serialize = PLACE_API_SPEC.compile(PLACE_COLUMNS)
+    stops = []
+    for i, score in zip(ranked.tolist(), scores.tolist()):
+        if remaining_budget < min_cost or remaining_minutes < min_duration:
+            break
+        place = snapshot.rows[i]
+        neighbourhood = neighbourhood_name(place.neighbourhood)
+        leg = matrix.lookup(current_place, place.slug, hour) if matrix is not None and current_place else None
+        if leg is not None:
+            transport = {"mode": leg[0], "fare": leg[1], "minutes": leg[2]}
+        else:
+            transport = get_transport(current, neighbourhood, centers, table)
+        place_cost = place.entry_fee + place.avg_food
+        total_cost = transport["fare"] + place_cost
+        total_time = transport["minutes"] + place.duration_min
+        if total_cost <= remaining_budget and total_time <= remaining_minutes:
+            stops.append({
+                "place": serialize(place),
+                "score": score,
+                "transport": transport,
+                "costBreakdown": {
+                    "transport": transport["fare"], "entry": place.entry_fee, "food": place.avg_food, "total": total_cost,
+                },
+                "timeBreakdown": {"travel": transport["minutes"], "visit": place.duration_min, "total": total_time},
+            })
+            remaining_budget -= total_cost
+            remaining_minutes -= total_time
+            current = neighbourhood
+            current_place = place.slug
+
+    result.update(stops=stops, remainingBudget=remaining_budget, remainingMinutes=remaining_minutes)
+    return result
@@ -0,0 +1,259 @@
+"""
+Vectorized place scoring and top-k ranking (stage 3 of the planner).
+
+Same formula as ``stage3ScoreAndRank`` in the frontends::
+
+    score = rating / 5 * 0.3 + category * 0.3 + min(1, vibes / 2) * 0.2
+            + popularity * 0.2 + text * 0.2
+
+where ``category`` is 1 for a preferred category, 0 otherwise and 0.5 when
+no category is preferred, ``vibes`` counts the place's vibes that are
+preferred (case-insensitively), and ``text`` is the share of free-text
+tokens (longer than two characters) found in the place's tags, vibes, name
+or category.
+
+``RankingIndex`` keeps the attributes of a snapshot as NumPy columns,
+category codes, a vibe count matrix and a word incidence list, so a query
+is a handful of array expressions over all places. The best k come from
+``argpartition`` instead of a full sort; ties keep candidate order, like
+the stable JS sort. The terms are added in the same order as in JS, so the
+scores are bit-for-bit the same.
+
+``RankingIndex.state`` and ``from_state`` let ``warm_start`` store those
+columns on disk and adopt them again without rescanning the rows.
+"""
+
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .snapshot import PlaceRow, get_place_snapshot
+
+
+class ScoreWeights(NamedTuple):
+    rating: float = 0.3
+    category: float = 0.3
+    vibe: float = 0.2
+    popularity: float = 0.2
+    text: float = 0.2
+
+
+DEFAULT_WEIGHTS = ScoreWeights()
+NO_CATEGORY_PREFERENCE = 0.5
+TOKEN_CACHE_SIZE = 64
+
+
+def default_weights() -> ScoreWeights:
+    """``DEFAULT_WEIGHTS`` with any overrides from ``settings.RANKING_WEIGHTS``."""
+    return DEFAULT_WEIGHTS._replace(**getattr(settings, "RANKING_WEIGHTS", {}))
+
+
+def query_tokens(free_text: str) -> List[str]:
+    return [token for token in (free_text or "").lower().split() if len(token) > 2]
+
+
+def _haystack_words(row: PlaceRow) -> Iterable[str]:
+    for value in (*row.tags, *row.vibes, row.name, row.category):
+        yield from str(value).lower().split()
+
+
+class RankingIndex:
+    def __init__(self, version: int, rows: Sequence[PlaceRow]):
+        self.version = version
+        self.rows = rows
+        n = len(rows)
+
+        self.rating = np.array([row.rating for row in rows], dtype=np.float64)
+        self.popularity = np.array([row.popularity for row in rows], dtype=np.float64)
+
+        self.category_codes: Dict[str, int] = {}
+        self.categories = np.array(
+            [self.category_codes.setdefault(row.category, len(self.category_codes)) for row in rows],
+            dtype=np.int32,
+        )
+
+        self.vibe_codes: Dict[str, int] = {}
+        vibe_rows, vibe_cols = [], []
+        for i, row in enumerate(rows):
+            for vibe in row.vibes:
+                vibe_rows.append(i)
+                vibe_cols.append(self.vibe_codes.setdefault(vibe.lower(), len(self.vibe_codes)))
+        # Counts, not flags: a place listing the same vibe twice matches twice in JS too
+        self.vibe_counts = np.zeros((n, max(1, len(self.vibe_codes))), dtype=np.uint8)
+        np.add.at(self.vibe_counts, (vibe_rows, vibe_cols), 1)
+
+        # Tokens hold no whitespace, so a token is in the joined haystack iff
+        # it is inside one of its whitespace-separated words
+        word_codes: Dict[str, int] = {}
+        word_rows, word_ids = [], []
+        for i, row in enumerate(rows):
+            for word in set(_haystack_words(row)):
+                word_rows.append(i)
+                word_ids.append(word_codes.setdefault(word, len(word_codes)))
+        self.words = list(word_codes)
+        self.word_rows = np.array(word_rows, dtype=np.int64)
+        self.word_ids = np.array(word_ids, dtype=np.int64)
+        self._cache_token_matches()
+
+    def _cache_token_matches(self) -> None:
+        # Substring tests scan the whole vocabulary, so keep the common tokens' masks
+        self._text_matches = lru_cache(maxsize=TOKEN_CACHE_SIZE)(self._match_token)
+
+    def state(self) -> Tuple[Dict[str, List[str]], Dict[str, np.ndarray]]:
+        """The index's vocabularies and arrays, for ``from_state``."""
+        vocabularies = {"categories": list(self.category_codes), "vibes": list(self.vibe_codes), "words": self.words}
+        arrays = {
+            "rating": self.rating,
+            "popularity": self.popularity,
+            "categories": self.categories,
+            "vibe_counts": self.vibe_counts,
+            "word_rows": self.word_rows,
+            "word_ids": self.word_ids,
+        }
+        return vocabularies, arrays
+
+    @classmethod
+    def from_state(
+        cls, version: int, rows: Sequence[PlaceRow], vocabularies: Dict[str, List[str]], arrays: Dict[str, np.ndarray]
+    ) -> "RankingIndex":
+        """An index over ``rows`` from the ``state`` of one built over the same rows; arrays are used as given."""
+        index = cls.__new__(cls)
+        index.version = version
+        index.rows = rows
+        index.category_codes = {value: i for i, value in enumerate(vocabularies["categories"])}
+        index.vibe_codes = {value: i for i, value in enumerate(vocabularies["vibes"])}
+        index.words = vocabularies["words"]
+        for name in ("rating", "popularity", "categories", "vibe_counts", "word_rows", "word_ids"):
+            setattr(index, name, arrays[name])
+        index._cache_token_matches()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _match_token(self, token: str) -> np.ndarray:
+        matching = np.fromiter((token in word for word in self.words), dtype=bool, count=len(self.words))
+        rows = self.word_rows[matching[self.word_ids]]
+        return np.bincount(rows, minlength=len(self.rows)) > 0
+
+    def scores(
+        self,
+        categories: Iterable[str] = (),
+        vibes: Iterable[str] = (),
+        free_text: str = "",
+        *,
+        candidates: Optional[np.ndarray] = None,
+        weights: Optional[ScoreWeights] = None,
+    ) -> np.ndarray:
+        """Score of every place, or of the ``candidates`` row indices in that order."""
+        w = weights or default_weights()
+        idx = slice(None) if candidates is None else np.asarray(candidates, dtype=np.int64)
+
+        categories = set(categories)
+        if categories:
+            codes = [self.category_codes[c] for c in categories if c in self.category_codes]
+            category = np.isin(self.categories[idx], codes).astype(np.float64)
+        else:
+            category = NO_CATEGORY_PREFERENCE
+
+        columns = sorted({self.vibe_codes[v.lower()] for v in vibes if v.lower() in self.vibe_codes})
+        matches = self.vibe_counts[:, columns].sum(axis=1, dtype=np.float64)[idx]
+        vibe = np.minimum(1.0, matches / 2)
+
+        tokens = query_tokens(free_text)
+        text = 0.0
+        if tokens:
+            found = sum(self._text_matches(token).astype(np.int64) for token in tokens)
+            text = np.minimum(1.0, found[idx] / len(tokens))
+
+        # Same association order as the JS, for identical floats
+        score = self.rating[idx] / 5 * w.rating + category * w.category
+        score = score + vibe * w.vibe
+        score = score + self.popularity[idx] * w.popularity
+        return score + text * w.text
+
+    def top_k(
+        self,
+        k: Optional[int],
+        categories: Iterable[str] = (),
+        vibes: Iterable[str] = (),
+        free_text: str = "",
+        *,
+        candidates: Optional[np.ndarray] = None,
+        weights: Optional[ScoreWeights] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Row indices of the ``k`` best places (all of them for None), best
+        first, and their scores. Equal scores keep the order of
+        ``candidates`` (row order by default).
+        """
+        scores = self.scores(categories, vibes, free_text, candidates=candidates, weights=weights)
+        positions = top_k_positions(scores, k)
+        rows = positions if candidates is None else np.asarray(candidates, dtype=np.int64)[positions]
+        return rows, scores[positions]
+
+
+def top_k_positions(scores: np.ndarray, k: Optional[int]) -> np.ndarray:
+    """Positions of the ``k`` highest scores, best first; ties by position."""
+    n = len(scores)
+    if k is None or k >= n:
+        return np.lexsort((np.arange(n), -scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    threshold = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > threshold)
+    # Only the earliest of the places tied at the cut make it, as in a stable sort
+    tied = np.flatnonzero(scores == threshold)[: k - len(above)]
+    chosen = np.concatenate([above, tied])
+    return chosen[np.lexsort((chosen, -scores[chosen]))]
+
+
+def reference_score(
+    row: PlaceRow, categories: Sequence[str], vibes: Sequence[str], free_text: str,
+    weights: ScoreWeights = DEFAULT_WEIGHTS,
+) -> float:
+    """One place scored exactly like the JS ``stage3ScoreAndRank``; for parity checks."""
+    category_set = set(categories)
+    vibe_set = {v.lower() for v in vibes}
+    tokens = query_tokens(free_text)
+
+    category = (1 if row.category in category_set else 0) if category_set else NO_CATEGORY_PREFERENCE
+    vibe = min(1, len([v for v in row.vibes if v.lower() in vibe_set]) / 2)
+    text = 0
+    if tokens:
+        haystack = " ".join([*row.tags, *row.vibes, row.name, row.category]).lower()
+        text = min(1, sum(1 for token in tokens if token in haystack) / len(tokens))
+    base = row.rating / 5 * weights.rating + category * weights.category + vibe * weights.vibe
+    base = base + row.popularity * weights.popularity
+    return base + text * weights.text
+
+
+_indexes: Dict[str, RankingIndex] = {}
+_index_lock = threading.Lock()
+_preloaded: Dict[str, RankingIndex] = {}
+
+
+def preload_ranking_index(region: str, index: RankingIndex) -> None:
+    _preloaded[region] = index
+
+
+def _take_preloaded(region: str, version: int) -> Optional[RankingIndex]:
+    index = _preloaded.pop(region, None)
+    return index if index is not None and index.version == version else None
+
+
+def get_ranking_index(region: str) -> RankingIndex:
+    """Return this process's ranking index of ``region``, rebuilding it for a new dataset version."""
+    snapshot = get_place_snapshot(region)
+    index = _indexes.get(region)
+    if index is None or index.version != snapshot.version:
+        with _index_lock:
+            index = _indexes.get(region)
+            if index is None or index.version != snapshot.version:
+                index = _take_preloaded(region, snapshot.version) or RankingIndex(snapshot.version, snapshot.rows)
+                _indexes[region] = index
+    return index
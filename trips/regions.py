@@ -0,0 +1,321 @@
+"""
+Region partitioning of the Place table.
+
+Every place belongs to one region (``Place.region``) and every API, derived
+structure and loader works on one region at a time. ``replace_region``
+swaps a region's places for a new set in one transaction, so readers see
+either the old or the new region and other regions are never touched.
+
+On PostgreSQL the table can optionally be LIST-partitioned by region
+(``manage.py partition_places``). A region is then replaced by loading its
+rows into a staging table and swapping that in for the region's partition,
+so a large region load doesn't churn one shared table. Partitioned tables
+can't enforce a slug primary key on its own, so the key becomes
+(slug, region) and ``replace_region`` checks for slugs owned by other
+regions itself.
+
+``replace_region_rows`` does the same for more places than fit in memory
+as model instances (synthetic scale-test data): it streams rows in with
+COPY on PostgreSQL.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import re
+import threading
+from typing import Callable, Iterable, List, Sequence, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils.text import slugify
+
+from .dataset import aget_dataset_version, batched_dataset_writes, get_dataset_version
+from .jobs import enqueue
+from .models import NeighbourhoodStats, Place
+from .place_files import PLACE_FILE_FIELDS
+
+REGION_RE = re.compile(r"[-a-zA-Z0-9_]{1,100}")
+
+PLACE_TABLE = Place._meta.db_table
+
+# Regions seen with places at the dataset version of the first item. Only
+# hits are kept, so unknown names requested by clients can't grow it.
+_known_regions: Tuple[int, set] = (-1, set())
+_known_regions_lock = threading.Lock()
+
+
+def region_key(name: str) -> str:
+    """Region identifier for a display name, e.g. "Nyeri County, Kenya" -> "nyeri-county-kenya"."""
+    return slugify(name)[:100] or "region"
+
+
+def list_regions() -> List[dict]:
+    """Regions with places, from the neighbourhood aggregates."""
+    rows = (
+        NeighbourhoodStats.objects.filter(place_count__gt=0)
+        .order_by("region")
+        .values("region")
+        .annotate(places=Sum("place_count"), neighbourhoods=Count("pk"))
+    )
+    return [
+        {"region": row["region"], "places": row["places"], "neighbourhoods": row["neighbourhoods"]}
+        for row in rows
+    ]
+
+
+def _remember_region(version: int, region: str) -> None:
+    global _known_regions
+    with _known_regions_lock:
+        if _known_regions[0] != version:
+            _known_regions = (version, set())
+        _known_regions[1].add(region)
+
+
+def _has_places(region: str):
+    return NeighbourhoodStats.objects.filter(region=region, place_count__gt=0)
+
+
+def region_exists(region: str) -> bool:
+    """
+    True if ``region`` has places. Per-region caches are keyed by whatever
+    region a request names, so views check this before touching them.
+    """
+    version = get_dataset_version()
+    known_version, known = _known_regions
+    if known_version == version and region in known:
+        return True
+    if not _has_places(region).exists():
+        return False
+    _remember_region(version, region)
+    return True
+
+
+async def aregion_exists(region: str) -> bool:
+    """Async variant of ``region_exists``."""
+    version = await aget_dataset_version()
+    known_version, known = _known_regions
+    if known_version == version and region in known:
+        return True
+    if not await _has_places(region).aexists():
+        return False
+    _remember_region(version, region)
+    return True
+
+
+def is_partitioned() -> bool:
+    """True if the Place table is LIST-partitioned by region (PostgreSQL only)."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND c.relnamespace = to_regnamespace(current_schema())",
+            [PLACE_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_name(region: str) -> str:
+    # Hashed so any region fits PostgreSQL's 63-character identifier limit
+    return f"{PLACE_TABLE}_r_{hashlib.sha1(region.encode()).hexdigest()[:12]}"
+
+
+def _partition_exists(name: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent WHERE c.relname = %s AND p.relname = %s",
+            [name, PLACE_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_statements(regions: Iterable[str], index_definitions: Sequence[str]) -> List[str]:
+    """
+    SQL converting the plain Place table into a table partitioned by region,
+    with one partition per region in ``regions`` plus a default partition.
+    ``index_definitions`` are the table's ``CREATE INDEX`` statements, read
+    before the conversion (``current_index_definitions``).
+    """
+    qn = connection.ops.quote_name
+    table = qn(PLACE_TABLE)
+    old = qn(f"{PLACE_TABLE}_unpartitioned")
+    statements = [
+        f"ALTER TABLE {table} RENAME TO {old}",
+        f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY LIST (region)",
+        f"ALTER TABLE {table} ADD PRIMARY KEY (slug, region)",
+        f"CREATE TABLE {qn(PLACE_TABLE + '_default')} PARTITION OF {table} DEFAULT",
+    ]
+    for region in regions:
+        if not REGION_RE.fullmatch(region):
+            raise ValueError(f"Invalid region: {region!r}")
+        statements.append(
+            f"CREATE TABLE {qn(partition_name(region))} PARTITION OF {table} FOR VALUES IN ('{region}')"
+        )
+    statements += [
+        f"INSERT INTO {table} SELECT * FROM {old}",
+        f"DROP TABLE {old}",
+    ]
+    # Index names are schema-wide, so the old indexes are recreated only
+    # after the drop; their definitions name the table, now the partitioned one
+    statements += list(index_definitions)
+    return statements
+
+
+def current_index_definitions() -> List[str]:
+    """``CREATE INDEX`` statements of the Place table, except its primary key."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes i WHERE i.tablename = %s AND i.schemaname = current_schema() "
+            "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname AND c.contype = 'p')",
+            [PLACE_TABLE],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _insert_rows(table: str, places: Sequence[Place], batch_size: int = 1000) -> None:
+    fields = Place._meta.concrete_fields
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in fields)
+    placeholders = ", ".join(["%s"] * len(fields))
+    sql = f"INSERT INTO {connection.ops.quote_name(table)} ({columns}) VALUES ({placeholders})"
+    with connection.cursor() as cursor:
+        for start in range(0, len(places), batch_size):
+            cursor.executemany(
+                sql,
+                [
+                    [f.get_db_prep_save(f.pre_save(place, True), connection) for f in fields]
+                    for place in places[start:start + batch_size]
+                ],
+            )
+
+
+def _copy_rows(table: str, region: str, chunks: Iterable[Sequence[tuple]]) -> int:
+    """
+    Insert chunks of ``PLACE_FILE_FIELDS`` tuples into ``table`` as places
+    of ``region``, with COPY on PostgreSQL. Returns the row count.
+    """
+    qn = connection.ops.quote_name
+    fields = [Place._meta.get_field(name) for name in (*PLACE_FILE_FIELDS, "region", "updated_seq")]
+    columns = ", ".join(qn(f.column) for f in fields)
+    list_columns = [i for i, f in enumerate(fields) if f.name in ("tags", "vibes")]
+    count = 0
+    with connection.cursor() as cursor:
+        copy = getattr(cursor, "copy_expert", None) if connection.vendor == "postgresql" else None
+        for chunk in chunks:
+            rows = []
+            for row in chunk:
+                row = [*row, region, 0]
+                for i in list_columns:
+                    row[i] = json.dumps(list(row[i]), ensure_ascii=False)
+                rows.append(row)
+            if copy is not None:
+                buffer = io.StringIO()
+                # Strings quoted, so an empty one isn't read as NULL
+                csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+                buffer.seek(0)
+                copy(f"COPY {qn(table)} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                placeholders = ", ".join(["%s"] * len(fields))
+                cursor.executemany(f"INSERT INTO {qn(table)} ({columns}) VALUES ({placeholders})", rows)
+            count += len(rows)
+    return count
+
+
+def _swap_partition(region: str, load: Callable[[str], object]) -> None:
+    qn = connection.ops.quote_name
+    table = qn(PLACE_TABLE)
+    partition = partition_name(region)
+    stage = f"{partition}_stage"
+
+    # Build the new partition off to the side; the CHECK lets ATTACH skip its validation scan
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {qn(stage)}")
+        cursor.execute(f"CREATE TABLE {qn(stage)} (LIKE {table} INCLUDING ALL)")
+        cursor.execute(
+            f"ALTER TABLE {qn(stage)} ADD CONSTRAINT {qn(stage + '_region')} CHECK (region = '{region}')"
+        )
+    load(stage)
+
+    with connection.cursor() as cursor:
+        if _partition_exists(partition):
+            cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {qn(partition)}")
+            cursor.execute(f"DROP TABLE {qn(partition)}")
+        else:
+            # The region's rows so far live in the default partition
+            cursor.execute(f"DELETE FROM {table} WHERE region = %s", [region])
+        cursor.execute(f"ALTER TABLE {qn(stage)} RENAME TO {qn(partition)}")
+        cursor.execute(f"ALTER TABLE {table} ATTACH PARTITION {qn(partition)} FOR VALUES IN ('{region}')")
+
+
+def replace_region(region: str, places: Sequence[Place]) -> Tuple[int, int]:
+    """
+    Atomically replace every place of ``region`` with ``places``. Returns
+    (removed, created). Raises ValueError for an invalid region or for slugs
+    that are repeated or already used by another region.
+    """
+    if not REGION_RE.fullmatch(region):
+        raise ValueError(f"Invalid region: {region!r}")
+    places = list(places)
+    for place in places:
+        place.region = region
+
+    slugs = [place.slug for place in places]
+    if len(set(slugs)) != len(slugs):
+        raise ValueError("Duplicate slugs in the new places.")
+    taken = list(Place.objects.filter(slug__in=slugs).exclude(region=region).values_list("slug", flat=True)[:5])
+    if taken:
+        raise ValueError(f"Slugs already used by another region: {', '.join(taken)}")
+
+    with transaction.atomic(), batched_dataset_writes(region):
+        removed = Place.objects.filter(region=region).count()
+        if is_partitioned():
+            _swap_partition(region, lambda table: _insert_rows(table, places))
+        else:
+            Place.objects.filter(region=region).delete()
+            Place.objects.bulk_create(places, batch_size=1000)
+        # Derived files are rebuilt by the job worker, not by the loader
+        enqueue(
+            "refresh_region_artifacts", {"region": region}, dedupe_key=f"refresh_region_artifacts:{region}"
+        )
+    return removed, len(places)
+
+
+def replace_region_rows(region: str, chunks: Iterable[Sequence[tuple]]) -> Tuple[int, int]:
+    """
+    ``replace_region`` for places given as chunks of ``PLACE_FILE_FIELDS``
+    tuples, which are streamed into the table instead of being held as
+    Place objects. Returns (removed, created). Slugs must be unique; one
+    already used by another region fails the load (IntegrityError, or
+    ValueError on a partitioned table) and nothing changes.
+    """
+    if not REGION_RE.fullmatch(region):
+        raise ValueError(f"Invalid region: {region!r}")
+
+    created = 0
+
+    def load(table):
+        nonlocal created
+        created = _copy_rows(table, region, chunks)
+
+    with transaction.atomic(), batched_dataset_writes(region):
+        removed = Place.objects.filter(region=region).count()
+        if is_partitioned():
+            _swap_partition(region, load)
+            taken = list(
+                Place.objects.filter(region=region)
+                .filter(slug__in=Place.objects.exclude(region=region).values("slug"))
+                .values_list("slug", flat=True)[:5]
+            )
+            if taken:
+                raise ValueError(f"Slugs already used by another region: {', '.join(taken)}")
+        else:
+            # Raw DELETE: the ORM would fetch every row to send delete signals
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(PLACE_TABLE)} WHERE region = %s", [region])
+            load(PLACE_TABLE)
+        enqueue(
+            "refresh_region_artifacts", {"region": region}, dedupe_key=f"refresh_region_artifacts:{region}"
+        )
+    return removed, created
@@ -0,0 +1,448 @@
+"""
+Offline road-graph routing.
+
+``manage.py build_road_graph`` ingests a road network exported from OSM
+(an edge CSV or a GeoJSON of LineStrings) into a compact array-backed graph:
+node coordinates plus forward and reverse adjacency in CSR form, with travel
+minutes and lengths per edge. It also precomputes ALT landmark distances
+(A*, Landmarks and the Triangle inequality), which give A* a tight lower
+bound and keep point-to-point queries in the low milliseconds.
+
+With ``TRAVEL_MODEL = "road_graph"`` ``calculate_transport`` uses this graph
+instead of straight-line distance. Each process loads the graph file once
+and reloads it when the file changes, so a rebuild is picked up without a
+restart.
+"""
+
+import csv
+import heapq
+import json
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .utils import haversine_distance
+
+# Free-flow speeds (km/h) by OSM highway class, used when an edge has no speed
+DEFAULT_SPEEDS_KMH = {
+    "motorway": 80,
+    "trunk": 70,
+    "primary": 50,
+    "secondary": 40,
+    "tertiary": 35,
+    "unclassified": 25,
+    "residential": 20,
+    "service": 15,
+    "living_street": 10,
+    "track": 10,
+}
+FALLBACK_SPEED_KMH = 25
+COORD_DECIMALS = 6  # Points closer than ~0.1 m are merged into one node
+GRID_CELL_DEG = 0.01  # Nearest-node grid cell (~1.1 km)
+
+Edge = Tuple[float, float, float, float, float, bool]  # lat1, lng1, lat2, lng2, speed_kmh, oneway
+
+
+def _edge_speed(properties: dict) -> float:
+    speed = properties.get("speed_kmh") or properties.get("maxspeed")
+    try:
+        speed = float(str(speed).split()[0])
+    except (TypeError, ValueError, IndexError):
+        speed = None
+    if speed and speed > 0:
+        return speed
+    return float(DEFAULT_SPEEDS_KMH.get(properties.get("highway"), FALLBACK_SPEED_KMH))
+
+
+def _is_oneway(value) -> bool:
+    return str(value).strip().lower() in {"1", "true", "yes"}
+
+
+def read_edges_csv(path: Path) -> Iterable[Edge]:
+    """
+    Read edges from a CSV with columns ``from_lat, from_lng, to_lat, to_lng``
+    and optional ``speed_kmh``/``maxspeed``, ``highway`` and ``oneway``.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            yield (
+                float(row["from_lat"]),
+                float(row["from_lng"]),
+                float(row["to_lat"]),
+                float(row["to_lng"]),
+                _edge_speed(row),
+                _is_oneway(row.get("oneway")),
+            )
+
+
+def read_edges_geojson(path: Path) -> Iterable[Edge]:
+    """
+    Read edges from a GeoJSON FeatureCollection of LineStrings (or
+    MultiLineStrings). Each consecutive pair of points becomes one edge.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    for feature in data.get("features", []):
+        geometry = feature.get("geometry") or {}
+        properties = feature.get("properties") or {}
+        if geometry.get("type") == "LineString":
+            lines = [geometry["coordinates"]]
+        elif geometry.get("type") == "MultiLineString":
+            lines = geometry["coordinates"]
+        else:
+            continue
+
+        speed = _edge_speed(properties)
+        oneway = _is_oneway(properties.get("oneway"))
+        for line in lines:
+            for (lng1, lat1, *_), (lng2, lat2, *_) in zip(line, line[1:]):
+                yield lat1, lng1, lat2, lng2, speed, oneway
+
+
+def _csr(n: int, sources: np.ndarray, targets: np.ndarray, *columns: np.ndarray):
+    order = np.argsort(sources, kind="stable")
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=n), out=offsets[1:])
+    return (offsets, targets[order].astype(np.int32)) + tuple(c[order] for c in columns)
+
+
+class RoadGraph:
+    """
+    Directed road graph in CSR form.
+
+    Edge weights are travel minutes; edge lengths (km) are carried alongside
+    so a query can report the road distance of the fastest path.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+        self.lat = arrays["lat"]
+        self.lng = arrays["lng"]
+        self.landmarks = arrays["landmarks"]
+        self.lm_from = arrays["lm_from"]  # (L, n) minutes from landmark to node
+        self.lm_to = arrays["lm_to"]  # (L, n) minutes from node to landmark
+
+        # memoryviews index to plain Python numbers, far faster than numpy
+        # scalars inside the search loops
+        self._offsets = memoryview(arrays["offsets"])
+        self._targets = memoryview(arrays["targets"])
+        self._minutes = memoryview(arrays["minutes"])
+        self._km = memoryview(arrays["km"])
+        self._r_offsets = memoryview(arrays["r_offsets"])
+        self._r_targets = memoryview(arrays["r_targets"])
+        self._r_minutes = memoryview(arrays["r_minutes"])
+
+        self._grid = self._build_grid()
+
+    # -- construction -------------------------------------------------------
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Edge], *, landmark_count: int = 8) -> "RoadGraph":
+        node_ids: Dict[Tuple[float, float], int] = {}
+        lats: List[float] = []
+        lngs: List[float] = []
+        sources: List[int] = []
+        targets: List[int] = []
+        minutes: List[float] = []
+        lengths: List[float] = []
+
+        def node(lat: float, lng: float) -> int:
+            key = (round(lat, COORD_DECIMALS), round(lng, COORD_DECIMALS))
+            idx = node_ids.get(key)
+            if idx is None:
+                idx = node_ids[key] = len(lats)
+                lats.append(key[0])
+                lngs.append(key[1])
+            return idx
+
+        for lat1, lng1, lat2, lng2, speed_kmh, oneway in edges:
+            a = node(lat1, lng1)
+            b = node(lat2, lng2)
+            if a == b:
+                continue
+            km = haversine_distance(lat1, lng1, lat2, lng2)
+            cost = km / speed_kmh * 60
+            sources.append(a)
+            targets.append(b)
+            minutes.append(cost)
+            lengths.append(km)
+            if not oneway:
+                sources.append(b)
+                targets.append(a)
+                minutes.append(cost)
+                lengths.append(km)
+
+        if not lats:
+            raise ValueError("Road network contains no edges.")
+
+        n = len(lats)
+        src = np.asarray(sources, dtype=np.int64)
+        dst = np.asarray(targets, dtype=np.int64)
+        mins = np.asarray(minutes, dtype=np.float64)
+        kms = np.asarray(lengths, dtype=np.float64)
+
+        offsets, fwd_targets, fwd_minutes, fwd_km = _csr(n, src, dst, mins, kms)
+        r_offsets, r_targets, r_minutes = _csr(n, dst, src, mins)
+
+        arrays = {
+            "lat": np.asarray(lats, dtype=np.float64),
+            "lng": np.asarray(lngs, dtype=np.float64),
+            "offsets": offsets,
+            "targets": fwd_targets,
+            "minutes": fwd_minutes,
+            "km": fwd_km,
+            "r_offsets": r_offsets,
+            "r_targets": r_targets,
+            "r_minutes": r_minutes,
+            "landmarks": np.zeros(0, dtype=np.int32),
+            "lm_from": np.zeros((0, n), dtype=np.float64),
+            "lm_to": np.zeros((0, n), dtype=np.float64),
+        }
+        graph = cls(arrays)
+        graph.compute_landmarks(landmark_count)
+        return graph
+
+    def compute_landmarks(self, count: int) -> None:
+        """
+        Pick landmarks by farthest-point selection and store exact shortest
+        times to and from each of them.
+        """
+        n = len(self.lat)
+        count = max(0, min(count, n))
+        landmarks: List[int] = []
+        lm_from = np.zeros((count, n), dtype=np.float64)
+        lm_to = np.zeros((count, n), dtype=np.float64)
+
+        # Start from the node farthest from the graph's centroid
+        current = int(np.argmax((self.lat - self.lat.mean()) ** 2 + (self.lng - self.lng.mean()) ** 2))
+        coverage = np.full(n, np.inf)
+        for i in range(count):
+            landmarks.append(current)
+            lm_from[i] = self._dijkstra_all(current, reverse=False)
+            lm_to[i] = self._dijkstra_all(current, reverse=True)
+            # Next landmark: the reachable node farthest from all chosen ones
+            reach = np.where(np.isfinite(lm_from[i]), lm_from[i], -1.0)
+            coverage = np.minimum(coverage, np.where(reach >= 0, reach, np.inf))
+            candidates = np.where(np.isfinite(coverage), coverage, -1.0)
+            current = int(np.argmax(candidates))
+
+        self.arrays.update(landmarks=np.asarray(landmarks, dtype=np.int32), lm_from=lm_from, lm_to=lm_to)
+        self.landmarks = self.arrays["landmarks"]
+        self.lm_from = lm_from
+        self.lm_to = lm_to
+
+    def _dijkstra_all(self, source: int, *, reverse: bool) -> np.ndarray:
+        offsets, targets, weights = (
+            (self._r_offsets, self._r_targets, self._r_minutes)
+            if reverse
+            else (self._offsets, self._targets, self._minutes)
+        )
+        dist = [math.inf] * len(self.lat)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return np.asarray(dist, dtype=np.float64)
+
+    # -- persistence --------------------------------------------------------
+
+    def save(self, path: Path) -> None:
+        # Written beside the target and renamed over it, so a worker that
+        # notices the new file never loads a partial one
+        path = Path(path)
+        tmp = path.with_name(f"{path.name}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **self.arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RoadGraph":
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files})
+
+    # -- queries ------------------------------------------------------------
+
+    def _build_grid(self) -> Dict[Tuple[int, int], np.ndarray]:
+        cells_lat = np.floor(self.lat / GRID_CELL_DEG).astype(np.int64)
+        cells_lng = np.floor(self.lng / GRID_CELL_DEG).astype(np.int64)
+        grid: Dict[Tuple[int, int], List[int]] = {}
+        for idx, key in enumerate(zip(cells_lat.tolist(), cells_lng.tolist())):
+            grid.setdefault(key, []).append(idx)
+        return {key: np.asarray(nodes, dtype=np.int64) for key, nodes in grid.items()}
+
+    def nearest_node(self, lat: float, lng: float, *, max_rings: int = 5) -> int:
+        """Return the graph node closest to (lat, lng)."""
+        ci = math.floor(lat / GRID_CELL_DEG)
+        cj = math.floor(lng / GRID_CELL_DEG)
+        cos_lat = math.cos(math.radians(lat))
+
+        # Widen the search one ring past the first hit, since a node in the
+        # next ring can still be closer than one found in a corner cell
+        found_ring = None
+        candidates: List[np.ndarray] = []
+        for ring in range(max_rings + 1):
+            for di in range(-ring, ring + 1):
+                for dj in range(-ring, ring + 1):
+                    if max(abs(di), abs(dj)) == ring:
+                        nodes = self._grid.get((ci + di, cj + dj))
+                        if nodes is not None:
+                            candidates.append(nodes)
+            if candidates and found_ring is None:
+                found_ring = ring
+            if found_ring is not None and ring > found_ring:
+                break
+
+        nodes = np.concatenate(candidates) if candidates else np.arange(len(self.lat))
+        d2 = (self.lat[nodes] - lat) ** 2 + ((self.lng[nodes] - lng) * cos_lat) ** 2
+        return int(nodes[int(np.argmin(d2))])
+
+    def _heuristic(self, target: int):
+        # A landmark that cannot reach (or be reached from) the target gives
+        # no bound for this query. An infinite bound for a node v is still
+        # admissible: it means v cannot reach the target at all.
+        usable = np.isfinite(self.lm_from[:, target]) & np.isfinite(self.lm_to[:, target])
+        if not usable.any():
+            return lambda v: 0.0
+        lm_from = self.lm_from[usable]
+        lm_to = self.lm_to[usable]
+        lm_from_t = lm_from[:, target]
+        lm_to_t = lm_to[:, target]
+
+        def h(v: int) -> float:
+            bound = max(
+                float(np.max(lm_from_t - lm_from[:, v])),
+                float(np.max(lm_to[:, v] - lm_to_t)),
+            )
+            return bound if bound > 0 else 0.0
+
+        return h
+
+    def shortest_path(self, source: int, target: int) -> Optional[Tuple[float, float]]:
+        """
+        ALT A* search between two nodes.
+        Returns (minutes, km) of the fastest path, or None if unreachable.
+        """
+        if source == target:
+            return 0.0, 0.0
+
+        h = self._heuristic(target)
+        offsets, targets, weights, lengths = self._offsets, self._targets, self._minutes, self._km
+        dist = {source: 0.0}
+        km = {source: 0.0}
+        closed = set()
+        heap = [(h(source), source)]
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == target:
+                return dist[u], km[u]
+            closed.add(u)
+            du = dist[u]
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = du + weights[e]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    km[v] = km[u] + lengths[e]
+                    heapq.heappush(heap, (nd + h(v), v))
+        return None
+
+    def one_to_many(self, source: int, targets_: Sequence[int]) -> List[Optional[Tuple[float, float]]]:
+        """
+        Dijkstra from ``source`` that stops once every target is settled.
+        Returns (minutes, km) per target, None where unreachable.
+        """
+        remaining = set(targets_)
+        settled: Dict[int, Tuple[float, float]] = {}
+        offsets, targets, weights, lengths = self._offsets, self._targets, self._minutes, self._km
+        dist = {source: 0.0}
+        km = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if u in settled or d > dist[u]:
+                continue
+            settled[u] = (d, km[u])
+            remaining.discard(u)
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    km[v] = km[u] + lengths[e]
+                    heapq.heappush(heap, (nd, v))
+        return [settled.get(t) for t in targets_]
+
+    def route(self, lat1: float, lng1: float, lat2: float, lng2: float) -> Optional[Tuple[float, float]]:
+        """Fastest (minutes, km) between two coordinates, snapped to the graph."""
+        return self.shortest_path(self.nearest_node(lat1, lng1), self.nearest_node(lat2, lng2))
+
+    def matrix(
+        self, lats1: Sequence[float], lngs1: Sequence[float], lats2: Sequence[float], lngs2: Sequence[float]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Fastest minutes and km from every point of (lats1, lngs1) to every
+        point of (lats2, lngs2), NaN where unreachable. Each point is snapped
+        once and each distinct origin node runs one ``one_to_many`` search.
+        """
+        sources = [self.nearest_node(lat, lng) for lat, lng in zip(lats1, lngs1)]
+        targets = [self.nearest_node(lat, lng) for lat, lng in zip(lats2, lngs2)]
+        unique_targets = list(dict.fromkeys(targets))
+        position = {node: i for i, node in enumerate(unique_targets)}
+        columns = np.array([position[node] for node in targets], dtype=np.int64)
+
+        minutes = np.full((len(sources), len(targets)), np.nan)
+        km = np.full((len(sources), len(targets)), np.nan)
+        rows: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for i, source in enumerate(sources):
+            if source not in rows:
+                paths = self.one_to_many(source, unique_targets)
+                rows[source] = (
+                    np.array([math.nan if p is None else p[0] for p in paths]),
+                    np.array([math.nan if p is None else p[1] for p in paths]),
+                )
+            minutes[i] = rows[source][0][columns]
+            km[i] = rows[source][1][columns]
+        return minutes, km
+
+
+# ((path, mtime_ns, size) of the loaded file, graph)
+_road_graph: Optional[Tuple[Tuple[str, int, int], RoadGraph]] = None
+_road_graph_lock = threading.Lock()
+
+
+def get_road_graph() -> Optional[RoadGraph]:
+    """
+    Return the graph at ``settings.ROAD_GRAPH_PATH`` for this process,
+    reloading it when the file changes; None if it is missing.
+    """
+    global _road_graph
+    path = Path(settings.ROAD_GRAPH_PATH)
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    loaded = _road_graph
+    if loaded is None or loaded[0] != key:
+        with _road_graph_lock:
+            loaded = _road_graph
+            if loaded is None or loaded[0] != key:
+                loaded = _road_graph = (key, RoadGraph.load(path))
+    return loaded[1]
@@ -0,0 +1,162 @@
+"""
+Server-side road routing proxy.
+
+An itinerary route is split into legs between consecutive stops. Leg
+geometries are cached in the ``RouteLeg`` table under their snapped
+endpoints, so a leg is fetched from the upstream directions service once and
+then reused by every user until it is ``ROUTING_LEG_MAX_AGE_DAYS`` old.
+Missing legs are fetched concurrently, and a leg that fails falls back to a
+straight line instead of dropping the whole route; the failure is
+remembered in the cache for ``ROUTING_FAILED_LEG_SECONDS``, so retries
+don't hit the upstream again.
+
+Each client IP may make ``ROUTING_RATE_LIMIT`` route requests per
+``ROUTING_RATE_WINDOW`` seconds. Rate counters and failed legs live in the
+default cache, so they are per process unless a shared cache (``REDIS_URL``) is
+configured.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import RouteLeg
+
+FAILED_LEG_PREFIX = "route-leg-failed:"
+RATE_PREFIX = "route-rate:"
+
+LatLng = Tuple[float, float]
+
+
+def snap(point: LatLng) -> LatLng:
+    """Round a coordinate so nearby requests share a cache entry."""
+    decimals = settings.ROUTING_SNAP_DECIMALS
+    return round(point[0], decimals), round(point[1], decimals)
+
+
+def leg_key(start: LatLng, end: LatLng) -> str:
+    """Cache key for the leg between two snapped endpoints."""
+    decimals = settings.ROUTING_SNAP_DECIMALS
+    return f"{start[0]:.{decimals}f},{start[1]:.{decimals}f}|{end[0]:.{decimals}f},{end[1]:.{decimals}f}"
+
+
+def allow_request(client: str) -> bool:
+    """Count a route request from ``client``; False once it is over the rate limit."""
+    key = f"{RATE_PREFIX}{client}"
+    cache.add(key, 0, timeout=settings.ROUTING_RATE_WINDOW)
+    try:
+        count = cache.incr(key)
+    except ValueError:  # Expired between add and incr
+        cache.set(key, 1, timeout=settings.ROUTING_RATE_WINDOW)
+        count = 1
+    return count <= settings.ROUTING_RATE_LIMIT
+
+
+def fetch_leg(start: LatLng, end: LatLng) -> Optional[List[List[float]]]:
+    """
+    Fetch one leg from the upstream directions service.
+    Returns a list of [lat, lng] points, or None if the upstream failed.
+    """
+    headers = {"Content-Type": "application/json"}
+    if settings.ROUTING_API_KEY:
+        headers["Authorization"] = settings.ROUTING_API_KEY
+
+    body = {"coordinates": [[start[1], start[0]], [end[1], end[0]]]}
+    try:
+        response = requests.post(
+            settings.ROUTING_UPSTREAM_URL,
+            json=body,
+            headers=headers,
+            timeout=settings.ROUTING_TIMEOUT,
+        )
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+
+    try:
+        features = response.json().get("features") or []
+        coordinates = features[0]["geometry"]["coordinates"]
+    except (ValueError, AttributeError, LookupError, TypeError):
+        return None
+    if not coordinates:
+        return None
+
+    # GeoJSON is [lng, lat]; Leaflet wants [lat, lng]
+    return [[c[1], c[0]] for c in coordinates]
+
+
+def build_route(points: Sequence[LatLng]) -> dict:
+    """
+    Build a road route through ``points`` in order.
+
+    Returns the stitched ``coordinates`` plus per-leg ``legs`` info, where
+    each leg reports whether it came from the cache and whether the road
+    geometry was found (``ok``); failed legs are drawn as straight lines.
+    """
+    snapped = [snap(p) for p in points]
+    legs = list(zip(snapped, snapped[1:]))
+    keys = [leg_key(a, b) for a, b in legs]
+
+    fresh_after = timezone.now() - timedelta(days=settings.ROUTING_LEG_MAX_AGE_DAYS)
+    cached: Dict[str, list] = dict(
+        RouteLeg.objects.filter(key__in=set(keys), created_at__gte=fresh_after).values_list("key", "geometry")
+    )
+
+    missing = {}
+    for key, leg in zip(keys, legs):
+        if key not in cached and key not in missing:
+            missing[key] = leg
+    recently_failed = cache.get_many([FAILED_LEG_PREFIX + key for key in missing])
+    for key in recently_failed:
+        del missing[key[len(FAILED_LEG_PREFIX):]]
+
+    fetched: Dict[str, Optional[list]] = {}
+    if missing:
+        workers = min(settings.ROUTING_MAX_WORKERS, len(missing))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda leg: fetch_leg(*leg), missing.values())
+            fetched = dict(zip(missing.keys(), results))
+
+        # Replaces expired rows of the same legs
+        RouteLeg.objects.bulk_create(
+            [RouteLeg(key=key, geometry=geometry) for key, geometry in fetched.items() if geometry],
+            update_conflicts=True,
+            unique_fields=["key"],
+            update_fields=["geometry", "created_at"],
+        )
+        cache.set_many(
+            {FAILED_LEG_PREFIX + key: True for key, geometry in fetched.items() if not geometry},
+            timeout=settings.ROUTING_FAILED_LEG_SECONDS,
+        )
+
+    coordinates: List[List[float]] = []
+    leg_info = []
+    for key, (start, end), original_start, original_end in zip(keys, legs, points, points[1:]):
+        geometry = cached.get(key) or fetched.get(key)
+        ok = bool(geometry)
+        if not ok:
+            geometry = [list(original_start), list(original_end)]
+
+        segment = list(geometry)
+        if coordinates:
+            segment = segment[1:]  # Avoid duplicating the joint point
+        coordinates.extend(segment)
+        leg_info.append({"cached": key in cached, "ok": ok})
+
+    return {
+        "coordinates": coordinates,
+        "legs": leg_info,
+        "complete": all(leg["ok"] for leg in leg_info),
+    }
+
+
+def prune_route_legs(before: datetime) -> int:
+    """Delete cached legs fetched before ``before``. Returns how many were removed."""
+    removed, _ = RouteLeg.objects.filter(created_at__lt=before).delete()
+    return removed
@@ -0,0 +1,132 @@
+"""
+Projection-based serialization for Place payloads.
+
+A ``PlaceSpec`` lists the output keys of a payload and the Place column each
+one comes from. It is compiled once into a plain function that turns a row
+tuple into the output dict, so serializing a row is one call with no
+attribute lookups, model instances or per-field branching. The same specs
+drive every endpoint that returns places.
+
+Responses are encoded with orjson when it is installed, falling back to the
+stdlib encoder.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.http import HttpResponse
+
+from .neighbourhoods import neighbourhood_name
+
+try:  # Optional fast JSON backend
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+    import json
+
+# (output key, Place column, converter or None); dotted keys nest, so
+# "coords.lat" becomes {"coords": {"lat": ...}}
+FieldSpec = Tuple[str, str, Optional[Callable]]
+
+
+def _tuple_to_list(value) -> list:
+    return list(value) if value else []
+
+
+class PlaceSpec:
+    def __init__(self, fields: Sequence[FieldSpec]):
+        self.fields = tuple(fields)
+        self.columns = tuple(dict.fromkeys(column for _, column, _ in self.fields))
+        self._compiled: Dict[Tuple[str, ...], Callable] = {}
+
+    def compile(self, row_columns: Sequence[str] = None) -> Callable[[tuple], dict]:
+        """
+        Return a function mapping a row tuple with ``row_columns`` (default:
+        ``self.columns``) to the output dict. Compiled functions are cached.
+        """
+        row_columns = tuple(row_columns or self.columns)
+        fn = self._compiled.get(row_columns)
+        if fn is None:
+            fn = self._compiled[row_columns] = self._build(row_columns)
+        return fn
+
+    def _build(self, row_columns: Tuple[str, ...]) -> Callable[[tuple], dict]:
+        index = {column: i for i, column in enumerate(row_columns)}
+        namespace = {}
+        tree: Dict[str, object] = {}
+        for key, column, converter in self.fields:
+            expr = f"r[{index[column]}]"
+            if converter is not None:
+                name = f"_c{len(namespace)}"
+                namespace[name] = converter
+                expr = f"{name}({expr})"
+            node = tree
+            *parents, leaf = key.split(".")
+            for parent in parents:
+                node = node.setdefault(parent, {})
+            node[leaf] = expr
+
+        def render(node) -> str:
+            return "{" + ", ".join(
+                f"{k!r}: {render(v) if isinstance(v, dict) else v}" for k, v in node.items()
+            ) + "}"
+
+        source = f"def serialize(r):\n    return {render(tree)}\n"
+        exec(compile(source, "<PlaceSpec>", "exec"), namespace)
+        return namespace["serialize"]
+
+    def queryset(self, qs):
+        """Project a Place queryset to just this spec's columns."""
+        return qs.values_list(*self.columns)
+
+    def serialize(self, rows: Iterable[tuple], row_columns: Sequence[str] = None) -> List[dict]:
+        fn = self.compile(row_columns)
+        return [fn(r) for r in rows]
+
+
+# Full place payload, as consumed by the frontend planner
+PLACE_API_SPEC = PlaceSpec(
+    [
+        ("id", "slug", None),
+        ("name", "name", None),
+        ("category", "category", None),
+        ("neighbourhood", "neighbourhood", neighbourhood_name),
+        ("coords.lat", "lat", None),
+        ("coords.lng", "lng", None),
+        ("entryFee", "entry_fee", None),
+        ("avgFood", "avg_food", None),
+        ("durationMin", "duration_min", None),
+        ("rating", "rating", float),
+        ("priceTier", "price_tier", None),
+        ("tags", "tags", _tuple_to_list),
+        ("vibes", "vibes", _tuple_to_list),
+        ("popularity", "popularity", float),
+    ]
+)
+
+# Minimal payload for map markers
+PLACE_MARKER_SPEC = PlaceSpec(
+    [
+        ("id", "slug", None),
+        ("name", "name", None),
+        ("category", "category", None),
+        ("coords.lat", "lat", None),
+        ("coords.lng", "lng", None),
+    ]
+)
+
+
+def dumps(data) -> bytes:
+    """Encode ``data`` as compact JSON bytes with the fastest available backend."""
+    if orjson is not None:
+        # Cluster centroids are np.float64; the stdlib encodes them as a float
+        # subclass, but orjson rejects them without this option
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class FastJsonResponse(HttpResponse):
+    """JsonResponse equivalent that encodes with ``dumps``."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
@@ -0,0 +1,40 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .dataset import dataset_changed, dataset_writes_batched
+from .delta import record_place_deleted, record_place_saved
+from .events import get_broker
+from .models import Place
+from .neighbourhoods import place_key
+
+
+@receiver(pre_save, sender=Place)
+def remember_previous_place(sender, instance, raw=False, **kwargs):
+    instance._previous_key = None
+    # Not skipped for new instances: Place(slug=<existing>).save() updates that row
+    if raw or dataset_writes_batched():
+        return
+    previous = Place.objects.filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._previous_key = place_key(previous)
+
+
+@receiver(post_save, sender=Place)
+def place_saved(sender, instance, raw=False, **kwargs):
+    if raw or dataset_writes_batched():
+        return
+    instance.updated_seq = record_place_saved(
+        instance.pk, getattr(instance, "_previous_key", None), place_key(instance)
+    )
+
+
+@receiver(post_delete, sender=Place)
+def place_deleted(sender, instance, **kwargs):
+    if dataset_writes_batched():
+        return
+    record_place_deleted(instance.pk, place_key(instance))
+
+
+@receiver(dataset_changed)
+def publish_dataset_change(sender, version, **kwargs):
+    get_broker().publish(version)
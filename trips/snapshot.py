@@ -0,0 +1,123 @@
+"""
+Per-process, read-only snapshots of the Place table, one per region.
+
+A region's snapshot is loaded lazily with a single ``values_list`` query
+and shared by every view in the worker. Each access compares its version with the
+``DatasetVersion`` row (one primary-key lookup), so a write from any worker
+or loader command is picked up by the next request. A snapshot is never
+replaced by an older version, so a lagging read replica can't make workers
+flip back and forth between versions.
+
+A snapshot prebuilt elsewhere (``warm_start``) can be offered with
+``preload_place_snapshot``; the first load of its region uses it instead of
+querying, if it is for the current version.
+"""
+
+import threading
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+from .dataset import aget_dataset_version, get_dataset_version
+from .models import Place
+
+PLACE_COLUMNS = (
+    "slug",
+    "name",
+    "category",
+    "neighbourhood",
+    "lat",
+    "lng",
+    "entry_fee",
+    "avg_food",
+    "duration_min",
+    "rating",
+    "price_tier",
+    "tags",
+    "vibes",
+    "popularity",
+)
+
+PlaceRow = namedtuple("PlaceRow", PLACE_COLUMNS)
+
+_RATING = PLACE_COLUMNS.index("rating")
+_POPULARITY = PLACE_COLUMNS.index("popularity")
+_TAGS = PLACE_COLUMNS.index("tags")
+_VIBES = PLACE_COLUMNS.index("vibes")
+
+
+def _row(values: tuple) -> PlaceRow:
+    values = list(values)
+    values[_RATING] = float(values[_RATING])
+    values[_POPULARITY] = float(values[_POPULARITY])
+    values[_TAGS] = tuple(values[_TAGS] or ())
+    values[_VIBES] = tuple(values[_VIBES] or ())
+    return PlaceRow._make(values)
+
+
+class PlaceSnapshot:
+    def __init__(self, version: int, rows: Tuple[PlaceRow, ...], region: str):
+        self.version = version
+        self.region = region
+        self.rows = rows
+        self.by_slug: Dict[str, PlaceRow] = {row.slug: row for row in rows}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @staticmethod
+    def _queryset(region: str):
+        return Place.objects.filter(region=region).order_by("name", "slug").values_list(*PLACE_COLUMNS)
+
+    @classmethod
+    def load(cls, version: int, region: str) -> "PlaceSnapshot":
+        return cls(version, tuple(_row(values) for values in cls._queryset(region)), region)
+
+    @classmethod
+    async def aload(cls, version: int, region: str) -> "PlaceSnapshot":
+        return cls(version, tuple([_row(values) async for values in cls._queryset(region)]), region)
+
+
+_snapshots: Dict[str, PlaceSnapshot] = {}
+_snapshot_lock = threading.Lock()
+_preloaded: Dict[str, PlaceSnapshot] = {}
+
+
+def preload_place_snapshot(snapshot: PlaceSnapshot) -> None:
+    _preloaded[snapshot.region] = snapshot
+
+
+def _take_preloaded(region: str, version: int) -> Optional[PlaceSnapshot]:
+    snapshot = _preloaded.pop(region, None)
+    return snapshot if snapshot is not None and snapshot.version == version else None
+
+
+def get_place_snapshot(region: str) -> PlaceSnapshot:
+    """Return the current snapshot of ``region``, reloading it if the dataset version moved."""
+    version = get_dataset_version()
+    snapshot = _snapshots.get(region)
+    if snapshot is None or snapshot.version < version:
+        with _snapshot_lock:
+            snapshot = _snapshots.get(region)
+            if snapshot is None or snapshot.version < version:
+                snapshot = _take_preloaded(region, version)
+                if snapshot is None:  # Not "or": an empty snapshot is falsy
+                    snapshot = PlaceSnapshot.load(version, region)
+                _snapshots[region] = snapshot
+    return snapshot
+
+
+async def aget_place_snapshot(region: str) -> PlaceSnapshot:
+    """
+    Async variant of ``get_place_snapshot``. It doesn't take the thread lock,
+    so two coroutines may both reload; the later one simply wins.
+    """
+    version = await aget_dataset_version()
+    snapshot = _snapshots.get(region)
+    if snapshot is None or snapshot.version < version:
+        snapshot = _take_preloaded(region, version)
+        if snapshot is None:
+            snapshot = await PlaceSnapshot.aload(version, region)
+        current = _snapshots.get(region)
+        if current is None or current.version < snapshot.version:
+            _snapshots[region] = snapshot
+    return snapshot
@@ -0,0 +1,197 @@
+"""
+Static 2-D KD-tree over point arrays.
+
+The tree is implicit: points are reordered in place so that each node's
+median splits its range, like KDBush. Building is a series of
+``argpartition`` calls and queries walk the ranges with an explicit stack,
+scanning leaves with vectorised NumPy comparisons.
+
+``around`` finds the nearest points of a tree built over longitudes and
+latitudes by great-circle distance, like geokdbush: a best-first search
+where each node's priority is a lower bound of the distance to its bounding
+box, so only the nodes that can hold one of the k nearest are opened.
+"""
+
+import heapq
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+LEAF_SIZE = 64
+EARTH_RADIUS_KM = 6371.0
+
+
+class KDTree:
+    def __init__(self, xs: np.ndarray, ys: np.ndarray, *, leaf_size: int = LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.ids = np.arange(len(xs), dtype=np.int64)
+        self.xs = np.asarray(xs, dtype=np.float64).copy()
+        self.ys = np.asarray(ys, dtype=np.float64).copy()
+        self._sort(0, len(self.ids) - 1, 0)
+
+    @classmethod
+    def from_arrays(cls, ids: np.ndarray, xs: np.ndarray, ys: np.ndarray, *, leaf_size: int = LEAF_SIZE) -> "KDTree":
+        """
+        A tree from the ``ids``, ``xs`` and ``ys`` of one built earlier with
+        the same ``leaf_size``, without sorting or copying them (so they may
+        be read-only views of a mapped file).
+        """
+        tree = cls.__new__(cls)
+        tree.leaf_size, tree.ids, tree.xs, tree.ys = leaf_size, ids, xs, ys
+        return tree
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _sort(self, left: int, right: int, axis: int) -> None:
+        stack = [(left, right, axis)]
+        while stack:
+            left, right, axis = stack.pop()
+            if right - left <= self.leaf_size:
+                continue
+            m = (left + right) >> 1
+            keys = self.xs if axis == 0 else self.ys
+            order = np.argpartition(keys[left:right + 1], m - left) + left
+            self.ids[left:right + 1] = self.ids[order]
+            self.xs[left:right + 1] = self.xs[order]
+            self.ys[left:right + 1] = self.ys[order]
+            stack.append((left, m - 1, 1 - axis))
+            stack.append((m + 1, right, 1 - axis))
+
+    def range(self, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+        """Original indices of points inside the box (inclusive)."""
+        found: List[np.ndarray] = []
+        stack = [(0, len(self.ids) - 1, 0)]
+        xs, ys = self.xs, self.ys
+        while stack:
+            left, right, axis = stack.pop()
+            if right < left:
+                continue
+            if right - left <= self.leaf_size:
+                x = xs[left:right + 1]
+                y = ys[left:right + 1]
+                mask = (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+                found.append(self.ids[left:right + 1][mask])
+                continue
+
+            m = (left + right) >> 1
+            x, y = xs[m], ys[m]
+            if min_x <= x <= max_x and min_y <= y <= max_y:
+                found.append(self.ids[m:m + 1])
+
+            if (min_x if axis == 0 else min_y) <= (x if axis == 0 else y):
+                stack.append((left, m - 1, 1 - axis))
+            if (max_x if axis == 0 else max_y) >= (x if axis == 0 else y):
+                stack.append((m + 1, right, 1 - axis))
+
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def within(self, qx: float, qy: float, radius: float) -> np.ndarray:
+        """Original indices of points within Euclidean ``radius`` of (qx, qy)."""
+        candidates = self.range(qx - radius, qy - radius, qx + radius, qy + radius)
+        if not len(candidates):
+            return candidates
+        # ids are a permutation, so invert it once to read coordinates back
+        pos = self._positions()[candidates]
+        d2 = (self.xs[pos] - qx) ** 2 + (self.ys[pos] - qy) ** 2
+        return candidates[d2 <= radius * radius]
+
+    def _positions(self) -> np.ndarray:
+        positions = getattr(self, "_pos", None)
+        if positions is None:
+            positions = np.empty_like(self.ids)
+            positions[self.ids] = np.arange(len(self.ids))
+            self._pos = positions
+        return positions
+
+
+def _haversin(theta):
+    s = np.sin(theta / 2)
+    return s * s
+
+
+def _haversin_partial(haversin_d_lng, cos_lat1, lat1, lat2):
+    """Haversine of the central angle, from the haversine of the longitude difference."""
+    return cos_lat1 * np.cos(np.radians(lat2)) * haversin_d_lng + _haversin(np.radians(lat1 - lat2))
+
+
+def _box_haversin(lng, lat, cos_lat, min_lng, min_lat, max_lng, max_lat) -> float:
+    """Lower bound of the haversine from (lng, lat) to any point of the box."""
+    if min_lng <= lng <= max_lng:
+        if lat < min_lat:
+            return _haversin(math.radians(lat - min_lat))
+        if lat > max_lat:
+            return _haversin(math.radians(lat - max_lat))
+        return 0.0
+
+    # West or east of the box: the closest point is on its nearest meridian,
+    # at the latitude where the great circle to that meridian peaks
+    haversin_d_lng = min(_haversin(math.radians(lng - min_lng)), _haversin(math.radians(lng - max_lng)))
+    cos_d_lng = 1 - 2 * haversin_d_lng
+    if cos_d_lng <= 0:
+        vertex_lat = 90.0 if lat > 0 else -90.0
+    else:
+        vertex_lat = math.degrees(math.atan(math.tan(math.radians(lat)) / cos_d_lng))
+    if min_lat < vertex_lat < max_lat:
+        return _haversin_partial(haversin_d_lng, cos_lat, lat, vertex_lat)
+    return min(
+        _haversin_partial(haversin_d_lng, cos_lat, lat, min_lat),
+        _haversin_partial(haversin_d_lng, cos_lat, lat, max_lat),
+    )
+
+
+def haversine_to_km(h):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def around(tree: KDTree, lng: float, lat: float, k: int, max_km: float = math.inf) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Original indices of the ``k`` points of ``tree`` (xs longitudes, ys
+    latitudes) closest to (lng, lat), nearest first, and their great-circle
+    distances in km. Points further than ``max_km`` are left out.
+    """
+    found: List[Tuple[float, int]] = []
+    max_h = 1.0 if max_km >= math.pi * EARTH_RADIUS_KM else float(_haversin(max_km / EARTH_RADIUS_KM))
+    cos_lat = math.cos(math.radians(lat))
+    xs, ys, ids = tree.xs, tree.ys, tree.ids
+
+    # Entries are (haversine, kind, sequence, payload). Kind 0 is a point,
+    # which pops before a node with the same bound; kind 1 is a node
+    # (left, right, axis, box). The sequence keeps payloads from being compared
+    queue = [(0.0, 1, 0, (0, len(tree) - 1, 0, (-180.0, -90.0, 180.0, 90.0)))]
+    sequence = 1
+    while queue and len(found) < k:
+        h, kind, _, payload = heapq.heappop(queue)
+        if h > max_h:
+            break
+        if kind == 0:
+            found.append((h, payload))
+            continue
+
+        left, right, axis, (min_lng, min_lat, max_lng, max_lat) = payload
+        if right - left <= tree.leaf_size:
+            y = ys[left:right + 1]
+            hs = _haversin_partial(_haversin(np.radians(lng - xs[left:right + 1])), cos_lat, lat, y)
+            for i in np.flatnonzero(hs <= max_h).tolist():
+                heapq.heappush(queue, (float(hs[i]), 0, sequence, int(ids[left + i])))
+                sequence += 1
+            continue
+
+        m = (left + right) >> 1
+        x, y = float(xs[m]), float(ys[m])
+        h = float(_haversin_partial(_haversin(math.radians(lng - x)), cos_lat, lat, y))
+        if h <= max_h:
+            heapq.heappush(queue, (h, 0, sequence, int(ids[m])))
+        if axis == 0:
+            boxes = ((min_lng, min_lat, x, max_lat), (x, min_lat, max_lng, max_lat))
+        else:
+            boxes = ((min_lng, min_lat, max_lng, y), (min_lng, y, max_lng, max_lat))
+        for lo, hi, box in ((left, m - 1, boxes[0]), (m + 1, right, boxes[1])):
+            if hi >= lo:
+                bound = float(_box_haversin(lng, lat, cos_lat, *box))
+                heapq.heappush(queue, (bound, 1, sequence + 1, (lo, hi, 1 - axis, box)))
+        sequence += 2
+
+    indices = np.array([i for _, i in found], dtype=np.int64)
+    return indices, haversine_to_km(np.array([h for h, _ in found], dtype=np.float64))
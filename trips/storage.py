@@ -0,0 +1,101 @@
+"""
+Static files storage that fingerprints and precompresses assets.
+
+``collectstatic`` copies every file to ``STATIC_ROOT`` under a content
+hashed name (``app.js`` -> ``app.3f2a9c1b7d4e.js``, via Django's manifest
+storage) and then writes ``.gz`` and, when the optional ``brotli`` package
+is installed, ``.br`` variants of each text asset next to it.
+``PrecompressedStaticMiddleware`` serves those files, so compression costs
+nothing per request and hashed names can be cached forever.
+"""
+
+import gzip
+import os
+from typing import Iterable, Iterator, Tuple
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip variants are still written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".mjs", ".json", ".map", ".svg", ".html", ".txt", ".xml", ".wasm", ".ico",
+}
+MIN_COMPRESS_SIZE = 256  # Bytes; smaller files aren't worth an extra file
+MAX_COMPRESSED_RATIO = 0.95  # Variants that save less than 5% are dropped
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _compress(data: bytes) -> Iterator[Tuple[str, bytes]]:
+    if brotli is not None:
+        yield ".br", brotli.compress(data, quality=11)
+    yield ".gz", gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress_file(path: str) -> int:
+    """
+    Write the compressed variants of ``path`` that are missing or older
+    than it. Returns the number of variants written.
+    """
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return 0
+    source_mtime = os.stat(path).st_mtime
+    suffixes = [suffix for _, suffix in ENCODINGS if brotli is not None or suffix != ".br"]
+    if all(os.path.exists(path + s) and os.stat(path + s).st_mtime >= source_mtime for s in suffixes):
+        return 0
+
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return 0
+
+    written = 0
+    for suffix, compressed in _compress(data):
+        target = path + suffix
+        if len(compressed) > len(data) * MAX_COMPRESSED_RATIO:
+            if os.path.exists(target):
+                os.remove(target)  # Left over from an older, more compressible version
+            continue
+        tmp = f"{target}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(compressed)
+        os.replace(tmp, target)
+        written += 1
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ``ManifestStaticFilesStorage`` that also writes precompressed variants.
+
+    ``manifest_strict`` is off, so a template referencing a file that
+    collectstatic didn't find falls back to the unhashed URL instead of
+    failing the whole page.
+    """
+
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = []
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.append(name)
+            yield name, hashed_name, processed
+
+        if not dry_run:
+            self.compress(self._collected_names(names))
+
+    def _collected_names(self, names: Iterable[str]) -> Iterator[str]:
+        for name in names:
+            yield name
+            hashed_name = self.hashed_files.get(self.hash_key(self.clean_name(name)))
+            if hashed_name and hashed_name != name:
+                yield hashed_name
+
+    def compress(self, names: Iterable[str]) -> int:
+        """Write compressed variants of the stored files ``names``. Returns how many were written."""
+        return sum(compress_file(self.path(name)) for name in names)
@@ -0,0 +1,168 @@
+"""
+Synthetic places for scale testing, sampled with NumPy.
+
+A region gets ``neighbourhoods`` centers scattered around its center, with
+Zipf-like weights so a few neighbourhoods hold most places, as in a real
+city. Each place falls near its neighbourhood's center with a per-
+neighbourhood spread. Categories, price tiers, tags and vibes follow skewed
+frequencies (tags and vibes also depend on the category), and fees,
+durations, ratings and popularity follow the category and price tier.
+
+Places are produced in chunks of ``CHUNK_SIZE`` rows, each from its own
+seed derived from ``seed``, so the output depends only on the arguments and
+a region of any size streams in constant memory.
+"""
+
+from typing import Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+CHUNK_SIZE = 100_000
+
+CATEGORIES = ("Restaurant", "Café", "Attraction", "Market", "Park", "Mall")
+CATEGORY_WEIGHTS = (0.34, 0.2, 0.16, 0.1, 0.11, 0.09)
+
+PRICE_TIERS = ("Free", "Budget", "Mid", "Premium")
+# Rows follow CATEGORIES
+PRICE_TIER_WEIGHTS = np.array([
+    (0.0, 0.35, 0.45, 0.2),
+    (0.0, 0.4, 0.45, 0.15),
+    (0.25, 0.35, 0.3, 0.1),
+    (0.3, 0.55, 0.15, 0.0),
+    (0.6, 0.35, 0.05, 0.0),
+    (0.5, 0.2, 0.2, 0.1),
+])
+# Typical (entry fee, food spend) in KSH per price tier; samples are lognormal around them
+TIER_COSTS = np.array([(0, 150), (100, 350), (400, 800), (1500, 2000)], dtype=np.float64)
+CATEGORY_DURATIONS = np.array([75, 45, 120, 60, 120, 90], dtype=np.float64)  # Mean minutes
+
+TAGS = (
+    "food", "local", "family", "outdoor", "nature", "shopping", "views",
+    "indoor", "history", "art", "nightlife", "wildlife",
+)
+TAG_RATES = np.array([0.45, 0.4, 0.3, 0.28, 0.22, 0.18, 0.15, 0.14, 0.1, 0.08, 0.05, 0.03])
+VIBES = ("local", "chill", "authentic", "scenic", "energetic", "quiet", "adventurous", "romantic")
+VIBE_RATES = np.array([0.45, 0.4, 0.3, 0.22, 0.15, 0.12, 0.08, 0.04])
+# Tags and vibes twice as likely in a category (capped at 0.8)
+CATEGORY_AFFINITY = {
+    "Restaurant": {"food", "local", "family", "authentic", "romantic"},
+    "Café": {"food", "indoor", "chill", "quiet"},
+    "Attraction": {"history", "art", "views", "family", "scenic"},
+    "Market": {"shopping", "local", "food", "authentic", "energetic"},
+    "Park": {"nature", "outdoor", "wildlife", "views", "scenic", "adventurous", "chill"},
+    "Mall": {"shopping", "indoor", "family", "food", "energetic"},
+}
+
+
+class Neighbourhood(NamedTuple):
+    name: str
+    lat: float
+    lng: float
+    spread: float  # Degrees; standard deviation of its places around the center
+    weight: float
+
+
+def make_neighbourhoods(
+    label: str, count: int, center_lat: float, center_lng: float, seed: int, radius: float = 0.12
+) -> List[Neighbourhood]:
+    """``count`` neighbourhoods around a center, weighted by a Zipf-like law."""
+    rng = np.random.default_rng([seed, 0])
+    lats = center_lat + rng.normal(0, radius / 2, count)
+    lngs = center_lng + rng.normal(0, radius / 2, count)
+    spreads = rng.lognormal(np.log(0.006), 0.4, count)
+    weights = 1 / np.arange(1, count + 1) ** 1.1
+    weights = rng.permutation(weights / weights.sum())
+    return [
+        Neighbourhood(f"{label} Area {i + 1}", float(lat), float(lng), float(spread), float(weight))
+        for i, (lat, lng, spread, weight) in enumerate(zip(lats, lngs, spreads, weights))
+    ]
+
+
+def _rates(base_rates: np.ndarray, names: Tuple[str, ...]) -> np.ndarray:
+    """Rates of ``names`` per category: rows follow CATEGORIES."""
+    rates = np.tile(base_rates, (len(CATEGORIES), 1))
+    for c, category in enumerate(CATEGORIES):
+        boosted = [i for i, name in enumerate(names) if name in CATEGORY_AFFINITY[category]]
+        rates[c, boosted] = np.minimum(0.8, rates[c, boosted] * 2)
+    return rates
+
+
+def _subsets(rng, categories: np.ndarray, rates: np.ndarray, names: Tuple[str, ...]) -> List[tuple]:
+    """Per place, the names drawn with its category's rates; at least one each."""
+    chosen = rng.random((len(categories), len(names))) < rates[categories]
+    empty = ~chosen.any(axis=1)
+    # Give empty rows their category's most likely name
+    chosen[empty, rates[categories[empty]].argmax(axis=1)] = True
+    masks = chosen @ (1 << np.arange(len(names)))
+    lookup = {}
+    for mask in np.unique(masks).tolist():
+        lookup[mask] = tuple(name for i, name in enumerate(names) if mask >> i & 1)
+    return [lookup[mask] for mask in masks.tolist()]
+
+
+def generate_chunk(region: str, neighbourhoods: List[Neighbourhood], start: int, count: int, seed: int) -> List[tuple]:
+    """
+    Places ``start`` to ``start + count`` of ``region`` as tuples of
+    ``place_files.PLACE_FILE_FIELDS``.
+    """
+    rng = np.random.default_rng([seed, 1, start])
+    weights = np.array([n.weight for n in neighbourhoods])
+    home = rng.choice(len(neighbourhoods), size=count, p=weights)
+    centers = np.array([(n.lat, n.lng, n.spread) for n in neighbourhoods])[home]
+    lats = np.round(centers[:, 0] + rng.normal(0, 1, count) * centers[:, 2], 6)
+    lngs = np.round(centers[:, 1] + rng.normal(0, 1, count) * centers[:, 2], 6)
+
+    categories = rng.choice(len(CATEGORIES), size=count, p=CATEGORY_WEIGHTS)
+    # Inverse-CDF sampling of each place's price tier from its category's row
+    cdf = PRICE_TIER_WEIGHTS.cumsum(axis=1)[categories]
+    tiers = np.minimum((rng.random((count, 1)) > cdf).sum(axis=1), len(PRICE_TIERS) - 1)
+
+    costs = TIER_COSTS[tiers] * rng.lognormal(0, 0.35, (count, 2))
+    entry_fees = (np.round(costs[:, 0] / 50) * 50).astype(np.int64)
+    avg_food = (np.round(costs[:, 1] / 50) * 50).astype(np.int64)
+    durations = np.clip(
+        np.round(CATEGORY_DURATIONS[categories] * rng.lognormal(0, 0.3, count) / 15) * 15, 15, 300
+    ).astype(np.int64)
+
+    ratings = np.round(3.0 + 2.0 * rng.beta(5, 2, count), 1)
+    # Busy neighbourhoods and well-rated places are more popular
+    share = weights[home] / weights.max()
+    popularity = np.round(
+        np.clip(0.3 + 0.35 * np.sqrt(share) + 0.15 * (ratings - 3.0) / 2 + rng.normal(0, 0.08, count), 0.05, 0.99), 2
+    )
+
+    tags = _subsets(rng, categories, _rates(TAG_RATES, TAGS), TAGS)
+    vibes = _subsets(rng, categories, _rates(VIBE_RATES, VIBES), VIBES)
+
+    names = [n.name for n in neighbourhoods]
+    return [
+        (
+            f"{region}-{start + i + 1}",
+            f"{names[h]} {CATEGORIES[c]} {start + i + 1}",
+            CATEGORIES[c],
+            names[h],
+            lat,
+            lng,
+            fee,
+            food,
+            duration,
+            rating,
+            PRICE_TIERS[t],
+            tag,
+            vibe,
+            pop,
+        )
+        for i, (h, c, lat, lng, fee, food, duration, rating, t, tag, vibe, pop) in enumerate(zip(
+            home.tolist(), categories.tolist(), lats.tolist(), lngs.tolist(), entry_fees.tolist(),
+            avg_food.tolist(), durations.tolist(), ratings.tolist(), tiers.tolist(), tags, vibes,
+            popularity.tolist(),
+        ))
+    ]
+
+
+def generate_places(
+    region: str, neighbourhoods: List[Neighbourhood], count: int, seed: int
+) -> Iterator[List[tuple]]:
+    """Chunks of ``count`` synthetic places of ``region`` (see ``generate_chunk``)."""
+    for start in range(0, count, CHUNK_SIZE):
+        yield generate_chunk(region, neighbourhoods, start, min(CHUNK_SIZE, count - start), seed)
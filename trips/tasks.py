@@ -0,0 +1,39 @@
+"""Handlers for the background job queue (see ``trips.jobs``)."""
+
+from pathlib import Path
+
+from django.conf import settings
+
+from .jobs import register
+from .models import Place
+from .travel_matrix import CURRENT_FILE, build_travel_matrix
+from .utils import get_neighbourhood
+from .warm_start import artifact_path, build_artifact
+
+
+@register("geocode_place")
+def geocode_place(slug: str) -> None:
+    """Replace a place's provisional neighbourhood with its reverse-geocoded one."""
+    place = Place.objects.filter(pk=slug).first()
+    if place is None:
+        return  # Deleted since the job was queued
+
+    neighbourhood = get_neighbourhood(place.lat, place.lng)
+    if neighbourhood == "Unknown":
+        raise RuntimeError(f"Reverse geocoding failed for ({place.lat}, {place.lng})")
+    if neighbourhood != place.neighbourhood:
+        # A regular save, so the aggregates, delta sync and live events follow
+        place.neighbourhood = neighbourhood
+        place.save(update_fields=["neighbourhood"])
+
+
+@register("refresh_region_artifacts")
+def refresh_region_artifacts(region: str) -> None:
+    """Rebuild the travel matrix and warm-start artifact of ``region``, where they were built before."""
+    matrix_dir = Path(settings.TRAVEL_MATRIX_DIR) / region
+    if (matrix_dir / CURRENT_FILE).exists():
+        rows = list(Place.objects.filter(region=region).order_by("slug").values_list("slug", "lat", "lng"))
+        if rows:
+            build_travel_matrix(rows, matrix_dir)
+    if artifact_path(region).exists():
+        build_artifact(region)
@@ -1,3 +1,1733 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+import requests
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import clustering, db_router, dedupe, jobs, ranking, road_graph, snapshot, storage, synthetic
+from .admin import _in_batches
+from .constraints import ConstraintIndex
+from .dataset import VERSION_ROW_ID, bump_dataset_version, get_dataset_version
+from .dedupe import Candidate, find_duplicates
+from .delta import get_changes, prune_tombstones
+from .events import LocalBroker
+from .geometry import METERS_PER_PIXEL_Z0, decode_polyline, encode_polyline, simplify, tolerance_for_zoom
+from .db_router import PIN_COOKIE, ReplicaHealth
+from .jobs import PermanentJobError, backoff_seconds, claim_job, enqueue, requeue_stale_jobs, run_job
+from .middleware import PrecompressedStaticMiddleware
+from .models import DatasetVersion, Job, NeighbourhoodStats, Place, PlaceTombstone, RouteLeg
+from .nearby import NearbyIndex
+from .plan_cache import PlanCache, normalize
+from .place_files import PLACE_FILE_FIELDS, read_places, write_places
+from .planner import build_plan
+from .ranking import RankingIndex, ScoreWeights
+from .road_graph import RoadGraph
+from .snapshot import PlaceRow
+from .storage import compress_file
+from .transport import build_transport_table
+from .travel_matrix import CURRENT_FILE, build_travel_matrix, get_travel_matrix, load_travel_matrix
+from .travel_model import get_travel_model
+from .warm_start import build_artifact, load_on_boot
+from .utils import calculate_transport, haversine_distance
+from .views import _event_stream
+
+# Two points about 3 km apart in Nairobi
+WESTLANDS = (-1.2676, 36.8108)
+CBD = (-1.2864, 36.8172)
+
+
+def make_place(slug, region, neighbourhood, lat, lng, **fields):
+    defaults = {
+        "name": slug.replace("-", " ").title(),
+        "category": "Park",
+        "entry_fee": 100,
+        "avg_food": 100,
+        "duration_min": 60,
+        "rating": "4.0",
+        "price_tier": "Budget",
+        "tags": ["outdoor"],
+        "vibes": ["chill"],
+        "popularity": "0.50",
+    }
+    defaults.update(fields)
+    return Place.objects.create(slug=slug, region=region, neighbourhood=neighbourhood, lat=lat, lng=lng, **defaults)
+
+
+def forget_region_caches(test, region):
+    """
+    Drop this process's snapshot and cluster index of ``region`` before and
+    after ``test``: its writes are rolled back, but a cached copy would stay
+    ahead of the version.
+    """
+    for caches in (snapshot._snapshots, clustering._indexes):
+        caches.pop(region, None)
+        test.addCleanup(caches.pop, region, None)
+
+
+class TemporaryDirectoryMixin:
+    def make_temporary_directory(self) -> Path:
+        path = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        return path
+
+
+class CalculateTransportTests(SimpleTestCase):
+    def test_straight_line_minutes_follow_the_pace(self):
+        km = haversine_distance(*WESTLANDS, *CBD)
+        mode, fare, minutes = calculate_transport(*WESTLANDS, *CBD)
+        self.assertEqual(mode, "Matatu")
+        self.assertAlmostEqual(minutes, km * 10, delta=1)
+
+    @override_settings(TRAVEL_MODEL="road_graph")
+    def test_road_graph_minutes_follow_the_path(self):
+        graph = mock.Mock()
+        graph.route.return_value = (42.0, 3.0)  # Driving minutes, km
+        with mock.patch("trips.road_graph.get_road_graph", return_value=graph):
+            self.assertEqual(calculate_transport(*WESTLANDS, *CBD), ("Matatu", 15, 42))
+            # Not the 30 minutes of 3 km at the flat pace; rush hour slows it down
+            self.assertEqual(calculate_transport(*WESTLANDS, *CBD, hour=17), ("Matatu", 15, 84))
+
+    def test_road_graph_without_a_path_falls_back_to_straight_line(self):
+        straight = calculate_transport(*WESTLANDS, *CBD)
+        graph = mock.Mock()
+        graph.route.return_value = None
+        with override_settings(TRAVEL_MODEL="road_graph"), mock.patch("trips.road_graph.get_road_graph", return_value=graph):
+            self.assertEqual(calculate_transport(*WESTLANDS, *CBD), straight)
+
+
+def grid_road_graph(size=12, step=0.005, origin=(-1.32, 36.78)):
+    """A two-way street grid with faster roads every fifth row and column."""
+    edges = []
+    for i in range(size):
+        for j in range(size):
+            lat, lng = origin[0] + i * step, origin[1] + j * step
+            if i < size - 1:
+                edges.append((lat, lng, lat + step, lng, 60 if j % 5 == 0 else 30, False))
+            if j < size - 1:
+                edges.append((lat, lng, lat, lng + step, 60 if i % 5 == 0 else 30, False))
+    return RoadGraph.from_edges(edges, landmark_count=4)
+
+
+class GetRoadGraphTests(TemporaryDirectoryMixin, SimpleTestCase):
+    def setUp(self):
+        self.path = self.make_temporary_directory() / "road_graph.npz"
+        settings = override_settings(ROAD_GRAPH_PATH=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        patcher = mock.patch.object(road_graph, "_road_graph", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_missing_file(self):
+        self.assertIsNone(road_graph.get_road_graph())
+
+    def test_reloads_when_the_file_changes(self):
+        grid_road_graph(size=4).save(self.path)
+        graph = road_graph.get_road_graph()
+        self.assertEqual(len(graph.lat), 16)
+        self.assertIs(road_graph.get_road_graph(), graph)
+
+        grid_road_graph(size=5).save(self.path)
+        self.assertEqual(len(road_graph.get_road_graph().lat), 25)
+        self.assertEqual([p.name for p in self.path.parent.iterdir()], ["road_graph.npz"])
+
+        self.path.unlink()
+        self.assertIsNone(road_graph.get_road_graph())
+
+
+@override_settings(TRAVEL_MODEL="road_graph")
+class RoadGraphTransportTableTests(SimpleTestCase):
+    def setUp(self):
+        self.graph = grid_road_graph()
+        self.centers = {
+            f"N{k}": {"lat": -1.32 + (k * 7 % 11) * 0.005 + 0.001, "lng": 36.78 + (k * 3 % 11) * 0.005}
+            for k in range(8)
+        }
+        patcher = mock.patch("trips.road_graph.get_road_graph", return_value=self.graph)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_matches_calculate_transport_per_pair(self):
+        table = build_transport_table(self.centers, hour=8)
+        self.assertEqual(len(table), 8 * 7)
+        for key, entry in table.items():
+            origin, dest = (self.centers[name] for name in key.split("|"))
+            expected = calculate_transport(origin["lat"], origin["lng"], dest["lat"], dest["lng"], 8)
+            self.assertEqual((entry["mode"], entry["fare"], entry["minutes"]), expected, key)
+
+    def test_one_search_per_center(self):
+        with mock.patch.object(self.graph, "one_to_many", wraps=self.graph.one_to_many) as one_to_many, \
+                mock.patch.object(self.graph, "shortest_path") as shortest_path:
+            build_transport_table(self.centers)
+        self.assertLessEqual(one_to_many.call_count, len(self.centers))
+        shortest_path.assert_not_called()
+
+
+class TravelMatrixTests(TemporaryDirectoryMixin, SimpleTestCase):
+    rows = [(f"p{i}", -1.30 + i * 0.004, 36.80 + (i % 4) * 0.006) for i in range(12)]
+
+    def test_lookup_matches_calculate_transport(self):
+        matrix = load_travel_matrix(build_travel_matrix(self.rows, self.make_temporary_directory()))
+        for slug1, lat1, lng1 in self.rows:
+            for slug2, lat2, lng2 in self.rows:
+                self.assertEqual(matrix.lookup(slug1, slug2), calculate_transport(lat1, lng1, lat2, lng2))
+        self.assertIsNone(matrix.lookup("p0", "missing"))
+
+    def test_lookup_at_an_hour_scales_the_minutes(self):
+        matrix = load_travel_matrix(build_travel_matrix(self.rows, self.make_temporary_directory()))
+        mode, fare, minutes = matrix.lookup("p0", "p11")
+        model = get_travel_model()
+        self.assertEqual(
+            matrix.lookup("p0", "p11", hour=17), (mode, fare, model.at_hour(minutes, model.mode_index[mode], 17))
+        )
+        self.assertGreater(matrix.lookup("p0", "p11", hour=17)[2], minutes)
+
+    def test_rebuilds_keep_the_current_and_previous_builds(self):
+        output_dir = self.make_temporary_directory()
+        versions = [build_travel_matrix(self.rows[:n], output_dir).name for n in (10, 11, 12)]
+        builds = sorted(path.name for path in output_dir.iterdir() if path.is_dir())
+        self.assertEqual(builds, sorted(versions[1:]))
+        self.assertEqual((output_dir / CURRENT_FILE).read_text(), versions[-1])
+
+    def test_matrix_built_with_other_transport_settings_is_ignored(self):
+        matrix_dir = self.make_temporary_directory()
+        build_travel_matrix(self.rows, matrix_dir / "testville")
+        with override_settings(TRAVEL_MATRIX_DIR=matrix_dir):
+            self.assertIsNotNone(get_travel_matrix("testville"))
+            with override_settings(TRAVEL_MODEL="road_graph"):
+                self.assertIsNone(get_travel_matrix("testville"))
+
+
+class PlannerTravelMatrixTests(TemporaryDirectoryMixin, TestCase):
+    region = "matrixville"
+
+    @classmethod
+    def setUpTestData(cls):
+        # Two places of one neighbourhood, about 5 km apart
+        make_place("matrixville-north", cls.region, "Centre", -1.2800, 36.8200, rating="4.8")
+        make_place("matrixville-south", cls.region, "Centre", -1.3250, 36.8200, rating="4.6")
+
+    def plan_legs(self):
+        plan = build_plan(self.region, "Centre", 5000, 600)
+        return [stop["transport"] for stop in plan["stops"]]
+
+    def test_legs_between_places_come_from_the_matrix(self):
+        matrix_dir = self.make_temporary_directory()
+        with override_settings(TRAVEL_MATRIX_DIR=matrix_dir):
+            # Without a matrix the browser's neighbourhood table makes the second leg free
+            self.assertEqual(self.plan_legs()[1], {"mode": "Walk", "fare": 0, "minutes": 0})
+
+            rows = Place.objects.filter(region=self.region).values_list("slug", "lat", "lng")
+            build_travel_matrix(list(rows), matrix_dir / self.region)
+            legs = self.plan_legs()
+        self.assertEqual(legs[0], {"mode": "Walk", "fare": 0, "minutes": 0})  # From the neighbourhood center
+        mode, fare, minutes = calculate_transport(-1.2800, 36.8200, -1.3250, 36.8200)
+        self.assertEqual(legs[1], {"mode": mode, "fare": fare, "minutes": minutes})
+        self.assertGreater(minutes, 0)
+
+
+class FindDuplicatesTests(SimpleTestCase):
+    def test_typo_within_the_radius_is_a_duplicate(self):
+        report = find_duplicates([
+            Candidate("Carnivore Restaurant", -1.3290, 36.8060),
+            Candidate("The Carnivor Restaurant", -1.3291, 36.8061),
+            Candidate("Carnivore Restaurant", -1.3500, 36.8060),  # Same name, 2 km away
+        ])
+        self.assertEqual(report.clusters, [[0, 1]])
+
+    def test_distinct_names_on_one_point_are_a_stack(self):
+        names = ["Serena Hotel", "Hilton Nairobi", "Stanley Hotel", "Fairmont Norfolk"]
+        report = find_duplicates([Candidate(name, -1.2833, 36.8167) for name in names])
+        self.assertEqual(report.clusters, [])
+        self.assertEqual(report.stacks, [[0, 1, 2, 3]])
+
+    def test_stacked_point_is_not_compared_pairwise(self):
+        # Hotels geocoded to one city-center coordinate, plus a typo duplicate of one
+        words = [a + b + c for a in ("ka", "lo", "mi", "su", "te") for b in ("ren", "vak", "dol", "pis") for c in "aeiou"]
+        candidates = [Candidate(f"Hotel {word} {i}", -1.2833, 36.8167) for i, word in enumerate(words * 20)]
+        candidates.append(Candidate(candidates[7].name.replace("Hotel ", "Hotell "), -1.2833, 36.8167))
+        with mock.patch.object(dedupe, "names_match", wraps=dedupe.names_match) as names_match:
+            report = find_duplicates(candidates)
+        self.assertLess(names_match.call_count, 20 * len(candidates))
+        self.assertIn([7, len(candidates) - 1], report.clusters)
+
+
+class RegionParamTests(TestCase):
+    region = "knownville"
+
+    @classmethod
+    def setUpTestData(cls):
+        make_place("knownville-park", cls.region, "Centre", -1.2800, 36.8200)
+
+    def test_region_with_places_is_served(self):
+        response = self.client.get(reverse("geo-data"), {"region": self.region})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["places"]), 1)
+
+    def test_unknown_region_is_rejected_before_the_caches(self):
+        for name in ("geo-data", "clusters", "nearby", "plan"):
+            response = self.client.get(reverse(name), {"region": "nowhere", "z": 10, "bbox": "36,-2,37,-1"})
+            self.assertEqual(response.status_code, 400, name)
+        self.assertNotIn("nowhere", snapshot._snapshots)
+        self.assertNotIn("nowhere", clustering._indexes)
+
+    def test_async_views_reject_an_unknown_region(self):
+        for name in ("geo-data-async", "clusters-async", "events"):
+            response = self.client.get(reverse(name), {"region": "nowhere"})
+            self.assertEqual(response.status_code, 400, name)
+
+
+class PlaceSnapshotTests(TestCase):
+    region = "snapville"
+
+    @classmethod
+    def setUpTestData(cls):
+        make_place("snapville-park", cls.region, "Centre", -1.2800, 36.8200)
+
+    def setUp(self):
+        forget_region_caches(self, self.region)
+
+    def test_reloads_when_the_version_moves(self):
+        first = snapshot.get_place_snapshot(self.region)
+        self.assertEqual([row.slug for row in first.rows], ["snapville-park"])
+        with self.assertNumQueries(1):  # Just the version lookup
+            self.assertIs(snapshot.get_place_snapshot(self.region), first)
+
+        make_place("snapville-museum", self.region, "Centre", -1.2810, 36.8210, category="Museum")
+        second = snapshot.get_place_snapshot(self.region)
+        self.assertEqual(second.version, get_dataset_version())
+        self.assertGreater(second.version, first.version)
+        self.assertEqual(sorted(second.by_slug), ["snapville-museum", "snapville-park"])
+        self.assertEqual(len(first), 1)  # Readers holding the old snapshot are unaffected
+
+    def test_never_goes_back_to_an_older_version(self):
+        current = snapshot.get_place_snapshot(self.region)
+        with mock.patch("trips.snapshot.get_dataset_version", return_value=current.version - 1):
+            self.assertIs(snapshot.get_place_snapshot(self.region), current)
+
+    def test_preloaded_snapshot_is_used_only_for_the_current_version(self):
+        version = get_dataset_version()
+        stale = snapshot.PlaceSnapshot(version - 1, (), self.region)
+        snapshot.preload_place_snapshot(stale)
+        self.assertEqual(len(snapshot.get_place_snapshot(self.region)), 1)
+
+        snapshot._snapshots.pop(self.region)
+        preloaded = snapshot.PlaceSnapshot(version, (), self.region)
+        snapshot.preload_place_snapshot(preloaded)
+        self.assertIs(snapshot.get_place_snapshot(self.region), preloaded)
+        self.assertNotIn(self.region, snapshot._preloaded)
+
+    async def test_async_reload(self):
+        first = await snapshot.aget_place_snapshot(self.region)
+        self.assertIs(await snapshot.aget_place_snapshot(self.region), first)
+        await sync_to_async(make_place)("snapville-museum", self.region, "Centre", -1.2810, 36.8210)
+        second = await snapshot.aget_place_snapshot(self.region)
+        self.assertEqual(sorted(second.by_slug), ["snapville-museum", "snapville-park"])
+        self.assertIs(await sync_to_async(snapshot.get_place_snapshot)(self.region), second)
+
+
+class AsyncViewParityTests(TestCase):
+    region = "asyncville"
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            make_place(
+                f"asyncville-{i}", cls.region, f"Area {i % 4}", -1.28 + (i % 6) * 0.02, 36.80 + (i // 6) * 0.02,
+                category=("Park", "Museum", "Cafe")[i % 3], tags=["outdoor", "art"][: i % 3], rating=f"{3 + i % 3}.5",
+            )
+
+    def setUp(self):
+        forget_region_caches(self, self.region)
+
+    async def assertSamePayload(self, sync_name, async_name, params):
+        sync_response = await sync_to_async(self.client.get)(reverse(sync_name), params)
+        async_response = await self.async_client.get(reverse(async_name), params)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response["Content-Type"], sync_response["Content-Type"])
+        self.assertEqual(async_response.content, sync_response.content)
+        return async_response
+
+    async def test_geo_data(self):
+        response = await self.assertSamePayload("geo-data", "geo-data-async", {"region": self.region})
+        self.assertEqual(len(response.json()["places"]), 30)
+        self.assertEqual(len(response.json()["neighbourhoodCenters"]), 4)
+
+    async def test_clusters(self):
+        for zoom in (0, 8, 12, 16, 20):
+            for bbox in ("36.7,-1.4,36.95,-1.1", "36.79,-1.29,36.83,-1.25", "-10,-10,-9,-9"):
+                with self.subTest(zoom=zoom, bbox=bbox):
+                    params = {"region": self.region, "z": zoom, "bbox": bbox}
+                    await self.assertSamePayload("clusters", "clusters-async", params)
+
+    async def test_parity_after_a_write(self):
+        await self.assertSamePayload("geo-data", "geo-data-async", {"region": self.region})
+        await sync_to_async(make_place)("asyncville-new", self.region, "Area 9", -1.2000, 36.9000)
+        response = await self.assertSamePayload("geo-data", "geo-data-async", {"region": self.region})
+        self.assertEqual(response.json()["version"], await sync_to_async(get_dataset_version)())
+        self.assertIn("Area 9", response.json()["neighbourhoodCenters"])
+        await self.assertSamePayload(
+            "clusters", "clusters-async", {"region": self.region, "z": 17, "bbox": "36.85,-1.25,36.95,-1.15"}
+        )
+
+    async def test_out_of_range_zoom_echoes_the_level_served(self):
+        bbox = "36.7,-1.4,36.95,-1.1"
+        for z, served in ((99, clustering.MAX_ZOOM + 1), (-3, clustering.MIN_ZOOM)):
+            with self.subTest(z=z):
+                params = {"region": self.region, "bbox": bbox}
+                body = (await self.assertSamePayload("clusters", "clusters-async", {**params, "z": z})).json()
+                self.assertEqual(body["zoom"], served)
+                expected = await sync_to_async(self.client.get)(reverse("clusters"), {**params, "z": served})
+                self.assertEqual(body, expected.json())
+
+    async def test_bad_cluster_queries(self):
+        for params in ({"z": "x", "bbox": "36,-2,37,-1"}, {"z": 10, "bbox": "36,-2,37"}, {"z": 10, "bbox": "36,-1,37,-2"}):
+            with self.subTest(params):
+                response = await self.assertSamePayload("clusters", "clusters-async", {"region": self.region, **params})
+                self.assertEqual(response.status_code, 400)
+
+
+class WarmStartTests(TemporaryDirectoryMixin, TestCase):
+    region = "warmville"
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(40):
+            make_place(
+                f"warmville-{i}", cls.region, f"Area {i % 3}", -1.28 + (i % 7) * 0.01, 36.80 + (i // 7) * 0.01,
+                category=("Park", "Museum", "Cafe")[i % 3], vibes=["Chill", "romantic"][: i % 3],
+                rating=f"{3 + i % 3}.5",
+            )
+
+    def boot(self):
+        directory = self.make_temporary_directory()
+        build_artifact(self.region, directory)
+        self.assertEqual(load_on_boot(directory), 1)
+
+    def test_indexes_are_served_from_the_mapped_artifact(self):
+        self.boot()
+        clusters = clustering.get_cluster_index(self.region)
+        ranked = ranking.get_ranking_index(self.region)
+        self.assertFalse(clusters.levels[10].xs.flags.writeable)
+        self.assertFalse(clusters.levels[10].tree.ids.flags.writeable)
+        self.assertFalse(ranked.vibe_counts.flags.writeable)
+
+        rows = snapshot.get_place_snapshot(self.region).rows
+        live_clusters = clustering.ClusterIndex(clusters.version, clustering.marker_rows(rows))
+        for zoom in (0, 10, 14, 17):
+            self.assertEqual(
+                clusters.get_clusters(36.7, -1.4, 36.9, -1.2, zoom),
+                live_clusters.get_clusters(36.7, -1.4, 36.9, -1.2, zoom),
+            )
+        live_ranked = ranking.RankingIndex(ranked.version, rows)
+        query = (["Park"], ["chill"], "museum cafe")
+        np.testing.assert_array_equal(ranked.scores(*query), live_ranked.scores(*query))
+        np.testing.assert_array_equal(ranked.top_k(5, *query)[0], live_ranked.top_k(5, *query)[0])
+
+    def test_stale_artifact_falls_back_to_a_live_build(self):
+        self.boot()
+        make_place("warmville-new", self.region, "Area 0", -1.30, 36.85)
+        clusters = clustering.get_cluster_index(self.region)
+        self.assertTrue(clusters.levels[10].xs.flags.writeable)
+        self.assertEqual(len(clusters.rows), 41)
+
+
+class LocalBrokerTests(SimpleTestCase):
+    async def test_publish_from_another_thread_wakes_subscribers(self):
+        broker = LocalBroker()
+        async with broker.subscribe() as first, broker.subscribe() as second:
+            self.assertTrue(broker.has_subscribers())
+            publisher = threading.Thread(target=broker.publish, args=(7,))
+            publisher.start()
+            publisher.join()
+            self.assertEqual(await first.wait(1), 7)
+            self.assertEqual(await second.wait(1), 7)
+
+            # Versions that don't move forward are dropped
+            broker.publish(5)
+            self.assertIsNone(await first.wait(0.05))
+            broker.publish(3)
+            broker.publish(9)
+            self.assertEqual(await first.wait(1), 9)
+        self.assertFalse(broker.has_subscribers())
+
+    async def test_wait_times_out_without_a_publish(self):
+        async with LocalBroker().subscribe() as subscription:
+            self.assertIsNone(await subscription.wait(0.01))
+
+
+def parse_sse(chunk):
+    """(event, id, data) of an SSE event chunk; comments and retry lines give (None, None, None)."""
+    lines = [line for line in chunk.decode().splitlines() if line and not line.startswith((":", "retry"))]
+    fields = dict(line.split(": ", 1) for line in lines)
+    if not fields:
+        return None, None, None
+    return fields["event"], int(fields["id"]), json.loads(fields["data"])
+
+
+@override_settings(EVENTS_HEARTBEAT_SECONDS=0.01)
+class EventStreamTests(TestCase):
+    region = "eventville"
+
+    @classmethod
+    def setUpTestData(cls):
+        make_place("eventville-park", cls.region, "Centre", -1.2800, 36.8200)
+
+    def setUp(self):
+        self.broker = LocalBroker()
+        patcher = mock.patch("trips.views.get_broker", return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def next_event(self, stream):
+        """The next chunk of ``stream``, parsed as an event."""
+        return parse_sse(await asyncio.wait_for(stream.__anext__(), 1))
+
+    async def test_new_stream_starts_with_the_version_then_heartbeats(self):
+        version = await sync_to_async(get_dataset_version)()
+        stream = _event_stream(None, self.region)
+        try:
+            self.assertEqual(await stream.__anext__(), b"retry: 3000\n\n")
+            self.assertEqual(await self.next_event(stream), ("version", version, {"version": version}))
+            self.assertEqual(await asyncio.wait_for(stream.__anext__(), 1), b": heartbeat\n\n")
+        finally:
+            await stream.aclose()
+
+    async def test_resume_sends_the_region_changes_since_last_event_id(self):
+        since = await sync_to_async(get_dataset_version)()
+        await sync_to_async(make_place)("eventville-museum", self.region, "Centre", -1.2810, 36.8210)
+        await sync_to_async(make_place)("otherville-museum", "otherville", "Centre", -1.2810, 36.8210)
+        version = await sync_to_async(get_dataset_version)()
+
+        stream = _event_stream(since, self.region)
+        try:
+            await stream.__anext__()  # retry
+            event, event_id, data = await self.next_event(stream)
+            self.assertEqual((event, event_id, data["since"]), ("changes", version, since))
+            self.assertEqual([place["id"] for place in data["places"]], ["eventville-museum"])
+
+            # Caught up: a later change elsewhere sends nothing but heartbeats
+            await sync_to_async(make_place)("otherville-park", "otherville", "Centre", -1.2820, 36.8220)
+            self.broker.publish(await sync_to_async(get_dataset_version)())
+            self.assertEqual(await asyncio.wait_for(stream.__anext__(), 1), b": heartbeat\n\n")
+
+            await sync_to_async(make_place)("eventville-cafe", self.region, "Centre", -1.2830, 36.8230)
+            latest = await sync_to_async(get_dataset_version)()
+            self.broker.publish(latest)
+            event, event_id, data = await self.next_event(stream)
+            self.assertEqual((event, event_id), ("changes", latest))
+            self.assertEqual([place["id"] for place in data["places"]], ["eventville-cafe"])
+        finally:
+            await stream.aclose()
+
+    async def test_resume_below_the_sync_floor_asks_for_a_resync(self):
+        since = await sync_to_async(get_dataset_version)()
+        floor = await sync_to_async(bump_dataset_version)(full_resync=True)
+        stream = _event_stream(since, self.region)
+        try:
+            await stream.__anext__()  # retry
+            self.assertEqual(await self.next_event(stream), ("resync", floor, {"version": floor}))
+        finally:
+            await stream.aclose()
+
+
+REPLICA = "replica_test"
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """The router and middleware against a second SQLite database standing in for a replica."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test runner's database setup, which only knows the configured aliases
+        directory = Path(tempfile.mkdtemp())
+        cls.addClassCleanup(shutil.rmtree, directory, ignore_errors=True)
+        database = {"ENGINE": "django.db.backends.sqlite3", "NAME": str(directory / "replica.sqlite3")}
+        # configure_settings fills in the defaults, but insists on a "default" alias
+        connections.settings[REPLICA] = connections.configure_settings({"default": database})["default"]
+        cls.addClassCleanup(connections.settings.pop, REPLICA)
+        cls.addClassCleanup(connections[REPLICA].close)
+        cls.databases = {*cls.databases, REPLICA}
+        with connections[REPLICA].schema_editor() as editor:
+            for model in apps.get_app_config("trips").get_models():
+                editor.create_model(model)
+
+    def setUp(self):
+        NeighbourhoodStats.objects.using(REPLICA).all().delete()
+        for database, region in (("default", "primaryville"), (REPLICA, "replicaville")):
+            NeighbourhoodStats.objects.using(database).create(
+                region=region, name="Centre", place_count=1, lat_sum=-1.28, lng_sum=36.82
+            )
+            DatasetVersion.objects.using(database).get_or_create(pk=VERSION_ROW_ID)
+        for target, value in (("replica_aliases", lambda: [REPLICA]), ("health", ReplicaHealth())):
+            patcher = mock.patch.object(db_router, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def listed_regions(self):
+        response = self.client.get(reverse("regions"))
+        self.assertEqual(response.status_code, 200)
+        return [row["region"] for row in response.json()["regions"]]
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.listed_regions(), ["replicaville"])
+
+    def test_client_reads_its_own_writes_from_the_primary(self):
+        response = self.client.post(reverse("set_location"), {"lat": "-1.2800", "lng": "36.8200"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertIn("primaryville", self.listed_regions())
+
+        self.client.cookies.pop(PIN_COOKIE)
+        self.assertEqual(self.listed_regions(), ["replicaville"])
+
+    def test_replica_marked_down_falls_back_to_the_primary(self):
+        db_router.health.mark_down(REPLICA)
+        self.assertEqual(self.listed_regions(), ["primaryville"])
+
+    def test_replica_failing_mid_query_is_retried_on_the_primary(self):
+        with connections[REPLICA].schema_editor() as editor:
+            editor.delete_model(NeighbourhoodStats)
+        self.addCleanup(self.restore_replica_table)
+        self.assertEqual(self.listed_regions(), ["primaryville"])
+        self.assertFalse(db_router.health.is_healthy(REPLICA))
+
+    def restore_replica_table(self):
+        with connections[REPLICA].schema_editor() as editor:
+            editor.create_model(NeighbourhoodStats)
+
+
+def upstream_response(url, json, **kwargs):
+    """A directions-service response with one midpoint between the two requested points."""
+    (lng1, lat1), (lng2, lat2) = json["coordinates"]
+    coordinates = [[lng1, lat1], [(lng1 + lng2) / 2 + 0.001, (lat1 + lat2) / 2], [lng2, lat2]]
+    return mock.Mock(status_code=200, json=lambda: {"features": [{"geometry": {"coordinates": coordinates}}]})
+
+
+@override_settings(ROUTING_API_KEY="test-key", ROUTING_RATE_LIMIT=100)
+class RouteProxyTests(TestCase):
+    points = [[-1.2676, 36.8108], [-1.2864, 36.8172], [-1.3000, 36.8300]]
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch("trips.road_routes.requests.post", side_effect=upstream_response)
+        self.upstream = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, **body):
+        return self.client.post(
+            reverse("route"), json.dumps({"coordinates": self.points, **body}), content_type="application/json"
+        )
+
+    def test_legs_are_fetched_once_then_served_from_the_table(self):
+        data = self.post().json()
+        self.assertEqual(self.upstream.call_count, 2)
+        self.assertEqual(self.upstream.call_args.kwargs["headers"]["Authorization"], "test-key")
+        self.assertTrue(data["complete"])
+        self.assertEqual(len(data["coordinates"]), 5)  # Joint point not repeated
+        self.assertEqual(data["coordinates"][0], self.points[0])
+
+        data = self.post().json()
+        self.assertEqual(self.upstream.call_count, 2)
+        self.assertEqual(data["legs"], [{"cached": True, "ok": True}] * 2)
+
+    def test_failed_leg_is_straight_and_not_refetched_straight_away(self):
+        self.upstream.side_effect = requests.ConnectionError
+        data = self.post().json()
+        self.assertFalse(data["complete"])
+        self.assertEqual(data["coordinates"], self.points)
+        self.post()
+        self.assertEqual(self.upstream.call_count, 2)
+        self.assertFalse(RouteLeg.objects.exists())
+
+    def test_expired_legs_are_refetched(self):
+        self.post()
+        RouteLeg.objects.update(created_at=timezone.now() - timedelta(days=60))
+        data = self.post().json()
+        self.assertEqual(self.upstream.call_count, 4)
+        self.assertEqual(data["legs"], [{"cached": False, "ok": True}] * 2)
+        self.assertFalse(RouteLeg.objects.filter(created_at__lt=timezone.now() - timedelta(days=1)).exists())
+
+    def test_polyline_at_a_zoom(self):
+        data = self.post(zoom=3, encoding="polyline").json()
+        self.assertNotIn("coordinates", data)
+        self.assertEqual(decode_polyline(data["polyline"]), [[-1.2676, 36.8108], [-1.3, 36.83]])
+
+    def test_invalid_requests_are_rejected(self):
+        for body in ({"zoom": float("nan")}, {"zoom": float("inf")}, {"coordinates": self.points[:1]},
+                     {"coordinates": [[91, 0], [0, 0]]}, {"coordinates": "north"}):
+            self.assertEqual(self.post(**body).status_code, 400, body)
+        self.upstream.assert_not_called()
+
+    @override_settings(ROUTING_RATE_LIMIT=2)
+    def test_clients_are_rate_limited(self):
+        self.assertEqual([self.post().status_code for _ in range(3)], [200, 200, 429])
+        other = self.client.post(
+            reverse("route"), json.dumps({"coordinates": self.points}), content_type="application/json",
+            REMOTE_ADDR="10.0.0.2",
+        )
+        self.assertEqual(other.status_code, 200)
+
+    @override_settings(ROUTING_API_KEY="")
+    def test_unconfigured_routing_fails_clearly(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("ROUTING_API_KEY", response.json()["message"])
+        self.upstream.assert_not_called()
+
+
+def distance_to_path_m(point, path):
+    """Metres from ``point`` to the nearest segment of ``path``, on a local flat projection."""
+    kx = math.radians(1) * 6371000.0 * math.cos(math.radians(point[0]))
+    ky = math.radians(1) * 6371000.0
+    px, py = point[1] * kx, point[0] * ky
+    best = math.inf
+    for (lat1, lng1), (lat2, lng2) in zip(path, path[1:]):
+        ax, ay, bx, by = lng1 * kx, lat1 * ky, lng2 * kx, lat2 * ky
+        dx, dy = bx - ax, by - ay
+        t = 0.0 if dx == dy == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+        best = min(best, math.hypot(px - ax - t * dx, py - ay - t * dy))
+    return best
+
+
+class PolylineTests(SimpleTestCase):
+    half_step = 0.5e-5 + 1e-12  # Rounding error at precision 5, ties included
+
+    def test_matches_the_reference_encoding(self):
+        points = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+        self.assertEqual(encode_polyline(points), "_p~iF~ps|U_ulLnnqC_mqNvxq`@")
+        self.assertEqual(decode_polyline("_p~iF~ps|U_ulLnnqC_mqNvxq`@"), points)
+
+    def test_round_trips(self):
+        cases = {
+            "southern and western": [[-1.2864, 36.8172], [-33.86882, -151.20929], [-89.99999, -179.99999]],
+            "across the antimeridian": [[-16.5, 179.99999], [-16.50001, -179.99999], [-16.5, 179.5]],
+            "repeated point": [[0.0, 0.0], [0.0, 0.0], [0.00001, -0.00001]],
+            "empty": [],
+        }
+        for name, points in cases.items():
+            self.assertEqual(decode_polyline(encode_polyline(points)), points, name)
+
+    def test_rounds_to_the_precision(self):
+        points = [[-1.286389123, 36.817223987], [-1.2864449, 36.8172551]]
+        decoded = decode_polyline(encode_polyline(points))
+        for (lat, lng), (lat2, lng2) in zip(points, decoded):
+            self.assertAlmostEqual(lat, lat2, delta=self.half_step)
+            self.assertAlmostEqual(lng, lng2, delta=self.half_step)
+        # Rounding errors don't add up along the line: deltas are taken between rounded points
+        line = [[-1.0 + i * 0.0000049, 36.0 - i * 0.0000051] for i in range(1000)]
+        for point, point2 in zip(line, decode_polyline(encode_polyline(line))):
+            self.assertAlmostEqual(point[0], point2[0], delta=self.half_step)
+            self.assertAlmostEqual(point[1], point2[1], delta=self.half_step)
+
+    def test_precision_six(self):
+        points = [[-1.286389, 36.817224], [-1.286445, 179.999999]]
+        self.assertEqual(decode_polyline(encode_polyline(points, precision=6), precision=6), points)
+
+
+class SimplifyTests(SimpleTestCase):
+    # A winding road of about 4 km, with a point every ~20 m
+    road = [
+        [-1.30 + i * 0.00018, 36.80 + 0.002 * math.sin(i / 15) + 0.0004 * math.sin(i / 2.3)]
+        for i in range(200)
+    ]
+
+    def test_keeps_the_endpoints_and_stays_within_tolerance(self):
+        for tolerance in (1, 10, 50, 250):
+            simplified = simplify(self.road, tolerance)
+            self.assertEqual(simplified[0], self.road[0])
+            self.assertEqual(simplified[-1], self.road[-1])
+            self.assertLess(len(simplified), len(self.road))
+            for point in self.road:
+                self.assertLessEqual(distance_to_path_m(point, simplified), tolerance + 1e-6)
+
+    def test_larger_tolerance_keeps_fewer_points(self):
+        counts = [len(simplify(self.road, tolerance)) for tolerance in (1, 10, 50, 250)]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertEqual(len(simplify(self.road, 1e6)), 2)
+
+    def test_keeps_a_loop_that_returns_to_its_start(self):
+        loop = [[-1.30, 36.80], [-1.30, 36.81], [-1.29, 36.81], [-1.29, 36.80], [-1.30, 36.80]]
+        self.assertEqual(simplify(loop, 10), loop)
+
+    def test_short_lines_and_zero_tolerance_are_unchanged(self):
+        self.assertEqual(simplify(self.road[:2], 1000), self.road[:2])
+        self.assertEqual(simplify(self.road, 0), self.road)
+
+
+class ToleranceForZoomTests(SimpleTestCase):
+    def test_one_pixel_at_zoom_zero_on_the_equator(self):
+        self.assertAlmostEqual(tolerance_for_zoom(0, 0), METERS_PER_PIXEL_Z0)
+
+    def test_halves_with_each_zoom_level(self):
+        for zoom in range(0, 22):
+            self.assertAlmostEqual(tolerance_for_zoom(zoom + 1, -1.28) * 2, tolerance_for_zoom(zoom, -1.28))
+        self.assertAlmostEqual(tolerance_for_zoom(12.5, 0), METERS_PER_PIXEL_Z0 / 2 ** 12.5)
+
+    def test_shrinks_towards_the_poles(self):
+        self.assertAlmostEqual(tolerance_for_zoom(10, 60), tolerance_for_zoom(10, 0) / 2)
+        self.assertAlmostEqual(tolerance_for_zoom(10, -60), tolerance_for_zoom(10, 60))
+        self.assertAlmostEqual(tolerance_for_zoom(10, 90), 0)
+
+    def test_scales_with_the_pixel_count(self):
+        self.assertAlmostEqual(tolerance_for_zoom(14, -1.28, pixels=3), 3 * tolerance_for_zoom(14, -1.28))
+
+
+def js_stage3(candidates, preferred_categories, preferred_vibes, free_text):
+    """Line-by-line port of ``stage3ScoreAndRank`` and ``textMatchBoost`` in app.js."""
+    cat_set = set(preferred_categories)
+    vibe_set = {v.lower() for v in preferred_vibes}
+    tokens = [t for t in (free_text or "").lower().split() if len(t) > 2]
+
+    scored = []
+    for p in candidates:
+        category_score = (1 if p.category in cat_set else 0) if cat_set else 0.5
+        vibe_score = min(1, len([v for v in p.vibes if v.lower() in vibe_set]) / 2)
+        text_boost = 0
+        if tokens:
+            haystack = " ".join([*p.tags, *p.vibes, p.name, p.category]).lower()
+            text_boost = min(1, sum(1 for token in tokens if token in haystack) / len(tokens))
+        base_score = p.rating / 5 * 0.3 + category_score * 0.3 + vibe_score * 0.2 + p.popularity * 0.2
+        scored.append((p, base_score + text_boost * 0.2))
+    # Array.prototype.sort is stable
+    return sorted(scored, key=lambda item: -item[1])
+
+
+class NearbyIndexTests(SimpleTestCase):
+    categories = ("Park", "Museum", "Restaurant", "Market")
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(7)
+        rows = []
+        for i in range(400):
+            # Mostly around Nairobi, some anywhere on the globe
+            if i % 10:
+                lat, lng = -1.28 + rng.uniform(-0.3, 0.3), 36.82 + rng.uniform(-0.3, 0.3)
+            else:
+                lat, lng = rng.uniform(-89, 89), rng.uniform(-180, 180)
+            rows.append(PlaceRow(
+                slug=f"place-{i}", name=f"Place {i}", category=cls.categories[rng.randrange(4)],
+                neighbourhood="Centre", lat=lat, lng=lng, entry_fee=0, avg_food=0, duration_min=60,
+                rating=4.0, price_tier="Budget", tags=(), vibes=(), popularity=0.5,
+            ))
+        cls.rows = tuple(rows)
+        cls.index = NearbyIndex(1, cls.rows)
+        cls.points = [(-1.28 + rng.uniform(-0.4, 0.4), 36.82 + rng.uniform(-0.4, 0.4)) for _ in range(15)]
+        cls.points += [(0.0, 179.99), (-89.5, 0.0), (45.0, -100.0)]
+
+    def brute_force(self, lat, lng, k, categories, max_km):
+        wanted = None if categories is None else set(categories)
+        found = sorted(
+            (haversine_distance(lat, lng, row.lat, row.lng), i)
+            for i, row in enumerate(self.rows)
+            if wanted is None or row.category in wanted
+        )
+        return [(i, km) for km, i in found if km <= max_km][:k]
+
+    def test_matches_brute_force(self):
+        for lat, lng in self.points:
+            for k in (1, 7, 50, 1000):
+                for categories in (None, ["Park"], ["Park", "Museum", "Stadium"], ["Market", "Market"], []):
+                    for max_km in (math.inf, 3.0, 25.0):
+                        with self.subTest(lat=lat, lng=lng, k=k, categories=categories, max_km=max_km):
+                            expected = self.brute_force(lat, lng, k, categories, max_km)
+                            found = self.index.nearest(lat, lng, k, categories, max_km)
+                            self.assertEqual([i for i, _ in found], [i for i, _ in expected])
+                            for (_, km), (_, expected_km) in zip(found, expected):
+                                self.assertAlmostEqual(km, expected_km, places=6)
+
+    def test_zero_max_km_finds_only_exact_matches(self):
+        row = self.rows[3]
+        self.assertEqual(self.index.nearest(row.lat, row.lng, 5, None, 0.0), [(3, 0.0)])
+
+
+class NearbyViewTests(TestCase):
+    region = "nearbyville"
+
+    @classmethod
+    def setUpTestData(cls):
+        make_place("nearbyville-park", cls.region, "Centre", -1.2800, 36.8200)
+        make_place("nearbyville-museum", cls.region, "Centre", -1.2810, 36.8200, category="Museum")
+        make_place("nearbyville-cafe", cls.region, "Centre", -1.2900, 36.8200, category="Cafe")
+        make_place("nearbyville-far", cls.region, "Hill", -1.5000, 36.8200)
+
+    def get(self, **params):
+        return self.client.get(reverse("nearby"), {"region": self.region, **params})
+
+    def test_nearest_first_with_distances(self):
+        body = self.get(lat=-1.2800, lng=36.8200, k=3).json()
+        self.assertEqual(
+            [place["id"] for place in body["places"]], ["nearbyville-park", "nearbyville-museum", "nearbyville-cafe"]
+        )
+        self.assertEqual(body["places"][0]["distanceKm"], 0.0)
+        self.assertAlmostEqual(body["places"][1]["distanceKm"], haversine_distance(-1.28, 36.82, -1.281, 36.82), 3)
+
+    def test_categories_and_max_km(self):
+        body = self.get(lat=-1.2800, lng=36.8200, category=["Museum,Cafe", "Stadium"]).json()
+        self.assertEqual([place["id"] for place in body["places"]], ["nearbyville-museum", "nearbyville-cafe"])
+        body = self.get(lat=-1.2800, lng=36.8200, category="Park", max_km=5).json()
+        self.assertEqual([place["id"] for place in body["places"]], ["nearbyville-park"])
+
+    @override_settings(NEARBY_MAX_RESULTS=2)
+    def test_k_is_capped(self):
+        self.assertEqual(len(self.get(lat=-1.2800, lng=36.8200, k=50).json()["places"]), 2)
+
+    def test_bad_parameters_are_rejected(self):
+        for params in (
+            {},
+            {"lat": -1.28},
+            {"lat": "abc", "lng": 36.82},
+            {"lat": 91, "lng": 36.82},
+            {"lat": -1.28, "lng": -181},
+            {"lat": -1.28, "lng": 36.82, "k": 0},
+            {"lat": -1.28, "lng": 36.82, "k": "ten"},
+            {"lat": -1.28, "lng": 36.82, "k": 2.5},
+            {"lat": -1.28, "lng": 36.82, "max_km": -1},
+            {"lat": -1.28, "lng": 36.82, "max_km": "nan"},
+        ):
+            with self.subTest(params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["status"], "error")
+
+
+def js_stage2(candidates, total_budget):
+    """Line-by-line port of ``stage2BudgetFilter`` in app.js (its category check keeps every place)."""
+    threshold = total_budget * 0.6
+    return [p for p in candidates if not p.entry_fee + p.avg_food > threshold]
+
+
+class ConstraintIndexTests(SimpleTestCase):
+    tiers = ("Free", "Budget", "Mid", "Premium")
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.rng = random.Random(11)
+        rows = []
+        for i in range(300):
+            rows.append(PlaceRow(
+                slug=f"place-{i}", name=f"Place {i}", category="Park", neighbourhood="Centre",
+                lat=-1.28, lng=36.82,
+                # Coarse values, so bounds often land exactly on one
+                entry_fee=cls.rng.randrange(0, 2000, 50), avg_food=cls.rng.randrange(0, 1500, 10),
+                duration_min=cls.rng.randrange(15, 300, 15), rating=cls.rng.randrange(10, 51) / 10,
+                price_tier=cls.tiers[cls.rng.randrange(4)], tags=(), vibes=(), popularity=0.5,
+            ))
+        cls.rows = tuple(rows)
+        cls.index = ConstraintIndex(1, cls.rows)
+
+    def scan(self, cost=(None, None), duration=(None, None), rating=(None, None), price_tiers=None, candidates=None):
+        def within(value, bounds):
+            low, high = bounds
+            return (low is None or value >= low) and (high is None or value <= high)
+
+        allowed = None if candidates is None else set(candidates)
+        return [
+            i for i, row in enumerate(self.rows)
+            if within(row.entry_fee + row.avg_food, cost)
+            and within(row.duration_min, duration)
+            and within(row.rating, rating)
+            and (price_tiers is None or row.price_tier in price_tiers)
+            and (allowed is None or i in allowed)
+        ]
+
+    def random_bounds(self, values):
+        pick = self.rng.random()
+        if pick < 0.25:
+            return (None, None)
+        low, high = sorted(self.rng.sample(values, 2))
+        if pick < 0.4:
+            return (low, None)
+        if pick < 0.55:
+            return (None, high)
+        if pick < 0.6:
+            return (high, low) if low != high else (high + 1, low)  # Empty range
+        return (low, high)
+
+    def test_query_matches_a_linear_scan(self):
+        costs = [row.entry_fee + row.avg_food for row in self.rows]
+        durations = [row.duration_min for row in self.rows]
+        ratings = [row.rating for row in self.rows]
+        for _ in range(300):
+            kwargs = {
+                "cost": self.random_bounds(costs),
+                "duration": self.random_bounds(durations),
+                "rating": self.random_bounds(ratings),
+            }
+            if self.rng.random() < 0.5:
+                kwargs["price_tiers"] = self.rng.sample(self.tiers + ("Luxury",), self.rng.randrange(0, 4))
+            if self.rng.random() < 0.5:
+                candidates = self.rng.sample(range(len(self.rows)), self.rng.randrange(0, 120))
+                kwargs["candidates"] = np.array(candidates, dtype=np.int64)
+            with self.subTest(**kwargs):
+                result = self.index.query(**kwargs)
+                self.assertEqual(result.tolist(), self.scan(**kwargs))
+
+    def test_query_without_constraints_returns_everything(self):
+        self.assertEqual(self.index.query().tolist(), list(range(len(self.rows))))
+
+    def test_within_budget_matches_stage2_budget_filter(self):
+        for budget in (0, 100, 350, 1000, 1234.5, 2000, 5000, 10**6):
+            with self.subTest(budget=budget):
+                kept = set(js_stage2(self.rows, budget))
+                expected = [i for i, row in enumerate(self.rows) if row in kept]
+                self.assertEqual(self.index.within_budget(budget).tolist(), expected)
+
+        candidates = np.array(sorted(self.rng.sample(range(len(self.rows)), 100)), dtype=np.int64)
+        kept = set(js_stage2(self.rows, 1000))
+        expected = [i for i in candidates.tolist() if self.rows[i] in kept]
+        self.assertEqual(self.index.within_budget(1000, candidates).tolist(), expected)
+
+    def test_cost_at_the_threshold_is_kept(self):
+        rows = [self.rows[0]._replace(entry_fee=500, avg_food=avg_food) for avg_food in (100, 101)]
+        self.assertEqual(js_stage2(rows, 1000), rows[:1])
+        self.assertEqual(ConstraintIndex(1, rows).within_budget(1000).tolist(), [0])
+
+
+@override_settings(RANKING_WEIGHTS={})  # The JS weights are fixed
+class RankingParityTests(SimpleTestCase):
+    categories = ("Park", "Museum", "Restaurant", "Nightlife", "Market")
+    vibe_words = ("Chill", "romantic", "Lively", "family", "ADVENTUROUS")
+    tag_words = ("outdoor", "art gallery", "street food", "live music", "crafts")
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rows = []
+        for i in range(120):
+            rows.append(PlaceRow(
+                slug=f"place-{i}",
+                name=f"{('Green', 'Old Town', 'Spice', 'Blue Note', 'Maasai')[i % 5]} {i // 5}",
+                category=cls.categories[i * 7 % 5],
+                neighbourhood="Centre",
+                lat=-1.28, lng=36.82, entry_fee=0, avg_food=0, duration_min=60,
+                rating=round(3 + (i * 37 % 21) / 10, 1),
+                price_tier="Budget",
+                tags=tuple(cls.tag_words[(i + k) % 5] for k in range(i % 3)),
+                # Some places repeat a vibe, which counts twice in JS too
+                vibes=tuple(cls.vibe_words[(i * k) % 5] for k in range(1, i % 4 + 1)),
+                popularity=round((i * 13 % 10) / 10, 1),
+            ))
+        # Exact copies under other slugs tie with their originals
+        rows += [row._replace(slug=f"{row.slug}-copy") for row in rows[:10]]
+        cls.rows = tuple(rows)
+        cls.index = RankingIndex(1, cls.rows)
+
+    queries = [
+        ((), (), ""),
+        (("Park",), (), ""),
+        (("Park", "Market"), ("chill", "Romantic"), ""),
+        ((), ("lively", "family"), "music food"),
+        (("Museum",), (), "art gallery old"),
+        (("Stadium",), ("bored",), "zz qq"),  # Nothing matches
+        ((), (), "a an"),  # Tokens of two letters or less are ignored
+    ]
+
+    def test_scores_match_the_js_formula(self):
+        for query in self.queries:
+            by_slug = {p.slug: score for p, score in js_stage3(self.rows, *query)}
+            for row, score in zip(self.rows, self.index.scores(*query).tolist()):
+                self.assertEqual(score, by_slug[row.slug], (query, row.slug))  # Bit for bit
+
+    def test_top_k_matches_the_js_order_with_ties(self):
+        for query in self.queries:
+            expected = [p.slug for p, _ in js_stage3(self.rows, *query)]
+            for k in (1, 5, 17, None, len(self.rows) + 5):
+                rows, scores = self.index.top_k(k, *query)
+                self.assertEqual([self.rows[i].slug for i in rows.tolist()], expected[:k], (query, k))
+                self.assertEqual(scores.tolist(), sorted(scores.tolist(), reverse=True))
+
+    def test_candidates_keep_their_order_among_ties(self):
+        candidates = np.array([125, 5, 3, 0, 120, 64, 110], dtype=np.int64)
+        query = ((), ("chill",), "")
+        expected = [p.slug for p, _ in js_stage3([self.rows[i] for i in candidates], *query)]
+        rows, _ = self.index.top_k(4, *query, candidates=candidates)
+        self.assertEqual([self.rows[i].slug for i in rows.tolist()], expected[:4])
+
+    def test_empty_candidates_and_k(self):
+        rows, scores = self.index.top_k(5, candidates=np.array([], dtype=np.int64))
+        self.assertEqual((len(rows), len(scores)), (0, 0))
+        self.assertEqual(len(self.index.top_k(0)[0]), 0)
+
+    def test_reference_score_is_the_js_formula(self):
+        for query in self.queries:
+            for p, score in js_stage3(self.rows, *query):
+                self.assertEqual(ranking.reference_score(p, *query, weights=ScoreWeights()), score)
+
+
+@override_settings(ADMIN_BULK_BATCH_SIZE=2)
+class AdminBatchTests(TestCase):
+    region = "batchville"
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(5):
+            make_place(f"batchville-{i}", cls.region, "Centre", -1.28 + i * 0.001, 36.82)
+
+    def delete_failing_at(self, failing_batch):
+        batches = []
+
+        def apply(pks):
+            batches.append(pks)
+            Place.objects.filter(pk__in=pks).delete()
+            if len(batches) == failing_batch:
+                raise RuntimeError("Batch failed")
+
+        with self.assertRaisesMessage(RuntimeError, "Batch failed"):
+            _in_batches(Place.objects.filter(region=self.region), apply)
+
+    def place_count(self):
+        return NeighbourhoodStats.objects.get(region=self.region, name="Centre").place_count
+
+    def test_batches_before_a_failure_are_rebuilt_and_bumped(self):
+        version = get_dataset_version()
+        self.delete_failing_at(2)
+        self.assertEqual(Place.objects.filter(region=self.region).count(), 3)  # The failed batch rolled back
+        self.assertEqual(self.place_count(), 3)
+        self.assertEqual(get_dataset_version(), version + 1)
+
+    def test_failing_first_batch_changes_nothing(self):
+        version = get_dataset_version()
+        self.delete_failing_at(1)
+        self.assertEqual(Place.objects.filter(region=self.region).count(), 5)
+        self.assertEqual(self.place_count(), 5)
+        self.assertEqual(get_dataset_version(), version)
+
+    def test_all_batches(self):
+        count = _in_batches(
+            Place.objects.filter(region=self.region),
+            lambda pks: Place.objects.filter(pk__in=pks).update(category="Museum"),
+        )
+        self.assertEqual(count, 5)
+        self.assertEqual(set(Place.objects.filter(region=self.region).values_list("category", flat=True)), {"Museum"})
+
+
+class ExportPlacesTests(TemporaryDirectoryMixin, TestCase):
+    region = "exportville"
+
+    @classmethod
+    def setUpTestData(cls):
+        make_place("exportville-cafe", cls.region, "", -1.2800, 36.8200, name="Café \"Mtaa\", Nairobi",
+                   category="Cafe", rating="4.5", popularity="0.73", tags=["coffee", "wi-fi"], vibes=[])
+        make_place("exportville-park", cls.region, "Centre", -1.2912345, 36.8123456, tags=[], vibes=["chill", "green"])
+        make_place("otherville-park", "otherville", "Centre", -1.3000, 36.8000)
+
+    def rows(self):
+        return list(Place.objects.filter(region=self.region).order_by("slug").values_list(*PLACE_FILE_FIELDS))
+
+    def export(self, name, *args):
+        path = self.make_temporary_directory() / name
+        call_command("export_places", str(path), "--region", self.region, *args, stdout=io.StringIO())
+        return path
+
+    def reimport(self, path):
+        call_command(
+            "load_simple_places", str(path), "--region", self.region, "--replace", "--dedupe", "off",
+            stdout=io.StringIO(),
+        )
+
+    def test_round_trip(self):
+        expected = self.rows()
+        for name in ("places.json", "places.ndjson.gz", "places.csv", "places.csv.gz"):
+            with self.subTest(name):
+                path = self.export(name)
+                self.assertEqual(path.read_bytes()[:2] == b"\x1f\x8b", name.endswith(".gz"))
+                self.reimport(path)
+                self.assertEqual(self.rows(), expected)
+        self.assertTrue(Place.objects.filter(pk="otherville-park").exists())
+
+    def test_gzip_flag_adds_the_suffix(self):
+        path = self.export("places.json", "--gzip")
+        self.assertFalse(path.exists())
+        gzipped = path.with_name("places.json.gz")
+        self.assertEqual(len(json.loads(gzip.decompress(gzipped.read_bytes()))), 2)
+        expected = self.rows()
+        self.reimport(gzipped)
+        self.assertEqual(self.rows(), expected)
+
+
+@override_settings(
+    JOBS_MAX_ATTEMPTS=3, JOBS_BACKOFF_SECONDS=10, JOBS_BACKOFF_MAX_SECONDS=25, JOBS_LOCK_TIMEOUT_SECONDS=60
+)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.calls = []
+        handlers = mock.patch.dict(jobs._handlers)
+        handlers.start()
+        self.addCleanup(handlers.stop)
+        jobs.register("record")(lambda **payload: self.calls.append(payload))
+        jobs.register("flaky")(self.raise_error(RuntimeError("Upstream down")))
+        jobs.register("broken")(self.raise_error(PermanentJobError("Bad payload")))
+
+    @staticmethod
+    def raise_error(exc):
+        def handler(**payload):
+            raise exc
+        return handler
+
+    def make_due(self, job):
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+    def test_claim_marks_the_next_due_job_running(self):
+        enqueue("record", {"n": 2}, delay=60)
+        first = enqueue("record", {"n": 1})
+        job = claim_job("worker-1")
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual((job.status, job.attempts, job.locked_by), (Job.RUNNING, 1, "worker-1"))
+        self.assertIsNotNone(job.locked_at)
+        self.assertIsNone(claim_job("worker-2"))  # The other job isn't due yet
+
+        self.assertTrue(run_job(job))
+        self.assertEqual(self.calls, [{"n": 1}])
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+
+    def test_claim_filters_by_kind(self):
+        enqueue("flaky")
+        record = enqueue("record")
+        self.assertEqual(claim_job("worker-1", ["record"]).pk, record.pk)
+        self.assertIsNone(claim_job("worker-1", ["record"]))
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = enqueue("flaky")
+        delays = []
+        with mock.patch("trips.jobs.random.uniform", return_value=1.0):
+            for attempt in range(1, 4):
+                claimed = claim_job("worker-1")
+                self.assertEqual(claimed.attempts, attempt)
+                started = timezone.now()
+                self.assertFalse(run_job(claimed))
+                job.refresh_from_db()
+                self.assertIn("Upstream down", job.last_error)
+                if job.status == Job.QUEUED:
+                    self.assertEqual(job.locked_by, "")
+                    delays.append(round((job.run_after - started).total_seconds()))
+                    self.assertIsNone(claim_job("worker-1"))  # Not due until the backoff passes
+                    self.make_due(job)
+        self.assertEqual(delays, [10, 20])
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+        self.assertIsNone(claim_job("worker-1"))
+
+    def test_backoff_is_capped_and_jittered(self):
+        with mock.patch("trips.jobs.random.uniform", return_value=1.0):
+            self.assertEqual([backoff_seconds(n) for n in range(1, 5)], [10, 20, 25, 25])
+        for _ in range(20):
+            self.assertTrue(5 <= backoff_seconds(1) <= 10)
+
+    def test_permanent_errors_and_unknown_kinds_are_not_retried(self):
+        for kind, error in (("broken", "Bad payload"), ("missing", "No handler registered for 'missing'")):
+            job = enqueue(kind)
+            self.assertFalse(run_job(claim_job("worker-1")))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (Job.FAILED, 1))
+            self.assertIn(error, job.last_error)
+
+    def test_dedupe_key_collapses_queued_jobs(self):
+        first = enqueue("record", {"n": 1}, dedupe_key="record:a")
+        self.assertEqual(enqueue("record", {"n": 2}, dedupe_key="record:a").pk, first.pk)
+        self.assertNotEqual(enqueue("record", dedupe_key="record:b").pk, first.pk)
+        self.assertEqual(Job.objects.filter(dedupe_key="record:a").count(), 1)
+
+    def test_dedupe_key_enqueues_again_while_one_is_running(self):
+        running = enqueue("flaky", dedupe_key="flaky:a")
+        claim_job("worker-1")
+        queued = enqueue("flaky", dedupe_key="flaky:a")
+        self.assertNotEqual(queued.pk, running.pk)
+        self.assertEqual(enqueue("flaky", dedupe_key="flaky:a").pk, queued.pk)
+
+        # Retrying the running one would duplicate the queued job, which covers it
+        self.assertFalse(run_job(Job.objects.get(pk=running.pk)))
+        self.assertEqual(list(Job.objects.values_list("pk", flat=True)), [queued.pk])
+
+    def test_requeue_stale_jobs(self):
+        stale_at = timezone.now() - timedelta(seconds=120)
+        fresh = enqueue("record")
+        retried = enqueue("record")
+        exhausted = enqueue("record", max_attempts=1)
+        covered = enqueue("record", dedupe_key="record:a")
+        for _ in (fresh, retried, exhausted, covered):
+            claim_job("worker-1")
+        Job.objects.exclude(pk=fresh.pk).update(locked_at=stale_at)
+        duplicate = enqueue("record", dedupe_key="record:a")
+
+        self.assertEqual(requeue_stale_jobs(), 2)
+        statuses = dict(Job.objects.values_list("pk", "status"))
+        self.assertEqual(statuses, {
+            fresh.pk: Job.RUNNING,
+            retried.pk: Job.QUEUED,
+            exhausted.pk: Job.FAILED,
+            duplicate.pk: Job.QUEUED,
+        })
+        retried.refresh_from_db()
+        self.assertEqual((retried.locked_by, retried.locked_at, retried.attempts), ("", None, 1))
+
+    def test_set_location_enqueues_geocoding(self):
+        response = self.client.post(reverse("set_location"), {"lat": "-1.2800", "lng": "36.8200"})
+        self.assertEqual(response.json()["status"], "success")
+        slug = "user-location--1-2800-36-8200"
+        job = Job.objects.get(kind="geocode_place")
+        self.assertEqual((job.payload, job.dedupe_key), ({"slug": slug}, f"geocode_place:{slug}"))
+
+        with mock.patch("trips.tasks.get_neighbourhood", return_value="Upper Hill"):
+            self.assertTrue(run_job(claim_job("worker-1")))
+        self.assertEqual(Place.objects.get(pk=slug).neighbourhood, "Upper Hill")
+
+    def test_geocoding_failure_is_retried(self):
+        make_place("jobville-park", "jobville", "Centre", -1.2800, 36.8200)
+        job = enqueue("geocode_place", {"slug": "jobville-park"})
+        with mock.patch("trips.tasks.get_neighbourhood", return_value="Unknown"):
+            self.assertFalse(run_job(claim_job("worker-1")))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(Place.objects.get(pk="jobville-park").neighbourhood, "Centre")
+
+
+class NeighbourhoodStatsTests(TestCase):
+    region = "statsville"
+
+    @classmethod
+    def setUpTestData(cls):
+        make_place("statsville-park", cls.region, "Centre", -1.2800, 36.8200)
+        make_place("statsville-museum", cls.region, "Centre", -1.2900, 36.8300, category="Museum")
+
+    def stats(self, name):
+        return NeighbourhoodStats.objects.get(region=self.region, name=name)
+
+    def assertStats(self, name, count, categories, center=None):
+        stats = self.stats(name)
+        self.assertEqual(stats.place_count, count)
+        self.assertEqual(stats.category_counts, categories)
+        if center is not None:
+            self.assertAlmostEqual(stats.lat_sum / count, center[0])
+            self.assertAlmostEqual(stats.lng_sum / count, center[1])
+
+    def test_create(self):
+        self.assertStats("Centre", 2, {"Park": 1, "Museum": 1}, center=(-1.2850, 36.8250))
+        make_place("statsville-cafe", self.region, "Hill", -1.3000, 36.8000, category="Cafe")
+        self.assertStats("Hill", 1, {"Cafe": 1}, center=(-1.3000, 36.8000))
+        self.assertEqual(self.stats("Hill").updated_seq, get_dataset_version())
+
+    def test_move(self):
+        place = Place.objects.get(pk="statsville-museum")
+        place.neighbourhood = "Hill"
+        place.save()
+        self.assertStats("Centre", 1, {"Park": 1}, center=(-1.2800, 36.8200))
+        self.assertEqual(self.stats("Centre").min_lat, -1.2800)
+        self.assertStats("Hill", 1, {"Museum": 1}, center=(-1.2900, 36.8300))
+
+    def test_reassigning_an_existing_slug_updates_rather_than_adds(self):
+        place = Place.objects.get(pk="statsville-park")
+        Place(
+            slug=place.slug, region=self.region, name=place.name, category="Cafe", neighbourhood="Hill",
+            lat=-1.3000, lng=36.8000, rating=place.rating, price_tier=place.price_tier,
+        ).save()
+        self.assertEqual(Place.objects.filter(region=self.region).count(), 2)
+        self.assertStats("Centre", 1, {"Museum": 1}, center=(-1.2900, 36.8300))
+        self.assertStats("Hill", 1, {"Cafe": 1}, center=(-1.3000, 36.8000))
+
+    def test_delete(self):
+        Place.objects.get(pk="statsville-park").delete()
+        self.assertStats("Centre", 1, {"Museum": 1}, center=(-1.2900, 36.8300))
+        Place.objects.get(pk="statsville-museum").delete()
+        self.assertStats("Centre", 0, {})
+        self.assertIsNone(self.stats("Centre").min_lat)
+
+    def test_a_failed_aggregate_update_rolls_the_write_back(self):
+        version = get_dataset_version()
+        place = Place.objects.get(pk="statsville-park")
+        place.neighbourhood = "Hill"
+        with mock.patch("trips.signals.record_place_saved", side_effect=RuntimeError("Stats failed")):
+            with self.assertRaisesMessage(RuntimeError, "Stats failed"):
+                place.save()
+        with mock.patch("trips.signals.record_place_deleted", side_effect=RuntimeError("Stats failed")):
+            with self.assertRaisesMessage(RuntimeError, "Stats failed"):
+                Place.objects.get(pk="statsville-museum").delete()
+        self.assertEqual(
+            dict(Place.objects.filter(region=self.region).values_list("slug", "neighbourhood")),
+            {"statsville-park": "Centre", "statsville-museum": "Centre"},
+        )
+        self.assertStats("Centre", 2, {"Park": 1, "Museum": 1})
+        self.assertEqual(get_dataset_version(), version)
+
+
+class DeltaSyncTests(TestCase):
+    region = "deltaville"
+    other_region = "deltaville-east"
+
+    @classmethod
+    def setUpTestData(cls):
+        make_place("deltaville-park", cls.region, "Centre", -1.2800, 36.8200)
+
+    def setUp(self):
+        forget_region_caches(self, self.region)
+
+    def deleted_since(self, since, region):
+        return get_changes(since, ["slug"], region).deleted_places
+
+    def changes(self, since):
+        return self.client.get(reverse("geo-data-changes"), {"region": self.region, "since": since})
+
+    def test_changes_since_a_version(self):
+        since = get_dataset_version()
+        make_place("deltaville-museum", self.region, "Hill", -1.2700, 36.8100, category="Museum")
+        make_place("deltaville-cafe", self.region, "Hill", -1.2900, 36.8300, category="Cafe")
+        Place.objects.get(pk="deltaville-cafe").delete()
+        place = Place.objects.get(pk="deltaville-park")
+        place.name = "Renamed Park"
+        place.save()
+        make_place("elsewhere-museum", self.other_region, "Hill", -1.2700, 36.8100)
+
+        changes = get_changes(since, ["slug", "name"], self.region)
+        self.assertEqual(changes.version, get_dataset_version())
+        self.assertEqual(changes.places, [("deltaville-museum", "Deltaville Museum"), ("deltaville-park", "Renamed Park")])
+        self.assertEqual(changes.deleted_places, ["deltaville-cafe"])
+        self.assertEqual(list(changes.neighbourhood_centers), ["Hill"])  # A rename doesn't move Centre
+        self.assertAlmostEqual(changes.neighbourhood_centers["Hill"]["lat"], -1.2700)
+        self.assertEqual(changes.deleted_neighbourhoods, [])
+
+        # Only what changed after a later version
+        changes = get_changes(place.updated_seq - 1, ["slug"], self.region)
+        self.assertEqual((changes.places, changes.deleted_places), ([("deltaville-park",)], []))
+
+    def test_emptied_neighbourhood_is_deleted(self):
+        since = get_dataset_version()
+        Place.objects.get(pk="deltaville-park").delete()
+        changes = get_changes(since, ["slug"], self.region)
+        self.assertEqual((changes.places, changes.deleted_places), ([], ["deltaville-park"]))
+        self.assertEqual((changes.neighbourhood_centers, changes.deleted_neighbourhoods), ({}, ["Centre"]))
+
+    def test_current_version_has_no_changes(self):
+        version = get_dataset_version()
+        changes = get_changes(version, ["slug"], self.region)
+        self.assertEqual(changes.version, version)
+        self.assertEqual((changes.places, changes.deleted_places), ([], []))
+
+    def test_changes_view(self):
+        since = get_dataset_version()
+        make_place("deltaville-museum", self.region, "Hill", -1.2700, 36.8100, category="Museum")
+        body = self.changes(since).json()
+        self.assertFalse(body["full"])
+        self.assertEqual((body["since"], body["version"]), (since, get_dataset_version()))
+        self.assertEqual([place["id"] for place in body["places"]], ["deltaville-museum"])
+        self.assertEqual((body["deletedPlaces"], body["deletedNeighbourhoods"]), ([], []))
+        self.assertEqual(list(body["neighbourhoodCenters"]), ["Hill"])
+        self.assertTrue(body["transportTable"])
+
+        body = self.changes(get_dataset_version()).json()
+        self.assertEqual((body["full"], body["places"], body["transportTable"]), (False, [], {}))
+
+    def test_changes_view_falls_back_to_a_full_payload(self):
+        since = get_dataset_version()
+        Place.objects.get(pk="deltaville-park").delete()
+        make_place("deltaville-museum", self.region, "Hill", -1.2700, 36.8100, category="Museum")
+        self.assertEqual(prune_tombstones(timezone.now() + timedelta(seconds=1)), 1)
+
+        body = self.changes(since).json()  # Below the sync floor: the delete may be missed
+        self.assertTrue(body["full"])
+        self.assertEqual([place["id"] for place in body["places"]], ["deltaville-museum"])
+        self.assertEqual(body["version"], get_dataset_version())
+        self.assertIn("Hill", body["neighbourhoodCenters"])
+
+        self.assertTrue(self.changes(get_dataset_version() + 1).json()["full"])  # From the future
+        self.assertFalse(self.changes(get_dataset_version()).json()["full"])
+
+    def test_changes_view_rejects_a_bad_since(self):
+        for since in ("", "x", "-1", "1.5"):
+            with self.subTest(since=since):
+                response = self.changes(since)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()["status"], "error")
+
+    def test_moving_then_editing_keeps_the_old_regions_tombstone(self):
+        since = get_dataset_version()
+        place = Place.objects.get(pk="deltaville-park")
+        place.region = self.other_region
+        place.save()
+        place.name = "Renamed Park"
+        place.save()
+        self.assertEqual(self.deleted_since(since, self.region), ["deltaville-park"])
+        self.assertEqual(self.deleted_since(since, self.other_region), [])
+
+    def test_deleting_after_a_move_tombstones_both_regions(self):
+        place = Place.objects.get(pk="deltaville-park")
+        place.region = self.other_region
+        place.save()
+        moved_seq = PlaceTombstone.objects.get(slug="deltaville-park", region=self.region).deleted_seq
+        place.delete()
+        self.assertEqual(
+            dict(PlaceTombstone.objects.filter(slug="deltaville-park").values_list("region", "deleted_seq")),
+            {self.region: moved_seq, self.other_region: get_dataset_version()},
+        )
+
+    def test_moving_back_clears_only_the_new_regions_tombstone(self):
+        place = Place.objects.get(pk="deltaville-park")
+        place.region = self.other_region
+        place.save()
+        place.region = self.region
+        place.save()
+        self.assertEqual(
+            list(PlaceTombstone.objects.filter(slug="deltaville-park").values_list("region", flat=True)),
+            [self.other_region],
+        )
+
+
+class PrecompressedStaticTests(TemporaryDirectoryMixin, SimpleTestCase):
+    def setUp(self):
+        self.root = self.make_temporary_directory()
+        files = {
+            "app.js": b"identity", "app.js.gz": b"gzip", "app.js.br": b"br",
+            "app.3f2a9c1b7d4e.js": b"identity", "app.3f2a9c1b7d4e.js.gz": b"gzip",
+            "plain.txt": b"plain", "orphan.js.gz": b"gzip",
+        }
+        for name, content in files.items():
+            (self.root / name).write_bytes(content)
+        (self.root / "sub").mkdir()
+        self.mtime = os.stat(self.root / "app.js").st_mtime
+
+        static = override_settings(STATIC_ROOT=str(self.root), STATIC_URL="/static/", STATIC_CACHE_MAX_AGE=1000)
+        static.enable()
+        self.addCleanup(static.disable)
+        storage = mock.patch(
+            "trips.middleware.staticfiles_storage",
+            mock.Mock(hashed_files={"app.js": "app.3f2a9c1b7d4e.js", "plain.txt": "plain.txt"}),
+        )
+        storage.start()
+        self.addCleanup(storage.stop)
+        self.middleware = PrecompressedStaticMiddleware(lambda request: HttpResponse("next"))
+
+    def get(self, path, method="get", **headers):
+        response = self.middleware(getattr(RequestFactory(), method)(path, headers=headers))
+        self.addCleanup(response.close)
+        return response
+
+    @staticmethod
+    def read(response):
+        return b"".join(response.streaming_content) if response.streaming else response.content
+
+    def test_accept_encoding_negotiation(self):
+        for accept, encoding in (
+            ("gzip, br", "br"),
+            ("gzip", "gzip"),
+            ("br;q=0, gzip;q=0.5", "gzip"),
+            ("gzip;q=0", None),
+            ("gzip; q=0.0, br;q=bogus", None),
+            ("identity", None),
+            ("", None),
+            ("*", "br"),
+            ("*, br;q=0", "gzip"),
+            ("GZIP", "gzip"),
+        ):
+            with self.subTest(accept):
+                response = self.get("/static/app.js", **{"Accept-Encoding": accept})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get("Content-Encoding"), encoding)
+                self.assertEqual(self.read(response), (encoding or "identity").encode())
+                self.assertIn("javascript", response["Content-Type"])
+                self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    def test_vary_only_with_variants(self):
+        self.assertNotIn("Vary", self.get("/static/plain.txt", **{"Accept-Encoding": "gzip"}))
+
+    def test_cache_control(self):
+        response = self.get("/static/app.3f2a9c1b7d4e.js", **{"Accept-Encoding": "gzip, br"})
+        self.assertEqual(response["Cache-Control"], "public, max-age=1000, immutable")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(self.get("/static/app.js")["Cache-Control"], "no-cache")
+        self.assertEqual(self.get("/static/plain.txt")["Cache-Control"], "no-cache")
+
+    def test_not_modified(self):
+        response = self.get("/static/app.js", **{"If-Modified-Since": http_date(self.mtime)})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        response = self.get("/static/app.js", **{"If-Modified-Since": http_date(self.mtime - 60)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Last-Modified"], http_date(self.mtime))
+
+    def test_head(self):
+        response = self.get("/static/app.js", method="head", **{"Accept-Encoding": "gzip"})
+        self.assertEqual((response.status_code, response["Content-Encoding"]), (200, "gzip"))
+
+    def test_falls_through_for_files_not_in_static_root(self):
+        for path in ("/static/missing.js", "/static/orphan.js", "/static/sub", "/static/../app.js", "/app.js"):
+            with self.subTest(path):
+                self.assertEqual(self.read(self.get(path)), b"next")
+        self.assertEqual(self.read(self.get("/static/app.js", method="post")), b"next")
+        with override_settings(STATIC_ROOT=None):
+            middleware = PrecompressedStaticMiddleware(lambda request: HttpResponse("next"))
+        self.assertEqual(middleware(RequestFactory().get("/static/app.js")).content, b"next")
+
+
+class CompressedStorageTests(TemporaryDirectoryMixin, SimpleTestCase):
+    script = b"function greet(name) { return 'Hello, ' + name; }\n" * 50
+
+    def setUp(self):
+        self.source = self.make_temporary_directory()
+        self.root = self.make_temporary_directory()
+        (self.source / "app.js").write_bytes(self.script)
+        (self.source / "tiny.css").write_bytes(b"body { margin: 0; }")
+        (self.source / "logo.png").write_bytes(self.script)  # Not a text asset
+        (self.source / "noise.ico").write_bytes(random.Random(3).randbytes(4000))  # Incompressible
+        self.suffixes = [".br", ".gz"] if storage.brotli is not None else [".gz"]
+
+    def collectstatic(self):
+        with override_settings(
+            STATIC_ROOT=str(self.root),
+            STATICFILES_DIRS=[str(self.source)],
+            STATICFILES_FINDERS=["django.contrib.staticfiles.finders.FileSystemFinder"],
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "trips.storage.CompressedManifestStaticFilesStorage"},
+            },
+        ):
+            call_command("collectstatic", "--noinput", verbosity=0)
+            return json.loads((self.root / "staticfiles.json").read_text())["paths"]
+
+    def variants(self, name):
+        return sorted(path.name[len(name):] for path in self.root.glob(f"{name}.*") if path.name != name)
+
+    def test_collectstatic_writes_variants_of_original_and_hashed_names(self):
+        hashed = self.collectstatic()["app.js"]
+        self.assertRegex(hashed, r"^app\.[0-9a-f]{12}\.js$")
+        for name in ("app.js", hashed):
+            self.assertEqual(self.variants(name), self.suffixes)
+            self.assertEqual(gzip.decompress((self.root / f"{name}.gz").read_bytes()), self.script)
+        self.assertEqual(self.variants("tiny.css"), [])
+        self.assertEqual([p.name for p in self.root.glob("logo*.png.*")], [])
+        self.assertEqual([p.name for p in self.root.glob("noise*.ico.*")], [])
+
+    def test_compress_file_skips_fresh_variants_and_drops_stale_ones(self):
+        path = self.source / "app.js"
+        self.assertEqual(compress_file(str(path)), len(self.suffixes))
+        self.assertEqual(compress_file(str(path)), 0)
+
+        path.write_bytes(random.Random(5).randbytes(4000))
+        future = os.stat(path).st_mtime + 10
+        os.utime(path, (future, future))
+        self.assertEqual(compress_file(str(path)), 0)
+        self.assertEqual(sorted(p.name for p in self.source.glob("app.js.*")), [])
+
+    def test_middleware_serves_collected_files(self):
+        hashed = self.collectstatic()["app.js"]
+        with override_settings(STATIC_ROOT=str(self.root), STATIC_URL="/static/"):
+            middleware = PrecompressedStaticMiddleware(lambda request: HttpResponse("next"))
+            with mock.patch("trips.middleware.staticfiles_storage", mock.Mock(hashed_files={"app.js": hashed})):
+                response = middleware(RequestFactory().get(f"/static/{hashed}", headers={"Accept-Encoding": "gzip"}))
+        body = b"".join(response.streaming_content)
+        response.close()
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(gzip.decompress(body), self.script)
+
+
+@mock.patch.object(synthetic, "CHUNK_SIZE", 250)
+class SyntheticPlacesTests(TemporaryDirectoryMixin, SimpleTestCase):
+    center = (-1.286389, 36.817223)
+
+    def neighbourhoods(self, seed=1):
+        return synthetic.make_neighbourhoods("Synth", 20, *self.center, seed)
+
+    def generate(self, count, seed=1):
+        return [list(chunk) for chunk in synthetic.generate_places("synth", self.neighbourhoods(seed), count, seed)]
+
+    def test_same_seed_same_rows(self):
+        self.assertEqual(self.neighbourhoods(), self.neighbourhoods())
+        self.assertAlmostEqual(sum(n.weight for n in self.neighbourhoods()), 1.0)
+        chunks = self.generate(1000)
+        self.assertEqual([len(chunk) for chunk in chunks], [250] * 4)
+        self.assertEqual(self.generate(1000), chunks)
+        self.assertNotEqual(self.generate(1000, seed=2), chunks)
+
+    def test_chunks_depend_only_on_their_start(self):
+        chunks = self.generate(1000)
+        # A shorter run shares every whole chunk
+        self.assertEqual(self.generate(600)[:2], chunks[:2])
+        self.assertEqual(synthetic.generate_chunk("synth", self.neighbourhoods(), 500, 250, 1), chunks[2])
+
+    def test_schema(self):
+        rows = [row for chunk in self.generate(1000) for row in chunk]
+        names = {n.name for n in self.neighbourhoods()}
+        self.assertEqual([row[0] for row in rows], [f"synth-{i}" for i in range(1, 1001)])
+        for row in rows:
+            self.assertEqual(len(row), len(PLACE_FILE_FIELDS))
+            place = dict(zip(PLACE_FILE_FIELDS, row))
+            self.assertIn(place["category"], synthetic.CATEGORIES)
+            self.assertIn(place["neighbourhood"], names)
+            self.assertTrue(place["name"].startswith(place["neighbourhood"]))
+            self.assertLess(abs(place["lat"] - self.center[0]), 1)
+            self.assertLess(abs(place["lng"] - self.center[1]), 1)
+            self.assertIn(place["price_tier"], synthetic.PRICE_TIERS)
+            for field in ("entry_fee", "avg_food"):
+                self.assertIsInstance(place[field], int)
+                self.assertEqual(place[field] % 50, 0)
+                self.assertGreaterEqual(place[field], 0)
+            if place["price_tier"] == "Free":
+                self.assertEqual(place["entry_fee"], 0)
+            self.assertIn(place["duration_min"], range(15, 301, 15))
+            self.assertTrue(3.0 <= place["rating"] <= 5.0)
+            self.assertTrue(0.05 <= place["popularity"] <= 0.99)
+            self.assertTrue(place["tags"] and set(place["tags"]) <= set(synthetic.TAGS))
+            self.assertTrue(place["vibes"] and set(place["vibes"]) <= set(synthetic.VIBES))
+
+    def test_rows_round_trip_through_a_places_file(self):
+        rows = self.generate(300)[0][:50]
+        path = self.make_temporary_directory() / "synth.ndjson"
+        with open(path, "wb") as stream:
+            self.assertEqual(write_places(stream, "ndjson", rows), 50)
+        places = read_places(str(path))
+        self.assertEqual(
+            [tuple(place[field] for field in PLACE_FILE_FIELDS) for place in places],
+            [(*row[:11], list(row[11]), list(row[12]), row[13]) for row in rows],
+        )
+
+
+class PlanCacheTests(TemporaryDirectoryMixin, SimpleTestCase):
+    query = normalize("nairobi", "Westlands", 2049, 250, ["Park"], ["Chill"], "street food")
+
+    def lookup(self, cache):
+        return cache.get_or_build(self.query, 1, lambda: b"plan")
+
+    def test_local_memory_backend_is_not_used_as_a_shared_tier(self):
+        first, second = PlanCache(8, "default", 60), PlanCache(8, "default", 60)
+        self.assertIsNone(first.shared_cache())
+        self.assertEqual(self.lookup(first), (b"plan", "miss"))
+        self.assertEqual(self.lookup(first), (b"plan", "local"))
+        self.assertEqual(self.lookup(second), (b"plan", "miss"))
+        self.assertFalse(first.stats()["sharedTier"])
+
+    def test_shared_backend_serves_other_processes(self):
+        location = str(self.make_temporary_directory())
+        with override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location,
+        }}):
+            first, second = PlanCache(8, "default", 60), PlanCache(8, "default", 60)
+            self.assertEqual(self.lookup(first), (b"plan", "miss"))
+            self.assertEqual(self.lookup(second), (b"plan", "shared"))
+            self.assertEqual(self.lookup(second), (b"plan", "local"))
+            self.assertTrue(second.stats()["sharedTier"])
@@ -0,0 +1,77 @@
+"""
+Neighbourhood-to-neighbourhood transport table of the geo-data payload.
+
+The table comes from one ``calculate_transport_matrix`` call over the
+neighbourhood centers: with straight-line distances a distance matrix and a
+lookup into the compiled travel model, with the road graph one search per
+center. Each region's last table per hour of the day is kept per process
+and reused while its neighbourhood centers are unchanged.
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .travel_model import get_travel_model
+from .utils import calculate_transport_matrix
+
+
+def build_transport_table(neighbourhood_centers: dict, touching=None, hour: Optional[int] = None) -> dict:
+    """
+    Build the transport table between neighbourhoods, leaving at ``hour``
+    of the day or at no particular time. With ``touching``, only pairs with
+    an origin or destination in that set are included.
+    """
+    names = list(neighbourhood_centers.keys())
+    lats = np.array([neighbourhood_centers[name]["lat"] for name in names], dtype=np.float64)
+    lngs = np.array([neighbourhood_centers[name]["lng"] for name in names], dtype=np.float64)
+    modes, fares, minutes = calculate_transport_matrix(lats, lngs, lats, lngs, hour)
+    modes, fares, minutes = modes.tolist(), fares.tolist(), minutes.tolist()
+    mode_names = get_travel_model().names
+
+    transport_table = {}
+    for i, origin in enumerate(names):
+        for j, dest in enumerate(names):
+            if i == j or (touching is not None and origin not in touching and dest not in touching):
+                continue
+            transport_table[f"{origin}|{dest}"] = {
+                "mode": mode_names[modes[i][j]],
+                "fare": fares[i][j],
+                "minutes": minutes[i][j],
+            }
+    return transport_table
+
+
+def _centers_key(neighbourhood_centers: dict) -> tuple:
+    return tuple((name, c["lat"], c["lng"]) for name, c in neighbourhood_centers.items())
+
+
+# Keyed on (region, hour bucket of the travel model)
+_tables: Dict[Tuple[str, int], Tuple[tuple, dict]] = {}
+_tables_lock = threading.Lock()
+
+
+def get_transport_table(region: str, neighbourhood_centers: dict, hour: Optional[int] = None) -> dict:
+    """
+    Return the full transport table of ``region`` leaving at ``hour``,
+    rebuilt only when its centers moved.
+    """
+    key = _centers_key(neighbourhood_centers)
+    slot = (region, get_travel_model().bucket(hour))
+    cached: Optional[Tuple[tuple, dict]] = _tables.get(slot)
+    if cached is None or cached[0] != key:
+        table = build_transport_table(neighbourhood_centers, hour=hour)
+        with _tables_lock:
+            _tables[slot] = (key, table)
+        return table
+    return cached[1]
+
+
+def preload_transport_table(region: str, neighbourhood_centers: dict, table: dict) -> None:
+    """
+    Seed the cache of ``region`` with a table built elsewhere, for no
+    particular time (see ``warm_start``).
+    """
+    with _tables_lock:
+        _tables[(region, get_travel_model().bucket(None))] = (_centers_key(neighbourhood_centers), table)
@@ -0,0 +1,220 @@
+"""
+Place-to-place travel matrix.
+
+``manage.py build_travel_matrix`` runs the ``calculate_transport`` model for
+every ordered pair of places, with no particular time of day, and writes
+the fares, minutes and mode ids as dense ``.npy`` arrays next to a JSON
+manifest holding the slug order, mode names and transport settings. Each
+region has its own directory; each build in it lives in a directory named
+after the dataset fingerprint, and a ``CURRENT`` file points at the active
+one. A build prunes all but the current and previous ones.
+
+Workers open the arrays with ``mmap_mode="r"``, so every process reads the
+same page-cache pages instead of keeping its own copy on the heap. The
+planner prices legs between two places from the matrix (see ``planner``).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .travel_model import get_travel_model, transport_settings
+from .utils import calculate_transport_matrix
+
+MATRIX_DTYPE = np.int32
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+FARES_FILE = "fares.npy"
+MINUTES_FILE = "minutes.npy"
+MODES_FILE = "modes.npy"
+KEEP_BUILDS = 2  # The current build and the one before, which workers may still be opening
+
+
+def dataset_fingerprint(rows: Iterable[Tuple[str, float, float]]) -> str:
+    """
+    Hash the (slug, lat, lng) rows together with the transport settings.
+    Any change to a place position or to the fare/time model yields a new
+    fingerprint, so a stale matrix is never mistaken for a current one.
+    """
+    digest = hashlib.sha1()
+    digest.update(json.dumps(transport_settings(), sort_keys=True).encode() + b"\n")
+    for slug, lat, lng in rows:
+        digest.update(f"{slug}|{lat!r}|{lng!r}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def build_travel_matrix(rows: Sequence[Tuple[str, float, float]], output_dir: Path, *, block_size: int = 512) -> Path:
+    """
+    Build the fare and minutes matrices for ``rows`` into ``output_dir``.
+
+    Rows are written in blocks straight into memory-mapped ``.npy`` files,
+    so peak memory is ``block_size * len(rows)`` cells, not the full matrix.
+    The build goes to a temporary directory that is renamed into place and
+    then made current. Returns the path of the version directory.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    rows = sorted(rows)
+    version = dataset_fingerprint(rows)
+    version_dir = output_dir / version
+
+    if not version_dir.exists():
+        n = len(rows)
+        lats = np.array([r[1] for r in rows], dtype=np.float64)
+        lngs = np.array([r[2] for r in rows], dtype=np.float64)
+
+        model = get_travel_model()
+        tmp_dir = Path(tempfile.mkdtemp(prefix=f".{version}-", dir=output_dir))
+        try:
+            fares = np.lib.format.open_memmap(tmp_dir / FARES_FILE, mode="w+", dtype=MATRIX_DTYPE, shape=(n, n))
+            minutes = np.lib.format.open_memmap(tmp_dir / MINUTES_FILE, mode="w+", dtype=MATRIX_DTYPE, shape=(n, n))
+            modes = np.lib.format.open_memmap(tmp_dir / MODES_FILE, mode="w+", dtype=np.uint8, shape=(n, n))
+
+            for start in range(0, n, block_size):
+                stop = min(start + block_size, n)
+                modes[start:stop], fares[start:stop], minutes[start:stop] = calculate_transport_matrix(
+                    lats[start:stop], lngs[start:stop], lats, lngs
+                )
+
+            for array in (fares, minutes, modes):
+                array.flush()
+            del fares, minutes, modes
+
+            manifest = {
+                "version": version,
+                "modes": model.names,
+                "transport": transport_settings(),
+                "slugs": [r[0] for r in rows],
+            }
+            with open(tmp_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+
+            os.replace(tmp_dir, version_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    try:
+        previous = (output_dir / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        previous = None
+
+    # Point CURRENT at the new build atomically
+    tmp_current = output_dir / f".{CURRENT_FILE}.tmp"
+    tmp_current.write_text(version, encoding="utf-8")
+    os.replace(tmp_current, output_dir / CURRENT_FILE)
+
+    prune_travel_matrices(output_dir, keep={version, previous})
+    return version_dir
+
+
+def prune_travel_matrices(output_dir: Path, keep: Iterable[Optional[str]]) -> List[Path]:
+    """
+    Remove the build directories of ``output_dir`` not named in ``keep``.
+    Builds in progress (dot-prefixed temporary directories) are left alone.
+    Returns the removed paths.
+    """
+    keep = set(keep)
+    removed = []
+    for path in Path(output_dir).iterdir():
+        if path.is_dir() and not path.name.startswith(".") and path.name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+
+class TravelMatrix:
+    """
+    Read-only view over a built matrix. ``lookup`` is two dict hits and
+    three array reads, with no trigonometry.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        mode_names: Sequence[str],
+        slugs: Sequence[str],
+        fares: np.ndarray,
+        minutes: np.ndarray,
+        modes: np.ndarray,
+        transport: Optional[dict] = None,
+    ):
+        self.version = version
+        self.transport = transport
+        self.mode_names = list(mode_names)
+        self.slugs = list(slugs)
+        self.index = {slug: i for i, slug in enumerate(self.slugs)}
+        self.fares = fares
+        self.minutes = minutes
+        self.modes = modes
+
+    def __len__(self) -> int:
+        return len(self.slugs)
+
+    def __contains__(self, slug: str) -> bool:
+        return slug in self.index
+
+    def lookup(self, origin: str, destination: str, hour: Optional[int] = None) -> Optional[Tuple[str, int, int]]:
+        """
+        Return (mode, fare, minutes) between two place slugs, matching
+        ``calculate_transport``, or None if either slug is not in the matrix.
+        At an ``hour`` of the day the minutes are scaled by that mode's
+        slowdown (``TravelModel.at_hour``).
+        """
+        i = self.index.get(origin)
+        j = self.index.get(destination)
+        if i is None or j is None:
+            return None
+        mode, minutes = int(self.modes[i, j]), int(self.minutes[i, j])
+        if hour is not None:
+            minutes = get_travel_model().at_hour(minutes, mode, hour)
+        return self.mode_names[mode], int(self.fares[i, j]), minutes
+
+
+def load_travel_matrix(version_dir: Path) -> TravelMatrix:
+    """Open a built matrix with memory-mapped arrays."""
+    version_dir = Path(version_dir)
+    with open(version_dir / MANIFEST_FILE, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    fares = np.load(version_dir / FARES_FILE, mmap_mode="r")
+    minutes = np.load(version_dir / MINUTES_FILE, mmap_mode="r")
+    modes = np.load(version_dir / MODES_FILE, mmap_mode="r")
+    if fares.shape != (len(manifest["slugs"]),) * 2 or not fares.shape == minutes.shape == modes.shape:
+        raise ValueError(f"Travel matrix in {version_dir} does not match its manifest.")
+
+    return TravelMatrix(
+        manifest["version"], manifest["modes"], manifest["slugs"], fares, minutes, modes, manifest.get("transport")
+    )
+
+
+_matrices: Dict[str, TravelMatrix] = {}
+
+
+def get_travel_matrix(region: str) -> Optional[TravelMatrix]:
+    """
+    Return the current matrix of ``region`` for this process, reopening it
+    when the region's ``CURRENT`` points at a new build. Returns None if no
+    matrix has been built for the region yet, or if it was built with other
+    transport settings than this process has.
+    """
+    output_dir = Path(settings.TRAVEL_MATRIX_DIR) / region
+    try:
+        version = (output_dir / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+
+    matrix = _matrices.get(region)
+    if matrix is None or matrix.version != version:
+        matrix = _matrices[region] = load_travel_matrix(output_dir / version)
+    if matrix.transport != transport_settings():
+        return None
+    return matrix
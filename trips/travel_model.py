@@ -0,0 +1,283 @@
+"""
+Time-dependent travel model: walking, matatu, boda and taxi.
+
+Each mode in ``settings.TRAVEL_MODES`` has a pace (minutes per km when the
+roads are clear), a fare (base plus per km, with a minimum) and optionally a
+longest distance it is used for, which is how walking is limited to short
+hops. ``settings.TRAVEL_CONGESTION`` gives a slowdown per hour of the day;
+a mode feels ``congestion`` of it (1 for a matatu stuck in traffic, less for
+a boda weaving through it, 0 on foot).
+
+When the road graph gives a trip's free-flow driving minutes, a mode with a
+``road_time_factor`` takes those minutes scaled by the factor and by its
+share of the slowdown instead of its pace; fares still follow the distance.
+
+The model is compiled once per process into dense tables indexed by
+(hour bucket, mode, distance bin) — one bucket per hour plus ``BASELINE``
+for trips with no time of day, which has no slowdown — together with the
+mode each preference picks per (hour bucket, distance bin). An estimate is
+then a bin computation and a few array reads. Bins are
+``TRAVEL_TABLE_KM_STEP`` wide and evaluated at their middle; trips beyond
+``TRAVEL_TABLE_MAX_KM`` fall back to evaluating the formula.
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+TABLE_DTYPE = np.int32
+
+HOURS = 24
+BASELINE = HOURS  # Hour bucket of trips with no time of day
+
+# How the mode of a trip is picked among those allowed at its distance:
+# lowest fare then fewest minutes, or the other way round
+PREFERENCES = ("cheapest", "fastest")
+
+
+class TravelMode(NamedTuple):
+    name: str
+    minutes_per_km: float
+    fare_per_km: float = 0.0
+    base_fare: float = 0.0
+    min_fare: float = 0.0
+    max_km: float = math.inf  # Not used for longer trips
+    congestion: float = 1.0  # Share of the hourly slowdown this mode feels
+    road_time_factor: Optional[float] = None  # Times the road graph's driving minutes; None keeps the pace
+
+
+def _evaluate(mode: TravelMode, km: np.ndarray, slowdown: float) -> Tuple[np.ndarray, np.ndarray]:
+    """(fares, minutes) of ``mode`` over ``km`` at a slowdown, truncated to ints like the flat model."""
+    fares = np.maximum(mode.min_fare, mode.base_fare + km * mode.fare_per_km)
+    minutes = km * mode.minutes_per_km * (1 + (slowdown - 1) * mode.congestion)
+    moving = km > 0
+    return (
+        np.where(moving, fares, 0).astype(TABLE_DTYPE),
+        np.where(moving, np.maximum(1, minutes), 0).astype(TABLE_DTYPE),
+    )
+
+
+class TravelModel:
+    def __init__(
+        self,
+        modes: Sequence[TravelMode],
+        congestion: Sequence[float],
+        km_step: float,
+        max_km: float,
+        preference: str = "cheapest",
+    ):
+        if preference not in PREFERENCES:
+            raise ImproperlyConfigured(f"TRAVEL_MODE_PREFERENCE must be one of {', '.join(PREFERENCES)}.")
+        if not modes or all(mode.max_km < max_km for mode in modes):
+            raise ImproperlyConfigured("TRAVEL_MODES needs a mode without max_km.")
+        if len(congestion) != HOURS:
+            raise ImproperlyConfigured(f"TRAVEL_CONGESTION needs {HOURS} hourly values.")
+
+        self.preference = preference
+        self.modes = list(modes)
+        self.names = [mode.name for mode in self.modes]
+        self.mode_index = {name: m for m, name in enumerate(self.names)}
+        self.slowdowns = np.array([*congestion, 1.0], dtype=np.float64)
+        self.km_step = km_step
+        self.max_km = max_km
+        self.bins = math.ceil(max_km / km_step)
+
+        km = (np.arange(self.bins) + 0.5) * km_step
+        shape = (len(self.slowdowns), len(self.modes), self.bins)
+        self.fares = np.empty(shape, dtype=TABLE_DTYPE)
+        self.minutes = np.empty(shape, dtype=TABLE_DTYPE)
+        for b, slowdown in enumerate(self.slowdowns):
+            for m, mode in enumerate(self.modes):
+                self.fares[b, m], self.minutes[b, m] = _evaluate(mode, km, slowdown)
+
+        # The pick of each preference per (hour bucket, bin), from a lexicographic key
+        allowed = np.array([km <= mode.max_km for mode in self.modes])
+        self.choice = {}
+        for preference, (first, second) in zip(PREFERENCES, ((self.fares, self.minutes), (self.minutes, self.fares))):
+            key = first.astype(np.int64) << 32 | second.astype(np.int64)
+            key[:, ~allowed] = np.iinfo(np.int64).max
+            self.choice[preference] = key.argmin(axis=1).astype(np.uint8)
+        # Beyond the tables only unlimited modes are left
+        self._far_modes = [m for m, mode in enumerate(self.modes) if mode.max_km >= max_km]
+        self._max_km = np.array([mode.max_km for mode in self.modes], dtype=np.float64)
+
+        # Slowdown each mode feels per (hour bucket, mode), and the multiplier
+        # of road-graph minutes (NaN for modes that keep their pace)
+        self.mode_slowdowns = 1 + (self.slowdowns[:, None] - 1) * np.array([mode.congestion for mode in self.modes])
+        factors = np.array([np.nan if mode.road_time_factor is None else mode.road_time_factor for mode in self.modes])
+        self.road_scale = factors[None, :] * self.mode_slowdowns
+
+    def bucket(self, hour: Optional[int]) -> int:
+        """Table row of an hour of the day (0-23); None is ``BASELINE``."""
+        return BASELINE if hour is None else int(hour) % HOURS
+
+    def at_hour(self, minutes: int, mode: int, hour: Optional[int]) -> int:
+        """Minutes of an untimed trip in mode index ``mode``, leaving at ``hour`` instead."""
+        return int(minutes * self.mode_slowdowns[self.bucket(hour), mode])
+
+    def estimate(
+        self,
+        km: float,
+        hour: Optional[int] = None,
+        preference: Optional[str] = None,
+        mode: Optional[str] = None,
+        road_minutes: Optional[float] = None,
+    ) -> Tuple[str, int, int]:
+        """
+        (mode, fare, minutes) of a trip of ``km`` at ``hour``, in ``mode`` or
+        else in the mode ``preference`` (default: the model's) picks.
+        ``road_minutes`` is the road graph's driving time of the trip, if known.
+        """
+        if km >= self.max_km or road_minutes is not None:
+            road = None if road_minutes is None else np.array([road_minutes])
+            modes, fares, minutes = self.estimate_many(np.array([km]), hour, preference, mode, road)
+            return self.names[modes[0]], int(fares[0]), int(minutes[0])
+        b = self.bucket(hour)
+        i = int(km / self.km_step) if km > 0 else 0
+        if mode is not None:
+            m = self.mode_index[mode]
+        else:
+            m = int(self.choice[preference or self.preference][b, i])
+        if km <= 0:
+            return self.names[m], 0, 0
+        return self.names[m], int(self.fares[b, m, i]), int(self.minutes[b, m, i])
+
+    def estimate_many(
+        self,
+        km: np.ndarray,
+        hour: Optional[int] = None,
+        preference: Optional[str] = None,
+        mode: Optional[str] = None,
+        road_minutes: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized ``estimate``: arrays of mode indices (into ``names``), fares and minutes."""
+        km = np.asarray(km, dtype=np.float64)
+        b = self.bucket(hour)
+        if road_minutes is not None:
+            shape = km.shape
+            modes, fares, minutes = self._estimate_road(
+                km.ravel(), np.asarray(road_minutes, dtype=np.float64).ravel(), b, preference or self.preference, mode
+            )
+            return modes.reshape(shape), fares.reshape(shape), minutes.reshape(shape)
+        bins = np.minimum(np.maximum(km, 0) / self.km_step, self.bins - 1).astype(np.int64)
+        if mode is not None:
+            modes = np.full(km.shape, self.mode_index[mode], dtype=np.uint8)
+        else:
+            modes = self.choice[preference or self.preference][b, bins]
+        fares = self.fares[b, modes, bins]
+        minutes = self.minutes[b, modes, bins]
+
+        far = km >= self.max_km
+        if far.any():
+            if mode is None:
+                # Pick among the unlimited modes as the tables do
+                options = [_evaluate(self.modes[m], km[far], self.slowdowns[b]) for m in self._far_modes]
+                first, second = (0, 1) if (preference or self.preference) == "cheapest" else (1, 0)
+                keys = np.array([o[first].astype(np.int64) << 32 | o[second] for o in options])
+                best = keys.argmin(axis=0)
+                modes[far] = np.array(self._far_modes, dtype=np.uint8)[best]
+                picked = np.arange(len(best))
+                fares[far] = np.array([o[0] for o in options])[best, picked]
+                minutes[far] = np.array([o[1] for o in options])[best, picked]
+            else:
+                fares[far], minutes[far] = _evaluate(self.modes[modes[0]], km[far], self.slowdowns[b])
+
+        stopped = km <= 0
+        fares[stopped] = 0
+        minutes[stopped] = 0
+        return modes, fares, minutes
+
+    def _estimate_road(
+        self, km: np.ndarray, road_minutes: np.ndarray, b: int, preference: str, mode: Optional[str]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Every mode's (fare, minutes) per trip, then the pick; the choice
+        # tables assume paced minutes, so they don't apply here
+        bins = np.minimum(np.maximum(km, 0) / self.km_step, self.bins - 1).astype(np.int64)
+        fares = self.fares[b][:, bins]
+        minutes = self.minutes[b][:, bins]
+        far = km >= self.max_km
+        if far.any():
+            for m, travel_mode in enumerate(self.modes):
+                fares[m, far], minutes[m, far] = _evaluate(travel_mode, km[far], self.slowdowns[b])
+        scale = self.road_scale[b]
+        on_road = ~np.isnan(scale)
+        minutes[on_road] = np.maximum(1, road_minutes[None, :] * scale[on_road, None]).astype(TABLE_DTYPE)
+
+        if mode is not None:
+            modes = np.full(km.shape, self.mode_index[mode], dtype=np.uint8)
+        else:
+            first, second = (fares, minutes) if preference == "cheapest" else (minutes, fares)
+            key = first.astype(np.int64) << 32 | second.astype(np.int64)
+            key[km[None, :] > self._max_km[:, None]] = np.iinfo(np.int64).max
+            modes = key.argmin(axis=0).astype(np.uint8)
+
+        picked = np.arange(len(km))
+        fares, minutes = fares[modes, picked], minutes[modes, picked]
+        stopped = km <= 0
+        fares[stopped] = 0
+        minutes[stopped] = 0
+        return modes, fares, minutes
+
+
+def model_signature() -> str:
+    """Hash of the settings the model is compiled from, for fingerprints of data built with it."""
+    config = [
+        settings.TRAVEL_MODES,
+        list(settings.TRAVEL_CONGESTION),
+        settings.TRAVEL_MODE_PREFERENCE,
+        settings.TRAVEL_TABLE_KM_STEP,
+        settings.TRAVEL_TABLE_MAX_KM,
+    ]
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def transport_settings() -> dict:
+    """
+    Settings transport estimates depend on; travel matrices and warm-start
+    artifacts built with others are ignored.
+    """
+    result = {
+        "travel_model": settings.TRAVEL_MODEL,
+        "modes": model_signature(),
+    }
+    if settings.TRAVEL_MODEL == "road_graph":
+        try:
+            stat = os.stat(settings.ROAD_GRAPH_PATH)
+            result["road_graph"] = [stat.st_size, int(stat.st_mtime)]
+        except OSError:
+            result["road_graph"] = None
+    return result
+
+
+def _modes(config: dict) -> List[TravelMode]:
+    try:
+        return [TravelMode(name, **spec) for name, spec in config.items()]
+    except TypeError as e:
+        raise ImproperlyConfigured(f"Invalid TRAVEL_MODES: {e}")
+
+
+_model: Optional[TravelModel] = None
+_model_lock = threading.Lock()
+
+
+def get_travel_model() -> TravelModel:
+    """Return this process's travel model, compiled from the ``TRAVEL_*`` settings on first use."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = TravelModel(
+                    _modes(settings.TRAVEL_MODES),
+                    settings.TRAVEL_CONGESTION,
+                    settings.TRAVEL_TABLE_KM_STEP,
+                    settings.TRAVEL_TABLE_MAX_KM,
+                    settings.TRAVEL_MODE_PREFERENCE,
+                )
+    return _model
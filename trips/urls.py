@@ -5,5 +5,16 @@ from . import views
 urlpatterns = [
     path("", views.frontend_view, name="frontend"),
     path("api/geo-data/", views.geo_data, name="geo-data"),
+    path("api/geo-data/changes/", views.geo_data_changes, name="geo-data-changes"),
+    path("api/regions/", views.regions, name="regions"),
     path("api/set-location/", views.set_location, name="set_location"),
+    path("api/route/", views.route, name="route"),
+    path("api/clusters/", views.clusters, name="clusters"),
+    path("api/nearby/", views.nearby, name="nearby"),
+    path("api/plan/", views.plan, name="plan"),
+    path("api/plan/cache-stats/", views.plan_cache_stats, name="plan-cache-stats"),
+    # Async variants, served natively under ASGI (config.asgi)
+    path("api/async/geo-data/", views.geo_data_async, name="geo-data-async"),
+    path("api/async/clusters/", views.clusters_async, name="clusters-async"),
+    path("api/async/events/", views.events, name="events"),
 ]
@@ -1,9 +1,12 @@
 import math
 import requests
-from typing import Tuple
+from typing import Optional, Tuple
 
+import numpy as np
 from django.conf import settings
 
+from .travel_model import get_travel_model
+
 
 def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
     """
@@ -29,16 +32,74 @@ def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> fl
     return R * c
 
 
-def calculate_transport(lat1: float, lng1: float, lat2: float, lng2: float) -> Tuple[str, int, int]:
+def haversine_matrix(lats1: np.ndarray, lngs1: np.ndarray, lats2: np.ndarray, lngs2: np.ndarray) -> np.ndarray:
+    """
+    Vectorised form of ``haversine_distance``.
+    Returns a (len(lats1), len(lats2)) array of distances in kilometers.
+    """
+    lat1 = np.radians(lats1)[:, None]
+    lng1 = np.radians(lngs1)[:, None]
+    lat2 = np.radians(lats2)[None, :]
+    lng2 = np.radians(lngs2)[None, :]
+
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return 6371.0 * c  # Earth's radius in km
+
+
+def calculate_transport(
+    lat1: float, lng1: float, lat2: float, lng2: float, hour: Optional[int] = None
+) -> Tuple[str, int, int]:
     """
-    Calculate transport details between two coordinates.
-    Returns (mode, fare, minutes).
+    Calculate transport details between two coordinates, leaving at ``hour``
+    of the day (0-23) or at no particular time.
+    Returns (mode, fare, minutes) from the travel model (see travel_model).
+
+    With TRAVEL_MODEL = "road_graph" the fastest path in the offline road
+    graph gives the distance and the driving minutes the modes scale;
+    otherwise (or if the graph is missing or has no path) the distance is
+    the straight line and each mode keeps its pace.
     """
+    if settings.TRAVEL_MODEL == "road_graph":
+        from .road_graph import get_road_graph
+
+        graph = get_road_graph()
+        path = graph.route(lat1, lng1, lat2, lng2) if graph is not None else None
+        if path is not None:
+            road_minutes, road_km = path
+            return get_travel_model().estimate(road_km, hour, road_minutes=road_minutes)
+
     distance_km = haversine_distance(lat1, lng1, lat2, lng2)
-    fare = int(distance_km * settings.TRANSPORT_FARE_RATE)  # Round to nearest int
-    minutes = int(distance_km * settings.TRANSPORT_TIME_MULTIPLIER)
-    mode = "Matatu"  # Default mode
-    return mode, fare, minutes
+    return get_travel_model().estimate(distance_km, hour)
+
+
+def calculate_transport_matrix(
+    lats1: np.ndarray, lngs1: np.ndarray, lats2: np.ndarray, lngs2: np.ndarray, hour: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ``calculate_transport`` from every point of (lats1, lngs1) to every
+    point of (lats2, lngs2). Returns arrays of mode indices (into the travel
+    model's ``names``), fares and minutes.
+
+    With TRAVEL_MODEL = "road_graph" the pairs with a path use it, from one
+    ``RoadGraph.matrix`` call instead of a search per pair.
+    """
+    model = get_travel_model()
+    modes, fares, minutes = model.estimate_many(haversine_matrix(lats1, lngs1, lats2, lngs2), hour)
+    if settings.TRAVEL_MODEL == "road_graph":
+        from .road_graph import get_road_graph
+
+        graph = get_road_graph()
+        if graph is not None:
+            road_minutes, road_km = graph.matrix(lats1, lngs1, lats2, lngs2)
+            found = ~np.isnan(road_km)
+            modes[found], fares[found], minutes[found] = model.estimate_many(
+                road_km[found], hour, road_minutes=road_minutes[found]
+            )
+    return modes, fares, minutes
 
 
 def get_neighbourhood(lat: float, lng: float) -> str:
@@ -1,9 +1,32 @@
-from django.http import JsonResponse
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
 
+from .clustering import get_cluster_index, level_zoom
+from .dataset import aget_dataset_version, get_dataset_version
+from .delta import get_changes
+from .events import get_broker
+from .geometry import encode_polyline, simplify, tolerance_for_zoom
+from .jobs import enqueue
 from .models import Place
-from .utils import calculate_transport, get_neighbourhood
+from .nearby import get_nearby_index
+from .neighbourhoods import aget_neighbourhood_centers, get_neighbourhood_centers, nearest_neighbourhood
+from .plan_cache import get_plan_cache, normalize
+from .planner import build_plan
+from .regions import REGION_RE, aregion_exists, list_regions, region_exists
+from .road_routes import allow_request, build_route
+from .serializers import PLACE_API_SPEC, FastJsonResponse, dumps
+from .snapshot import PLACE_COLUMNS, aget_place_snapshot, get_place_snapshot
+from .spatial import EARTH_RADIUS_KM
+from .transport import build_transport_table, get_transport_table
+from .travel_matrix import get_travel_matrix
 
 
 @never_cache
@@ -12,109 +35,441 @@ def frontend_view(request):
     return render(request, 'index.html')
 
 
+def _geo_data_payload(snapshot, neighbourhood_centers):
+    places = PLACE_API_SPEC.serialize(snapshot.rows, PLACE_COLUMNS)
+
+    return {
+        "version": snapshot.version,
+        "neighbourhoodCenters": neighbourhood_centers,
+        "places": places,
+        "transportTable": get_transport_table(snapshot.region, neighbourhood_centers),
+    }
+
+
+def _region_param(params):
+    region = params.get('region') or settings.DEFAULT_REGION
+    if not REGION_RE.fullmatch(region):
+        raise ValueError('Invalid region')
+    return region
+
+
+def _region(params):
+    """
+    Region named by the ``region`` parameter, or the default one. Raises
+    ValueError for a malformed name or a region without places, which
+    would otherwise get an entry in every per-region cache.
+    """
+    region = _region_param(params)
+    if region != settings.DEFAULT_REGION and not region_exists(region):
+        raise ValueError('Unknown region')
+    return region
+
+
+async def _aregion(params):
+    """Async variant of ``_region``."""
+    region = _region_param(params)
+    if region != settings.DEFAULT_REGION and not await aregion_exists(region):
+        raise ValueError('Unknown region')
+    return region
+
+
+def _invalid_region():
+    return JsonResponse({'status': 'error', 'message': 'Invalid region'}, status=400)
+
+
 def geo_data(request):
     """
     Return neighbourhood centers, places, and transport data in the same
     shape that the frontend expects, replacing the hard-coded JS objects.
+    Query param: region (default: settings.DEFAULT_REGION).
     """
-    places_qs = Place.objects.all()
-    places = []
+    try:
+        region = _region(request.GET)
+    except ValueError:
+        return _invalid_region()
 
-    # Collect neighbourhood data
-    neighbourhood_data = {}  # name -> {"places": [], "lat_sum": 0, "lng_sum": 0, "count": 0}
+    # Neighbourhood centers come from the maintained aggregates
+    return FastJsonResponse(_geo_data_payload(get_place_snapshot(region), get_neighbourhood_centers(region)))
 
-    for p in places_qs:
-        neighbourhood = p.neighbourhood or "General"  # Default if blank
 
-        if neighbourhood not in neighbourhood_data:
-            neighbourhood_data[neighbourhood] = {"places": [], "lat_sum": 0.0, "lng_sum": 0.0, "count": 0}
+async def geo_data_async(request):
+    """
+    Async variant of ``geo_data`` for the ASGI entry point. Database reads
+    use the async ORM, so slow clients don't hold a worker thread.
+    """
+    try:
+        region = await _aregion(request.GET)
+    except ValueError:
+        return _invalid_region()
 
-        neighbourhood_data[neighbourhood]["places"].append(p)
-        neighbourhood_data[neighbourhood]["lat_sum"] += p.lat
-        neighbourhood_data[neighbourhood]["lng_sum"] += p.lng
-        neighbourhood_data[neighbourhood]["count"] += 1
+    snapshot = await aget_place_snapshot(region)
+    neighbourhood_centers = await aget_neighbourhood_centers(region)
+    return FastJsonResponse(_geo_data_payload(snapshot, neighbourhood_centers))
 
-        places.append(
-            {
-                "id": p.slug,
-                "name": p.name,
-                "category": p.category,
-                "neighbourhood": neighbourhood,
-                "coords": {"lat": p.lat, "lng": p.lng},
-                "entryFee": p.entry_fee,
-                "avgFood": p.avg_food,
-                "durationMin": p.duration_min,
-                "rating": float(p.rating),
-                "priceTier": p.price_tier,
-                "tags": p.tags or [],
-                "vibes": p.vibes or [],
-                "popularity": float(p.popularity),
-            }
-        )
 
-    # Compute neighbourhood centers
-    neighbourhood_centers = {}
-    for name, data in neighbourhood_data.items():
-        if data["count"] > 0:
-            avg_lat = data["lat_sum"] / data["count"]
-            avg_lng = data["lng_sum"] / data["count"]
-            neighbourhood_centers[name] = {"lat": avg_lat, "lng": avg_lng}
+def regions(request):
+    """List the regions with places, with their place and neighbourhood counts."""
+    return FastJsonResponse({'default': settings.DEFAULT_REGION, 'regions': list_regions()})
+
+
+def geo_data_changes(request):
+    """
+    Return what changed in the geo data since version ``since`` (the
+    ``version`` of the client's last payload): upserted and deleted places,
+    moved or removed neighbourhood centers, and the transport rows touching
+    them. Falls back to the full payload, with "full": true, when ``since``
+    is too old to be served as a delta. Query params: since and region.
+    """
+    try:
+        region = _region(request.GET)
+    except ValueError:
+        return _invalid_region()
+    try:
+        since = int(request.GET.get('since', ''))
+        if since < 0:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Expected since=<version>'}, status=400)
+
+    changes = get_changes(since, PLACE_API_SPEC.columns, region)
+    if changes is None:
+        payload = _geo_data_payload(get_place_snapshot(region), get_neighbourhood_centers(region))
+        return FastJsonResponse({"full": True, **payload})
 
-    # Build transport table between neighbourhoods
-    neighbourhood_names = list(neighbourhood_centers.keys())
+    return FastJsonResponse({"full": False, **_changes_payload(changes, since, region)})
+
+
+def _changes_payload(changes, since, region):
     transport_table = {}
-    for i, origin in enumerate(neighbourhood_names):
-        origin_coords = neighbourhood_centers[origin]
-        for j, dest in enumerate(neighbourhood_names):
-            if i != j:  # No self-loops
-                dest_coords = neighbourhood_centers[dest]
-                mode, fare, minutes = calculate_transport(
-                    origin_coords["lat"], origin_coords["lng"],
-                    dest_coords["lat"], dest_coords["lng"]
-                )
-                key = f"{origin}|{dest}"
-                transport_table[key] = {
-                    "mode": mode,
-                    "fare": fare,
-                    "minutes": minutes,
-                }
-
-    return JsonResponse(
-        {
-            "neighbourhoodCenters": neighbourhood_centers,
-            "places": places,
-            "transportTable": transport_table,
-        }
-    )
+    if changes.neighbourhood_centers:
+        transport_table = build_transport_table(
+            get_neighbourhood_centers(region), touching=changes.neighbourhood_centers
+        )
+
+    return {
+        "since": since,
+        "version": changes.version,
+        "places": PLACE_API_SPEC.serialize(changes.places),
+        "deletedPlaces": changes.deleted_places,
+        "neighbourhoodCenters": changes.neighbourhood_centers,
+        "deletedNeighbourhoods": changes.deleted_neighbourhoods,
+        "transportTable": transport_table,
+    }
+
+
+def _sse_event(event, version, data):
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (version, event.encode(), dumps(data))
+
+
+def _changes_event(since, region):
+    """
+    SSE event bringing a client of ``region`` from ``since`` to the current
+    version, or None if nothing in the region changed.
+    """
+    changes = get_changes(since, PLACE_API_SPEC.columns, region)
+    if changes is None:
+        # Too far behind for a delta; the client refetches /api/geo-data/
+        version = get_dataset_version()
+        return version, _sse_event("resync", version, {"version": version})
+    if not (changes.places or changes.deleted_places or changes.neighbourhood_centers
+            or changes.deleted_neighbourhoods):
+        return changes.version, None
+    return changes.version, _sse_event("changes", changes.version, _changes_payload(changes, since, region))
+
+
+async def _event_stream(since, region):
+    broker = get_broker()
+    async with broker.subscribe() as subscription:
+        yield b"retry: %d\n\n" % settings.EVENTS_RETRY_MS
+        current = await aget_dataset_version()
+        if since is None:
+            since = current
+            yield _sse_event("version", current, {"version": current})
+        subscription.offer(current)  # Catch a resuming client up straight away
+
+        while True:
+            version = await subscription.wait(settings.EVENTS_HEARTBEAT_SECONDS)
+            if version is None:
+                yield b": heartbeat\n\n"
+            elif version > since:
+                since, event = await sync_to_async(_changes_event)(since, region)
+                if event is not None:
+                    yield event
+
+
+async def events(request):
+    """
+    Server-sent events stream of dataset changes, for the ASGI entry point.
+
+    Each "changes" event carries the same delta as /api/geo-data/changes/
+    and has the dataset version as its id, so a reconnecting EventSource
+    resumes via ``Last-Event-ID``. A first connection can pass ``since``
+    (the version of the payload it holds) instead; without either, the
+    stream starts with a "version" event. A "resync" event means the
+    client is too far behind for a delta and must refetch /api/geo-data/.
+    Only changes to ``region`` are sent.
+    """
+    try:
+        region = await _aregion(request.GET)
+    except ValueError:
+        return _invalid_region()
+    since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+    try:
+        since = None if since is None else int(since)
+        if since is not None and since < 0:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Expected a numeric Last-Event-ID or since'}, status=400)
+
+    response = StreamingHttpResponse(_event_stream(since, region), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
 
 
 def set_location(request):
     """
     Set the user's starting location by creating a Place at their coordinates,
-    with neighbourhood determined via reverse geocoding.
+    in the ``region`` POST parameter's region (default: settings.DEFAULT_REGION).
+    The response carries a provisional neighbourhood, the nearest known one;
+    a background job reverse geocodes the real one and updates the place,
+    which clients then receive through delta sync.
     """
     if request.method == 'POST':
         lat = request.POST.get('lat')
         lng = request.POST.get('lng')
         if not lat or not lng:
             return JsonResponse({'status': 'error', 'message': 'Missing lat or lng'})
-        neighbourhood = get_neighbourhood(float(lat), float(lng))
+        try:
+            region = _region(request.POST)
+        except ValueError:
+            return _invalid_region()
+        neighbourhood = nearest_neighbourhood(region, float(lat), float(lng))
         slug = f"user-location-{lat}-{lng}".replace('.', '-')
-        Place.objects.create(
-            slug=slug,
-            name="My Location",
-            category="Starting Point",
-            neighbourhood=neighbourhood,
-            lat=float(lat),
-            lng=float(lng),
-            entry_fee=0,
-            avg_food=0,
-            duration_min=0,
-            rating=5.0,
-            price_tier="Free",
-            tags=["user", "location"],
-            vibes=["personal"],
-            popularity=1.0
-        )
-        return JsonResponse({'status': 'success', 'neighbourhood': neighbourhood})
+        with transaction.atomic():
+            Place.objects.create(
+                slug=slug,
+                region=region,
+                name="My Location",
+                category="Starting Point",
+                neighbourhood=neighbourhood,
+                lat=float(lat),
+                lng=float(lng),
+                entry_fee=0,
+                avg_food=0,
+                duration_min=0,
+                rating=5.0,
+                price_tier="Free",
+                tags=["user", "location"],
+                vibes=["personal"],
+                popularity=1.0
+            )
+            enqueue("geocode_place", {"slug": slug}, dedupe_key=f"geocode_place:{slug}")
+        return JsonResponse({'status': 'success', 'neighbourhood': neighbourhood, 'provisional': True})
     return JsonResponse({'status': 'error', 'message': 'Invalid method'})
+
+
+@csrf_exempt
+def route(request):
+    """
+    Return a road route through an ordered list of coordinates.
+    Expects a JSON body: {"coordinates": [[lat, lng], ...]}, optionally with
+    "zoom" to simplify the geometry for that map zoom and
+    "encoding": "polyline" to get a Google encoded polyline instead of
+    a coordinate array.
+
+    Exempt from CSRF (the frontend posts plain JSON), so each client IP is
+    rate limited instead, since a request can cost dozens of upstream calls.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'Invalid method'}, status=405)
+    if not settings.ROUTING_API_KEY:
+        return JsonResponse(
+            {'status': 'error', 'message': 'Road routing is not configured: set ROUTING_API_KEY'}, status=503
+        )
+    if not allow_request(request.META.get('REMOTE_ADDR', '')):
+        return JsonResponse({'status': 'error', 'message': 'Too many route requests'}, status=429)
+
+    try:
+        body = json.loads(request.body or b"{}")
+        points = [(float(lat), float(lng)) for lat, lng in body["coordinates"]]
+        zoom = body.get("zoom")
+        if zoom is not None:
+            zoom = float(zoom)
+            if not math.isfinite(zoom):
+                raise ValueError('Invalid zoom')
+            zoom = min(max(zoom, 0.0), 22.0)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse({'status': 'error', 'message': 'Expected {"coordinates": [[lat, lng], ...]}'}, status=400)
+
+    if len(points) < 2:
+        return JsonResponse({'status': 'error', 'message': 'At least two coordinates are required'}, status=400)
+    if len(points) > settings.ROUTING_MAX_POINTS:
+        return JsonResponse(
+            {'status': 'error', 'message': f'At most {settings.ROUTING_MAX_POINTS} coordinates are allowed'},
+            status=400,
+        )
+    if any(not (-90 <= lat <= 90 and -180 <= lng <= 180) for lat, lng in points):
+        return JsonResponse({'status': 'error', 'message': 'Coordinates out of range'}, status=400)
+
+    route_data = build_route(points)
+    coordinates = route_data.pop("coordinates")
+    if zoom is not None:
+        mean_lat = sum(lat for lat, _ in points) / len(points)
+        tolerance = tolerance_for_zoom(zoom, mean_lat, settings.ROUTE_SIMPLIFY_PIXELS)
+        coordinates = simplify(coordinates, tolerance)
+
+    if body.get("encoding") == "polyline":
+        route_data["polyline"] = encode_polyline(coordinates)
+    else:
+        route_data["coordinates"] = coordinates
+
+    return JsonResponse({'status': 'success', **route_data})
+
+
+def _parse_cluster_query(request):
+    """Return (zoom, (west, south, east, north)) or raise ValueError."""
+    zoom = int(request.GET.get('z', ''))
+    west, south, east, north = (float(v) for v in request.GET.get('bbox', '').split(','))
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError('Invalid bbox')
+    return zoom, (west, south, east, north)
+
+
+def _cluster_payload(index, zoom, bbox):
+    return {
+        'version': index.version,
+        'zoom': level_zoom(zoom),
+        'clusters': index.get_clusters(*bbox, zoom),
+    }
+
+
+def clusters(request):
+    """
+    Return marker clusters for a map viewport.
+    Query params: z (zoom), bbox=west,south,east,north and region. The
+    payload's "zoom" is the level served: z clamped to the levels built.
+    """
+    try:
+        region = _region(request.GET)
+    except ValueError:
+        return _invalid_region()
+    try:
+        zoom, bbox = _parse_cluster_query(request)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Expected z=<int>&bbox=west,south,east,north'}, status=400)
+
+    return FastJsonResponse(_cluster_payload(get_cluster_index(region), zoom, bbox))
+
+
+async def clusters_async(request):
+    """Async variant of ``clusters``; an index rebuild runs in a worker thread."""
+    try:
+        region = await _aregion(request.GET)
+    except ValueError:
+        return _invalid_region()
+    try:
+        zoom, bbox = _parse_cluster_query(request)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Expected z=<int>&bbox=west,south,east,north'}, status=400)
+
+    index = await sync_to_async(get_cluster_index)(region)
+    return FastJsonResponse(_cluster_payload(index, zoom, bbox))
+
+
+def _parse_plan_query(params, region):
+    """Return the normalized PlanQuery of the request, or raise ValueError."""
+    start = params.get('start', '')
+    budget = int(params.get('budget', ''))
+    if 'minutes' in params:
+        minutes = int(params['minutes'])
+    else:
+        minutes = round(float(params.get('hours', '')) * 60)
+    hour = int(params['hour']) if params.get('hour', '') != '' else None
+    if not start or budget <= 0 or minutes <= 0 or (hour is not None and not 0 <= hour < 24):
+        raise ValueError('Invalid plan query')
+
+    def values(name):
+        return [v.strip() for item in params.getlist(name) for v in item.split(',') if v.strip()]
+
+    return normalize(
+        region, start, budget, minutes, values('category'), values('vibe'), params.get('q', ''), hour
+    )
+
+
+def plan(request):
+    """
+    Plan an itinerary server-side, as the frontend planner does.
+    Query params: start (neighbourhood), budget (KSH), minutes or hours,
+    category and vibe (repeatable or comma-separated), q (free text), hour
+    (of departure, 0-23; travel times follow its congestion) and region.
+    Budget and time are rounded down to the cache's steps; the response
+    carries the values used. X-Plan-Cache tells whether it came from this
+    process's cache ("local"), the shared one ("shared") or was computed
+    ("miss").
+    """
+    try:
+        region = _region(request.GET)
+    except ValueError:
+        return _invalid_region()
+    try:
+        query = _parse_plan_query(request.GET, region)
+    except (ValueError, OverflowError):
+        return JsonResponse(
+            {
+                'status': 'error',
+                'message': 'Expected start=<neighbourhood>&budget=<KSH>&minutes=<int> (or hours), optionally hour=<0-23>',
+            },
+            status=400,
+        )
+
+    def build():
+        result = build_plan(
+            region, query.start, query.budget, query.minutes, query.categories, query.vibes, query.free_text,
+            query.hour,
+        )
+        return dumps({
+            'start': query.start, 'budget': query.budget, 'minutes': query.minutes, 'hour': query.hour, **result
+        })
+
+    matrix = get_travel_matrix(region)
+    version = (get_place_snapshot(region).version, matrix.version if matrix is not None else None)
+    content, source = get_plan_cache().get_or_build(query, version, build)
+    response = HttpResponse(content, content_type='application/json')
+    response['X-Plan-Cache'] = source
+    return response
+
+
+def plan_cache_stats(request):
+    """Hit and miss counts of this process's plan cache."""
+    return FastJsonResponse(get_plan_cache().stats())
+
+
+def nearby(request):
+    """
+    Return the places closest to a point, nearest first, each with its
+    great-circle "distanceKm". Query params: lat, lng, k (default 10, at most
+    settings.NEARBY_MAX_RESULTS), category (repeatable or comma-separated),
+    max_km and region.
+    """
+    try:
+        region = _region(request.GET)
+    except ValueError:
+        return _invalid_region()
+    try:
+        lat = float(request.GET.get('lat', ''))
+        lng = float(request.GET.get('lng', ''))
+        k = int(request.GET.get('k', 10))
+        max_km = float(request.GET.get('max_km', EARTH_RADIUS_KM * 4))
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180) or k < 1 or not max_km >= 0:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Expected lat=<lat>&lng=<lng>, optionally k and max_km'}, status=400)
+
+    categories = [c.strip() for item in request.GET.getlist('category') for c in item.split(',') if c.strip()]
+    index = get_nearby_index(region)
+    found = index.nearest(lat, lng, min(k, settings.NEARBY_MAX_RESULTS), categories or None, max_km)
+
+    serialize = PLACE_API_SPEC.compile(PLACE_COLUMNS)
+    places = [{**serialize(index.rows[i]), 'distanceKm': round(km, 3)} for i, km in found]
+    return FastJsonResponse({'version': index.version, 'places': places})
@@ -0,0 +1,360 @@
+"""
+Warm-start artifacts: a region's derived read structures, prebuilt on disk.
+
+A fresh worker otherwise pays for the Place scan, the neighbourhood
+centers, the transport table and the cluster and ranking indexes on its
+first requests. ``manage.py build_warm_start`` writes them, for the current
+dataset version, into one binary file per region::
+
+    magic | header length | JSON header | padding | arrays...
+
+The header records the dataset version, the transport settings the table
+was built with, the SHA-256 of everything after the header and the dtype,
+shape and offset of each array. Arrays start on 64-byte boundaries:
+coordinate and numeric attribute columns, strings as offsets into a UTF-8
+blob, tags and vibes as vocabulary ids, the neighbourhood transport
+matrices, every level of the cluster index with its KD-tree, and the
+columns of the ranking index.
+
+``load_on_boot`` (called from the WSGI/ASGI entry points) memory-maps every
+artifact, checks its checksum and transport settings, and seeds the place
+snapshot, transport-table, cluster-index and ranking-index caches from it.
+Those caches only adopt the artifact if its version is the current one, so
+a stale or broken artifact just means the usual live rebuild.
+
+The cluster levels, KD-trees and ranking columns are used as read-only
+views of the mapping, so their pages are shared by every worker through
+the page cache. The place snapshot and the transport table are still
+decoded into ordinary Python objects in each worker, since every view
+reads them as rows and dicts; only their decoding, not their memory, is
+saved.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from .clustering import ClusterIndex, ClusterLevel, marker_rows, preload_cluster_index
+from .dataset import get_dataset_version
+from .neighbourhoods import get_neighbourhood_centers
+from .ranking import RankingIndex, preload_ranking_index
+from .snapshot import PLACE_COLUMNS, PlaceRow, PlaceSnapshot, preload_place_snapshot
+from .spatial import LEAF_SIZE, KDTree
+from .transport import build_transport_table, preload_transport_table
+from .travel_model import transport_settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"TRIPSWS2"
+ALIGNMENT = 64
+ARTIFACT_SUFFIX = ".bin"
+
+STRING_COLUMNS = ("slug", "name", "category", "neighbourhood", "price_tier")
+NUMBER_COLUMNS = {
+    "lat": np.float64,
+    "lng": np.float64,
+    "entry_fee": np.int64,
+    "avg_food": np.int64,
+    "duration_min": np.int64,
+    "rating": np.float64,
+    "popularity": np.float64,
+}
+LIST_COLUMNS = ("tags", "vibes")
+CLUSTER_LEVEL_ARRAYS = ("xs", "ys", "counts", "place_idx")
+CLUSTER_TREE_ARRAYS = ("ids", "xs", "ys")
+# Ranking arrays that are copies of the numeric columns aren't stored twice
+RANKING_SHARED_COLUMNS = ("rating", "popularity")
+
+_PREFIX = struct.Struct("<8sQ")  # Magic, header length
+
+
+def artifact_path(region: str, directory: Optional[Path] = None) -> Path:
+    return Path(directory or settings.WARM_START_DIR) / f"{region}{ARTIFACT_SUFFIX}"
+
+
+def _encode_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def _decode_strings(offsets: np.ndarray, blob: np.ndarray) -> List[str]:
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+
+def _encode_lists(values: Sequence[Sequence[str]]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """Vocabulary, offsets and flat ids (in the original order)."""
+    vocabulary: Dict[str, int] = {}
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    ids = []
+    for i, items in enumerate(values):
+        ids.extend(vocabulary.setdefault(item, len(vocabulary)) for item in items)
+        offsets[i + 1] = len(ids)
+    return list(vocabulary), offsets, np.array(ids, dtype=np.int32)
+
+
+def _collect(region: str) -> Tuple[dict, Dict[str, np.ndarray]]:
+    # Version, places and centers must agree; retry if a write lands in between
+    for _ in range(3):
+        version = get_dataset_version()
+        snapshot = PlaceSnapshot.load(version, region)
+        centers = get_neighbourhood_centers(region)
+        if get_dataset_version() == version:
+            break
+    else:
+        raise RuntimeError("The dataset kept changing while the artifact was being built.")
+
+    rows = snapshot.rows
+    arrays: Dict[str, np.ndarray] = {}
+    header = {"version": version, "region": region, "places": len(rows), "transport": transport_settings()}
+
+    for column in STRING_COLUMNS:
+        arrays[f"{column}.offsets"], arrays[f"{column}.blob"] = _encode_strings(
+            [getattr(row, column) for row in rows]
+        )
+    for column, dtype in NUMBER_COLUMNS.items():
+        arrays[column] = np.array([getattr(row, column) for row in rows], dtype=dtype)
+    for column in LIST_COLUMNS:
+        vocabulary, offsets, ids = _encode_lists([getattr(row, column) for row in rows])
+        header[f"{column}.vocabulary"] = vocabulary
+        arrays[f"{column}.offsets"], arrays[f"{column}.ids"] = offsets, ids
+
+    names = list(centers)
+    header["neighbourhoods"] = names
+    arrays["neighbourhood.lat"] = np.array([centers[n]["lat"] for n in names], dtype=np.float64)
+    arrays["neighbourhood.lng"] = np.array([centers[n]["lng"] for n in names], dtype=np.float64)
+
+    table = build_transport_table(centers)
+    modes = sorted({entry["mode"] for entry in table.values()})
+    k = len(names)
+    fares = np.zeros((k, k), dtype=np.int32)
+    minutes = np.zeros((k, k), dtype=np.int32)
+    mode_ids = np.zeros((k, k), dtype=np.uint8)
+    for i, origin in enumerate(names):
+        for j, dest in enumerate(names):
+            entry = table.get(f"{origin}|{dest}")
+            if entry is not None:
+                fares[i, j], minutes[i, j] = entry["fare"], entry["minutes"]
+                mode_ids[i, j] = modes.index(entry["mode"])
+    header["transport_modes"] = modes
+    arrays["transport.fares"], arrays["transport.minutes"], arrays["transport.modes"] = fares, minutes, mode_ids
+
+    clusters = ClusterIndex(version, marker_rows(rows))
+    header["cluster.zooms"] = list(clusters.levels)
+    header["cluster.leaf_size"] = LEAF_SIZE
+    for zoom, level in clusters.levels.items():
+        for name in CLUSTER_LEVEL_ARRAYS:
+            arrays[f"cluster.{zoom}.{name}"] = getattr(level, name)
+        for name in CLUSTER_TREE_ARRAYS:
+            arrays[f"cluster.{zoom}.tree.{name}"] = getattr(level.tree, name)
+
+    vocabularies, ranking = RankingIndex(version, rows).state()
+    header["ranking.categories"] = vocabularies["categories"]
+    header["ranking.vibes"] = vocabularies["vibes"]
+    arrays["ranking.words.offsets"], arrays["ranking.words.blob"] = _encode_strings(vocabularies["words"])
+    for name, array in ranking.items():
+        if name not in RANKING_SHARED_COLUMNS:
+            arrays[f"ranking.{name}"] = array
+    return header, arrays
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_artifact(path: Path, header: dict, arrays: Dict[str, np.ndarray]) -> None:
+    """Write ``header`` and ``arrays`` to ``path`` atomically."""
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    digest = hashlib.sha256()
+    for name, array in arrays.items():
+        digest.update(array.tobytes())
+        digest.update(b"\0" * (_align(array.nbytes) - array.nbytes))
+    header = {**header, "arrays": layout, "data_size": offset, "sha256": digest.hexdigest()}
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _align(_PREFIX.size + len(encoded))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.name}-", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREFIX.pack(MAGIC, len(encoded)))
+            f.write(encoded)
+            f.write(b"\0" * (data_start - _PREFIX.size - len(encoded)))
+            for array in arrays.values():
+                f.write(array.tobytes())
+                f.write(b"\0" * (_align(array.nbytes) - array.nbytes))
+        # Workers still mapping the old file keep their pages
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def build_artifact(region: str, directory: Optional[Path] = None) -> Tuple[Path, dict]:
+    """Build the artifact of ``region`` for the current dataset version. Returns (path, header)."""
+    header, arrays = _collect(region)
+    path = artifact_path(region, directory)
+    write_artifact(path, header, arrays)
+    return path, header
+
+
+class WarmStartArtifact:
+    """A memory-mapped artifact; the arrays are read-only views of the file."""
+
+    def __init__(self, path: Path, header: dict, buffer: mmap.mmap, data_start: int):
+        self.path = path
+        self.header = header
+        self.version: int = header["version"]
+        self.region: str = header["region"]
+        self.arrays: Dict[str, np.ndarray] = {}
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            count = int(np.prod(spec["shape"], dtype=np.int64))
+            self.arrays[name] = np.frombuffer(
+                buffer, dtype=dtype, count=count, offset=data_start + spec["offset"]
+            ).reshape(spec["shape"])
+
+    def _lists(self, column: str) -> List[tuple]:
+        vocabulary = self.header[f"{column}.vocabulary"]
+        ids = self.arrays[f"{column}.ids"].tolist()
+        bounds = self.arrays[f"{column}.offsets"].tolist()
+        return [tuple(vocabulary[t] for t in ids[bounds[i]:bounds[i + 1]]) for i in range(len(bounds) - 1)]
+
+    def place_snapshot(self) -> PlaceSnapshot:
+        columns = {}
+        for column in STRING_COLUMNS:
+            columns[column] = _decode_strings(self.arrays[f"{column}.offsets"], self.arrays[f"{column}.blob"])
+        for column in NUMBER_COLUMNS:
+            columns[column] = self.arrays[column].tolist()
+        for column in LIST_COLUMNS:
+            columns[column] = self._lists(column)
+        rows = tuple(map(PlaceRow._make, zip(*(columns[c] for c in PLACE_COLUMNS))))
+        return PlaceSnapshot(self.version, rows, self.region)
+
+    def neighbourhood_centers(self) -> dict:
+        lats = self.arrays["neighbourhood.lat"].tolist()
+        lngs = self.arrays["neighbourhood.lng"].tolist()
+        return {name: {"lat": lats[i], "lng": lngs[i]} for i, name in enumerate(self.header["neighbourhoods"])}
+
+    def transport_table(self) -> dict:
+        names = self.header["neighbourhoods"]
+        modes = self.header["transport_modes"]
+        fares = self.arrays["transport.fares"].tolist()
+        minutes = self.arrays["transport.minutes"].tolist()
+        mode_ids = self.arrays["transport.modes"].tolist()
+        table = {}
+        for i, origin in enumerate(names):
+            for j, dest in enumerate(names):
+                if i != j:
+                    table[f"{origin}|{dest}"] = {
+                        "mode": modes[mode_ids[i][j]],
+                        "fare": fares[i][j],
+                        "minutes": minutes[i][j],
+                    }
+        return table
+
+    def cluster_index(self, snapshot: PlaceSnapshot) -> ClusterIndex:
+        """The cluster index of ``snapshot`` (this artifact's), its levels and trees on the mapped arrays."""
+        leaf_size = self.header["cluster.leaf_size"]
+        levels = {}
+        for zoom in self.header["cluster.zooms"]:
+            tree = KDTree.from_arrays(
+                *(self.arrays[f"cluster.{zoom}.tree.{name}"] for name in CLUSTER_TREE_ARRAYS), leaf_size=leaf_size
+            )
+            levels[zoom] = ClusterLevel(
+                *(self.arrays[f"cluster.{zoom}.{name}"] for name in CLUSTER_LEVEL_ARRAYS), tree=tree
+            )
+        return ClusterIndex(self.version, marker_rows(snapshot.rows), levels)
+
+    def ranking_index(self, snapshot: PlaceSnapshot) -> RankingIndex:
+        """The ranking index of ``snapshot`` (this artifact's), its columns on the mapped arrays."""
+        vocabularies = {
+            "categories": self.header["ranking.categories"],
+            "vibes": self.header["ranking.vibes"],
+            "words": _decode_strings(self.arrays["ranking.words.offsets"], self.arrays["ranking.words.blob"]),
+        }
+        arrays = {name: self.arrays[name] for name in RANKING_SHARED_COLUMNS}
+        for name in ("categories", "vibe_counts", "word_rows", "word_ids"):
+            arrays[name] = self.arrays[f"ranking.{name}"]
+        return RankingIndex.from_state(self.version, snapshot.rows, vocabularies, arrays)
+
+
+def load_artifact(path: Path) -> WarmStartArtifact:
+    """Map and validate an artifact. Raises ValueError if it is corrupt or built for other settings."""
+    path = Path(path)
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(buffer) < _PREFIX.size:
+        raise ValueError(f"{path} is truncated.")
+    magic, header_size = _PREFIX.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a warm-start artifact.")
+    try:
+        header = json.loads(buffer[_PREFIX.size:_PREFIX.size + header_size])
+    except ValueError:
+        raise ValueError(f"{path} has an unreadable header.")
+    data_start = _align(_PREFIX.size + header_size)
+    if len(buffer) != data_start + header["data_size"]:
+        raise ValueError(f"{path} is truncated.")
+
+    view = memoryview(buffer)[data_start:]
+    try:
+        if hashlib.sha256(view).hexdigest() != header["sha256"]:
+            raise ValueError(f"{path} fails its checksum.")
+    finally:
+        view.release()
+    if header["transport"] != transport_settings():
+        raise ValueError(f"{path} was built with other transport settings.")
+
+    return WarmStartArtifact(path, header, buffer, data_start)
+
+
+def load_on_boot(directory: Optional[Path] = None) -> int:
+    """
+    Map every artifact in ``WARM_START_DIR`` and seed the per-process caches
+    from the valid ones. Never raises for a bad artifact. Returns how many
+    were loaded.
+    """
+    directory = Path(directory or settings.WARM_START_DIR)
+    if not directory.is_dir():
+        return 0
+
+    loaded = 0
+    for path in sorted(directory.glob(f"*{ARTIFACT_SUFFIX}")):
+        try:
+            artifact = load_artifact(path)
+            snapshot = artifact.place_snapshot()
+            cluster_index = artifact.cluster_index(snapshot)
+            ranking_index = artifact.ranking_index(snapshot)
+            centers = artifact.neighbourhood_centers()
+            table = artifact.transport_table()
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("Skipping warm-start artifact %s: %s", path, exc)
+            continue
+        preload_place_snapshot(snapshot)
+        preload_cluster_index(artifact.region, cluster_index)
+        preload_ranking_index(artifact.region, ranking_index)
+        preload_transport_table(artifact.region, centers, table)
+        loaded += 1
+    return loaded